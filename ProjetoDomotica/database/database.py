@@ -1,16 +1,270 @@
-from sqlalchemy import create_engine
+import asyncio
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./projetodomotica.db"
+DATABASE_URL = os.getenv("DOMOTICA_DATABASE_URL", "sqlite:///./projetodomotica.db")
+POOL_SIZE = int(os.getenv("DOMOTICA_POOL_SIZE", "5"))
+# Casas além da padrão: um arquivo SQLite por casa neste diretório
+CASAS_DIR = os.getenv("DOMOTICA_CASAS_DIR", "./casas")
+# Engines (e caches por casa) mantidos abertos; as casas menos usadas são fechadas
+MAX_CASAS_ABERTAS = int(os.getenv("DOMOTICA_MAX_CASAS_ABERTAS", "128"))
+POOL_SIZE_CASA = int(os.getenv("DOMOTICA_POOL_SIZE_CASA", "2"))
+# Com DOMOTICA_ASYNC=1 as rotas quentes usam AsyncSession (requer aiosqlite)
+ASYNC_HABILITADO = os.getenv("DOMOTICA_ASYNC", "0") == "1"
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}, future=True
+# Aplicados a cada nova conexão SQLite
+PRAGMAS_SQLITE = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=268435456",
 )
 
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+def _aplicar_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in PRAGMAS_SQLITE:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def _opcoes_engine(url: str) -> dict:
+    if url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False}, "pool_size": POOL_SIZE}
+    return {"pool_size": POOL_SIZE}
+
+
+def _criar_engine(url: str, pool_size: int = POOL_SIZE):
+    engine = create_engine(url, future=True, **{**_opcoes_engine(url), "pool_size": pool_size})
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _aplicar_pragmas)
+    return engine
+
+
+engine = _criar_engine(DATABASE_URL)
 
 Base = declarative_base()
 
+# Casa da requisição (ou da tarefa) atual; definida pelo MiddlewareDeCasa e
+# herdada pelo threadpool e pelas tarefas criadas a partir da requisição
+CASA_PADRAO = "padrao"
+casa_atual = ContextVar("casa_atual", default=CASA_PADRAO)
+_ID_CASA = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+
+
+class CasaNaoEncontrada(LookupError):
+    pass
+
+
+def id_de_casa_valido(casa: str) -> bool:
+    return _ID_CASA.fullmatch(casa) is not None
+
+
+@contextmanager
+def usar_casa(casa: str):
+    token = casa_atual.set(casa)
+    try:
+        yield
+    finally:
+        casa_atual.reset(token)
+
+
+class RoteadorDeBancos:
+    # Escolhe o banco pela casa atual. A casa padrão é DATABASE_URL; as demais
+    # ficam em CASAS_DIR/<casa>.db, cada uma com seu engine e pool, então
+    # escritas (e o lock de escrita do SQLite) de uma casa não esperam pelas
+    # de outra. Só as MAX_CASAS_ABERTAS mais usadas ficam com engine aberto
+
+    def __init__(self, diretorio: str = CASAS_DIR, max_abertas: int = MAX_CASAS_ABERTAS):
+        self.diretorio = diretorio
+        self.max_abertas = max_abertas
+        self._abertas = OrderedDict()        # casa -> (engine, sessionmaker)
+        self._async = OrderedDict()          # casa -> (engine assíncrono, async_sessionmaker)
+        self._ao_abrir = []
+        # Casas já vistas: evita um stat no disco por requisição (o middleware
+        # consulta no event loop)
+        self._conhecidas = set()
+        self._lock = threading.Lock()
+        self.aberturas = 0
+        self._padrao = (engine, sessionmaker(bind=engine, autoflush=False, autocommit=False))
+
+    def ao_abrir(self, funcao):
+        # Chamada com cada engine síncrono aberto (ex.: instrumentação)
+        self._ao_abrir.append(funcao)
+        funcao(engine)
+
+    def caminho(self, casa: str) -> str:
+        return os.path.join(self.diretorio, f"{casa}.db")
+
+    def existe(self, casa: str) -> bool:
+        if casa == CASA_PADRAO or casa in self._conhecidas:
+            return True
+        if os.path.exists(self.caminho(casa)):
+            self._conhecidas.add(casa)
+            return True
+        return False
+
+    def casas(self) -> list:
+        arquivos = os.listdir(self.diretorio) if os.path.isdir(self.diretorio) else []
+        casas = sorted(nome[:-3] for nome in arquivos if nome.endswith(".db") and id_de_casa_valido(nome[:-3]))
+        self._conhecidas.update(casas)
+        return [CASA_PADRAO] + casas
+
+    def criar(self, casa: str) -> bool:
+        # Cria o arquivo e o esquema; False se a casa já existia
+        if self.existe(casa):
+            return False
+        os.makedirs(self.diretorio, exist_ok=True)
+        from ProjetoDomotica.database.migracoes import migrar
+
+        engine_casa = self.engine(casa, criar=True)
+        migrar(engine_casa)
+        self._conhecidas.add(casa)
+        return True
+
+    def fechar_casa(self, casa: str):
+        # Esquece a casa e fecha os engines dela, sem apagar o arquivo
+        with self._lock:
+            self._conhecidas.discard(casa)
+            aberta = self._abertas.pop(casa, None)
+            assincrona = self._async.pop(casa, None)
+        if aberta is not None:
+            aberta[0].dispose()
+        if assincrona is not None:
+            assincrona[0].sync_engine.dispose(close=False)
+
+    def remover(self, casa: str):
+        self.fechar_casa(casa)
+        for sufixo in ("", "-wal", "-shm"):
+            if os.path.exists(self.caminho(casa) + sufixo):
+                os.remove(self.caminho(casa) + sufixo)
+
+    def engine(self, casa: str, criar: bool = False):
+        return self._abrir(casa, criar)[0]
+
+    def sessao(self, casa: str):
+        return self._abrir(casa)[1]()
+
+    def sessao_async(self, casa: str):
+        if casa == CASA_PADRAO:
+            return AsyncSessionLocal()
+        with self._lock:
+            aberta = self._async.get(casa)
+            if aberta is not None:
+                self._async.move_to_end(casa)
+                return aberta[1]()
+        if not self.existe(casa):
+            raise CasaNaoEncontrada(casa)
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        url = f"sqlite+aiosqlite:///{self.caminho(casa)}"
+        engine_casa = create_async_engine(url, **{**_opcoes_engine(url), "pool_size": POOL_SIZE_CASA})
+        event.listen(engine_casa.sync_engine, "connect", _aplicar_pragmas)
+        for funcao in self._ao_abrir:
+            funcao(engine_casa.sync_engine)
+        aberta = (engine_casa, async_sessionmaker(engine_casa, autoflush=False, expire_on_commit=False))
+        with self._lock:
+            self._async[casa] = aberta
+            fechadas = self._excedentes(self._async)
+        for fechada, _ in fechadas:
+            # Chamado no event loop (get_async_db): o dispose assíncrono roda em seguida
+            asyncio.get_running_loop().create_task(fechada.dispose())
+        return aberta[1]()
+
+    def fechar(self):
+        with self._lock:
+            abertas, self._abertas = list(self._abertas.values()), OrderedDict()
+        for engine_casa, _ in abertas:
+            engine_casa.dispose()
+
+    def estatisticas(self) -> dict:
+        return {"abertas": len(self._abertas), "abertas_async": len(self._async), "aberturas": self.aberturas}
+
+    def _abrir(self, casa: str, criar: bool = False):
+        if casa == CASA_PADRAO:
+            return self._padrao
+        with self._lock:
+            aberta = self._abertas.get(casa)
+            if aberta is not None:
+                self._abertas.move_to_end(casa)
+                return aberta
+        if not criar and not self.existe(casa):
+            raise CasaNaoEncontrada(casa)
+        engine_casa = _criar_engine(f"sqlite:///{self.caminho(casa)}", POOL_SIZE_CASA)
+        for funcao in self._ao_abrir:
+            funcao(engine_casa)
+        with self._lock:
+            # Outra thread pode ter aberto a mesma casa nesse meio tempo
+            aberta = self._abertas.get(casa)
+            if aberta is None:
+                aberta = self._abertas[casa] = (
+                    engine_casa, sessionmaker(bind=engine_casa, autoflush=False, autocommit=False)
+                )
+                self.aberturas += 1
+                fechadas = self._excedentes(self._abertas)
+            else:
+                fechadas = [(engine_casa, None)]
+        for fechada, _ in fechadas:
+            # Conexões em uso continuam válidas até serem devolvidas
+            fechada.dispose()
+        return aberta
+
+    def _excedentes(self, abertas: OrderedDict) -> list:
+        fechadas = []
+        while len(abertas) > self.max_abertas:
+            fechadas.append(abertas.popitem(last=False)[1])
+        return fechadas
+
+
+roteador = RoteadorDeBancos()
+
+
+def SessionLocal():
+    # Sessão no banco da casa atual
+    return roteador.sessao(casa_atual.get())
+
+
+class PorCasa:
+    # Uma instância de `fabrica` por casa, escolhida pela casa atual: o estado
+    # em memória (caches, contadores, índices) de uma casa não vaza para outra.
+    # Com max_itens, as instâncias das casas menos usadas são descartadas (só
+    # para estado que se recarrega do banco)
+
+    def __init__(self, fabrica, max_itens=MAX_CASAS_ABERTAS):
+        self._fabrica = fabrica
+        self._max_itens = max_itens
+        self._instancias = OrderedDict()
+        self._lock = threading.Lock()
+
+    def atual(self):
+        casa = casa_atual.get()
+        with self._lock:
+            instancia = self._instancias.get(casa)
+            if instancia is None:
+                instancia = self._instancias[casa] = self._fabrica()
+                while self._max_itens is not None and len(self._instancias) > self._max_itens:
+                    self._instancias.popitem(last=False)
+            else:
+                self._instancias.move_to_end(casa)
+        return instancia
+
+    def instancias(self) -> list:
+        with self._lock:
+            return list(self._instancias.items())
+
+    def descartar(self, casa: str):
+        with self._lock:
+            return self._instancias.pop(casa, None)
+
+    def __getattr__(self, nome):
+        return getattr(self.atual(), nome)
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -18,3 +272,51 @@ def get_db():
     # except?
     finally:
         db.close()
+
+
+ASYNC_DATABASE_URL = os.getenv(
+    "DOMOTICA_ASYNC_DATABASE_URL", DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+)
+async_engine = None
+AsyncSessionLocal = None
+
+
+def iniciar_async():
+    global async_engine, AsyncSessionLocal
+    if async_engine is not None:
+        return async_engine
+    try:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, **_opcoes_engine(ASYNC_DATABASE_URL))
+    except ImportError as exc:
+        raise RuntimeError("O modo assíncrono requer os pacotes aiosqlite e greenlet.") from exc
+
+    if async_engine.dialect.name == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _aplicar_pragmas)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return async_engine
+
+
+async def get_async_db():
+    async with roteador.sessao_async(casa_atual.get()) as db:
+        yield db
+
+
+class ContadorDeConsultas:
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, *args):
+        self.total += 1
+
+
+@contextmanager
+def contar_consultas(bind=None):
+    # Conta os comandos SQL emitidos no bloco; usado para detectar N+1
+    bind = bind if bind is not None else engine
+    contador = ContadorDeConsultas()
+    event.listen(bind, "before_cursor_execute", contador)
+    try:
+        yield contador
+    finally:
+        event.remove(bind, "before_cursor_execute", contador)
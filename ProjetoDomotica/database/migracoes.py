@@ -0,0 +1,127 @@
+import logging
+
+from sqlalchemy import inspect
+from ProjetoDomotica.database.database import Base
+from ProjetoDomotica.model import models  # noqa: F401 (registra as tabelas no Base)
+from ProjetoDomotica.model.models import normalizar
+
+_log = logging.getLogger(__name__)
+
+# Passos do esquema, em ordem: o passo n leva um banco da versão n à n + 1.
+# A versão aplicada fica em PRAGMA user_version. Os passos conferem o que já
+# existe (colunas, IF NOT EXISTS): um banco criado pelo create_all de uma
+# versão intermediária do código, ainda na versão 0, passa por eles sem erro,
+# e um passo interrompido roda de novo
+MIGRACOES = []
+
+
+def migracao(passo):
+    MIGRACOES.append(passo)
+    return passo
+
+
+def migrar(engine):
+    # Tabelas que faltam pelo create_all; colunas e índices das que já
+    # existiam pelos passos. Banco novo já nasce na última versão
+    with engine.connect() as conexao:
+        novo = not inspect(conexao).has_table("dispositivos")
+        Base.metadata.create_all(bind=conexao)
+        conexao.commit()
+        if novo:
+            _definir_versao(conexao, len(MIGRACOES))
+            return
+        versao = conexao.exec_driver_sql("PRAGMA user_version").scalar()
+        for numero in range(versao, len(MIGRACOES)):
+            MIGRACOES[numero](conexao)
+            _definir_versao(conexao, numero + 1)
+            _log.info("Banco %s migrado para a versão %d.", engine.url.database, numero + 1)
+
+
+def _definir_versao(conexao, versao: int):
+    conexao.exec_driver_sql(f"PRAGMA user_version = {versao}")
+    conexao.commit()
+
+
+def colunas(conexao, tabela: str) -> set:
+    return {linha[1] for linha in conexao.exec_driver_sql(f"PRAGMA table_info({tabela})")}
+
+
+def adicionar_coluna(conexao, tabela: str, definicao: str) -> bool:
+    # ALTER TABLE ... ADD COLUMN, se a coluna ainda não existe. NOT NULL
+    # exige um DEFAULT no SQLite
+    if definicao.split()[0] in colunas(conexao, tabela):
+        return False
+    conexao.exec_driver_sql(f"ALTER TABLE {tabela} ADD COLUMN {definicao}")
+    return True
+
+
+@migracao
+def passos_das_cenas(conexao):
+    # Ações com estado alvo e cenas em passos (ordem, intervalo). As ações já
+    # ligadas a uma cena viram passos na ordem em que foram adicionadas
+    adicionar_coluna(conexao, "acoes", "estado BOOLEAN")
+    adicionar_coluna(conexao, "cena_acoes", "intervalo FLOAT NOT NULL DEFAULT 0")
+    if adicionar_coluna(conexao, "cena_acoes", "ordem INTEGER NOT NULL DEFAULT 0"):
+        conexao.exec_driver_sql(
+            "UPDATE cena_acoes SET ordem = ("
+            " SELECT COUNT(*) FROM cena_acoes AS anterior"
+            " WHERE anterior.cena_id = cena_acoes.cena_id AND anterior.rowid < cena_acoes.rowid)"
+        )
+
+
+@migracao
+def indices_de_dispositivos(conexao):
+    # Filtros de /dispositivos/ por tipo e estado
+    conexao.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_dispositivos_tipo ON dispositivos (tipo)")
+    conexao.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_dispositivos_estado ON dispositivos (estado)")
+
+
+@migracao
+def nomes_normalizados(conexao):
+    # Unicidade sem diferença de maiúsculas: a coluna normalizada é preenchida
+    # antes do índice único, e nomes que já colidiam são resolvidos
+    for tabela in ("dispositivos", "comodos", "cenas"):
+        _normalizar(conexao, tabela, "nome", "nome_normalizado")
+        conexao.exec_driver_sql(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{tabela}_nome_normalizado ON {tabela} (nome_normalizado)"
+        )
+    _normalizar(conexao, "acoes", "descricao", "descricao_normalizada", grupo="dispositivo_id")
+    conexao.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_acoes_descricao_dispositivo ON acoes (descricao_normalizada, dispositivo_id)"
+    )
+
+
+def _normalizar(conexao, tabela: str, coluna: str, normalizada: str, grupo: str = None):
+    # A linha mais antiga (menor id) fica com o nome; as repetidas ganham um
+    # sufixo livre (" (2)", " (3)"...) e são avisadas no log. `grupo` é a
+    # coluna que também faz parte da chave única
+    adicionar_coluna(conexao, tabela, f"{normalizada} VARCHAR NOT NULL DEFAULT ''")
+    selecao = f"id, {coluna}, {normalizada}" + (f", {grupo}" if grupo else ", NULL")
+    linhas = conexao.exec_driver_sql(f"SELECT {selecao} FROM {tabela} ORDER BY id").all()
+    existentes = {(normalizar(valor), chave) for _, valor, _, chave in linhas}
+    usadas, alteradas = set(), []
+    for id_, valor, atual, chave in linhas:
+        novo = valor
+        # NULL em `grupo` não colide no índice único
+        if (normalizar(valor), chave) in usadas and not (grupo and chave is None):
+            numero = 2
+            while _ocupado(f"{valor} ({numero})", chave, usadas, existentes):
+                numero += 1
+            novo = f"{valor} ({numero})"
+            _log.warning("%s %d: %r renomeado para %r (nome repetido).", tabela, id_, valor, novo)
+        usadas.add((normalizar(novo), chave))
+        if novo != valor or atual != normalizar(novo):
+            alteradas.append((novo, normalizar(novo), id_))
+    if alteradas:
+        conexao.exec_driver_sql(f"UPDATE {tabela} SET {coluna} = ?, {normalizada} = ? WHERE id = ?", alteradas)
+
+
+def _ocupado(nome: str, chave, usadas: set, existentes: set) -> bool:
+    return (normalizar(nome), chave) in usadas or (normalizar(nome), chave) in existentes
+
+
+@migracao
+def atributos_e_alvos(conexao):
+    # Atributos dos dispositivos e alvos das ações, em JSON; NULL é o padrão
+    adicionar_coluna(conexao, "dispositivos", "atributos JSON")
+    adicionar_coluna(conexao, "acoes", "alvo JSON")
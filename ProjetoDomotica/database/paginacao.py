@@ -0,0 +1,51 @@
+from typing import Optional
+from fastapi import Query, Response
+
+
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+
+# Cabeçalho com o cursor da próxima página (ausente na última página)
+CABECALHO_CURSOR = "X-Proximo-Cursor"
+
+
+class Paginacao:
+    # Sem limit e sem after a lista vem inteira, como antes da paginação;
+    # com o cursor e sem limit, páginas de LIMITE_PADRAO
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO, description="Quantidade máxima de itens"),
+        after: Optional[int] = Query(None, description="Cursor: retorna itens com id maior que este"),
+    ):
+        self.limit = LIMITE_PADRAO if limit is None and after is not None else limit
+        self.after = after
+
+
+def paginar_linhas(db, stmt, coluna_id, pagina: Paginacao, response: Response):
+    # Paginação por chave (keyset): usa o índice de id em vez de OFFSET.
+    # Recebe um SELECT de colunas e devolve tuplas, não objetos do ORM
+    if pagina.after is not None:
+        stmt = stmt.where(coluna_id > pagina.after)
+
+    itens = db.execute(_limitar(stmt.order_by(coluna_id), pagina)).all()
+    return _cortar_pagina(itens, pagina, response)
+
+
+async def paginar_linhas_async(db, stmt, coluna_id, pagina: Paginacao, response: Response):
+    if pagina.after is not None:
+        stmt = stmt.where(coluna_id > pagina.after)
+
+    itens = (await db.execute(_limitar(stmt.order_by(coluna_id), pagina))).all()
+    return _cortar_pagina(itens, pagina, response)
+
+
+def _limitar(stmt, pagina: Paginacao):
+    # Um item a mais indica que existe a próxima página
+    return stmt if pagina.limit is None else stmt.limit(pagina.limit + 1)
+
+
+def _cortar_pagina(itens, pagina: Paginacao, response: Response):
+    if pagina.limit is not None and len(itens) > pagina.limit:
+        itens = itens[:pagina.limit]
+        response.headers[CABECALHO_CURSOR] = str(itens[-1].id)
+    return itens
@@ -1,5 +1,15 @@
-from typing import List, Optional
-from pydantic import BaseModel, Field, ConfigDict
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional
+from pydantic import BaseModel, Field, ConfigDict, field_validator, model_validator
+from ProjetoDomotica.services.atributos import expandir
+
+
+class CasaCreate(BaseModel):
+    id: str = Field(..., min_length=1, max_length=64)
+
+
+class CasaOut(BaseModel):
+    id: str
 
 
 class ComodoBase(BaseModel):
@@ -19,6 +29,14 @@ class ComodoOut(ComodoBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ComodoResumoOut(BaseModel):
+    id: int
+    nome: str
+    total: int
+    ligados: int
+    por_tipo: Dict[str, int] = Field(default_factory=dict)
+
+
 class DispositivoBase(BaseModel):
     nome: str
     tipo: str
@@ -26,6 +44,7 @@ class DispositivoBase(BaseModel):
 
 
 class DispositivoCreate(DispositivoBase):
+    atributos: Dict[str, Any] = Field(default_factory=dict)
     comodo_ids: List[int] = Field(default_factory=list)
 
 
@@ -33,18 +52,71 @@ class DispositivoUpdate(BaseModel):
     nome: Optional[str] = None
     tipo: Optional[str] = None
     estado: Optional[bool] = None
+    atributos: Optional[Dict[str, Any]] = None   # delta: só os campos enviados mudam
     comodo_ids: Optional[List[int]] = None
 
 
 class DispositivoOut(DispositivoBase):
     id: int
+    atributos: Dict[str, Any] = Field(default_factory=dict)
     comodos: List[ComodoOut] = Field(default_factory=list)
     model_config = ConfigDict(from_attributes=True)
 
+    @field_validator("atributos", mode="before")
+    @classmethod
+    def _nulo(cls, valor):
+        # No banco a coluna é NULL quando tudo está no padrão
+        return valor or {}
+
+    @model_validator(mode="after")
+    def _expandir(self):
+        self.atributos = expandir(self.tipo, self.atributos)
+        return self
+
+
+class AtributosOut(BaseModel):
+    id: int
+    atributos: Dict[str, Any] = Field(default_factory=dict)
+
+
+class EstadoItem(BaseModel):
+    id: int
+    estado: bool
+
+
+class SeletorDispositivos(BaseModel):
+    tipo: Optional[str] = None
+    comodo_id: Optional[int] = None
+
+
+class EstadoLoteIn(BaseModel):
+    itens: List[EstadoItem] = Field(default_factory=list)
+    seletor: Optional[SeletorDispositivos] = None
+    estado: Optional[bool] = None   # estado aplicado aos dispositivos do seletor
+
+
+class EstadoLoteOut(BaseModel):
+    atualizados: List[int] = Field(default_factory=list)
+    nao_encontrados: List[int] = Field(default_factory=list)
+    sem_confirmacao: List[int] = Field(default_factory=list)   # só nos comandos via gateway
+
+
+class ComandoDispositivoIn(BaseModel):
+    estado: Optional[bool] = None
+    atributos: Dict[str, Any] = Field(default_factory=dict)
+
+
+class ComandoDispositivoOut(BaseModel):
+    id: int
+    estado: Optional[bool] = None
+    atributos: Dict[str, Any] = Field(default_factory=dict)   # só os confirmados
+
 
 class AcaoBase(BaseModel):
     descricao: str
     dispositivo_id: int
+    estado: Optional[bool] = None
+    alvo: Optional[Dict[str, Any]] = None   # atributos alvo, ex.: {"brilho": 30}
 
 
 class AcaoCreate(AcaoBase):
@@ -54,6 +126,8 @@ class AcaoCreate(AcaoBase):
 class AcaoUpdate(BaseModel):
     descricao: Optional[str] = None
     dispositivo_id: Optional[int] = None
+    estado: Optional[bool] = None
+    alvo: Optional[Dict[str, Any]] = None
 
 
 class AcaoOut(AcaoBase):
@@ -80,5 +154,146 @@ class CenaUpdate(BaseModel):
 class CenaOut(CenaBase):
     id: int
     acoes: List[AcaoOut] = []   # ← aqui aparecem as ações vinculadas
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ComandoPlanoOut(BaseModel):
+    dispositivo_id: int
+    alteracoes: Dict[str, Any]
+    acao_ids: List[int]   # ações da cena que resultam neste comando
+
+
+class ComodoPlanoOut(BaseModel):
+    comodo_id: Optional[int] = None   # None: dispositivos sem cômodo
+    comandos: List[ComandoPlanoOut]
+
+
+class ConflitoPlanoOut(BaseModel):
+    dispositivo_id: int
+    campo: str
+    ordem: int
+    acao_ids: List[int]
+
+
+class AcaoInvalidaOut(BaseModel):
+    acao_id: int
+    motivo: str
+
+
+class PlanoOut(BaseModel):
+    cena_id: int
+    comodos: List[ComodoPlanoOut]
+    ignorados: List[int]      # dispositivos que já estão no estado alvo
+    redundantes: List[int]    # ações sem efeito no resultado final
+    conflitos: List[ConflitoPlanoOut]
+    invalidas: List[AcaoInvalidaOut]
+    total_acoes: int
+    total_comandos: int
+
+
+class ExecucaoOut(BaseModel):
+    id: str
+    cena_id: int
+    status: str
+    total: int
+    concluidas: int = 0
+    falhas: int = 0
+    iniciada_em: datetime
+    finalizada_em: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ComandoIn(BaseModel):
+    texto: str = Field(..., min_length=1)
+
+
+class ComandoOut(BaseModel):
+    cena_id: int
+    nome: str
+    pontuacao: float
+    execucao: ExecucaoOut
+
+
+class AgendamentoBase(BaseModel):
+    cron: Optional[str] = None          # "minuto hora dia mês dia_da_semana", horário local
+    intervalo: Optional[int] = Field(None, ge=1)   # segundos
+    tolerancia: int = Field(60, ge=0)
+    politica_atraso: Literal["executar_uma_vez", "ignorar"] = "executar_uma_vez"
+    ativo: bool = True
+
+
+class AgendamentoCreate(AgendamentoBase):
+    pass
+
+
+class AgendamentoUpdate(BaseModel):
+    cron: Optional[str] = None
+    intervalo: Optional[int] = Field(None, ge=1)
+    tolerancia: Optional[int] = Field(None, ge=0)
+    politica_atraso: Optional[Literal["executar_uma_vez", "ignorar"]] = None
+    ativo: Optional[bool] = None
+
+
+class AgendamentoOut(AgendamentoBase):
+    id: int
+    cena_id: int
+    proxima_execucao: Optional[datetime] = None
+    ultima_execucao: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DisparoOut(BaseModel):
+    agendamento_id: int
+    cena_id: int
+    momento: datetime
+
+
+class RegraBase(BaseModel):
+    nome: str
+    cena_id: int
+    dispositivo_id: Optional[int] = None
+    comodo_id: Optional[int] = None
+    estado: Optional[bool] = None
+    espera: float = Field(1.0, ge=0)   # segundos
+    ativa: bool = True
+
+
+class RegraCreate(RegraBase):
+    pass
+
+
+class RegraUpdate(BaseModel):
+    nome: Optional[str] = None
+    cena_id: Optional[int] = None
+    dispositivo_id: Optional[int] = None
+    comodo_id: Optional[int] = None
+    estado: Optional[bool] = None
+    espera: Optional[float] = Field(None, ge=0)
+    ativa: Optional[bool] = None
+
+
+class RegraOut(RegraBase):
+    id: int
+    model_config = ConfigDict(from_attributes=True)
+
+
+class HistoricoIntervaloOut(BaseModel):
+    inicio: datetime
+    tempo_ligado: float
+    transicoes: int
+
+
+class HistoricoOut(BaseModel):
+    dispositivo_id: int
+    de: datetime
+    ate: datetime
+    resolucao: int
+    tempo_ligado: float
+    transicoes: int
+    intervalos: List[HistoricoIntervaloOut] = Field(default_factory=list)
+
+
+class HistoricoResumoOut(BaseModel):
+    dispositivo_id: int
+    tempo_ligado: float
+    transicoes: int
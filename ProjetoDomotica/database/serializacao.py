@@ -0,0 +1,22 @@
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele cai no json da biblioteca padrão
+    orjson = None
+
+
+class RespostaRapida(JSONResponse):
+    # O conteúdo já vem em tipos JSON nativos (dicts montados das linhas do SQL),
+    # então não passa pela validação do response_model
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content)
+
+
+def responder(conteudo, response: Response) -> RespostaRapida:
+    # Repassa os cabeçalhos definidos na resposta temporária (ex.: cursor da paginação)
+    headers = {k: v for k, v in response.headers.items() if k != "content-length"}
+    return RespostaRapida(conteudo, headers=headers)
@@ -1,25 +1,83 @@
+import os
+
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from ProjetoDomotica.database.database import engine, Base
-from ProjetoDomotica.routers import comodos, dispositivos, cenas, acoes
+from ProjetoDomotica.database import database
+from ProjetoDomotica.database.database import ASYNC_HABILITADO, iniciar_async, roteador
+from ProjetoDomotica.routers import comodos, dispositivos, cenas, acoes, estado, cache, historico, metricas, casa, agendamentos, gateway, casas, regras
+from ProjetoDomotica.services.historico import gravador
+from ProjetoDomotica.services.resumo import reconciliacao
+from ProjetoDomotica.services.canal import canal
+from ProjetoDomotica.services.casas import MiddlewareDeCasa, iniciar_casas, parar_casas, preparar_bancos
+from ProjetoDomotica.services.compressao import MINIMO_COMPRESSAO, NIVEL_GZIP, MiddlewareDeGzip
+from ProjetoDomotica.services.estaticos import ArquivosEstaticos, PaginaEmCache, construir
+from ProjetoDomotica.services.gateway import DRIVER
+from ProjetoDomotica.services.metricas import MiddlewareDeMetricas, instrumentar_engine
+from ProjetoDomotica.services.rotas import Rota, conferir_rotas
 
 app = FastAPI(title="Domótica – Pacote 1")
+app.router.route_class = Rota
+# Por dentro das métricas: a latência medida inclui a compressão. Respostas
+# que já vêm comprimidas (estáticos, página inicial, cache de respostas) passam direto
+app.add_middleware(MiddlewareDeGzip, minimum_size=MINIMO_COMPRESSAO, compresslevel=NIVEL_GZIP)
+app.add_middleware(MiddlewareDeMetricas)
+# Adicionado depois, roda antes: as métricas já veem o caminho sem /casas/<casa>
+app.add_middleware(MiddlewareDeCasa)
+roteador.ao_abrir(instrumentar_engine)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+estaticos = ArquivosEstaticos(directory="static")
+app.mount("/static", estaticos, name="static")
 
 templates = Jinja2Templates(directory="templates")
+templates.env.globals["estatico"] = estaticos.url
+pagina_inicial = PaginaEmCache(templates, "index.html")
 
 @app.on_event("startup")
 def startup():
-    Base.metadata.create_all(bind=engine)
+    # Com vários workers o esquema e os estáticos são preparados antes, uma vez
+    # só (ProjetoDomotica.servidor)
+    if os.getenv("DOMOTICA_ESQUEMA_PREPARADO") != "1":
+        preparar_bancos()
+        construir()
+    estaticos.carregar()
+    pagina_inicial.renderizar()
+    reconciliacao.iniciar()
+    canal.iniciar()
+    iniciar_casas()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await parar_casas()
+    canal.parar()
+    gravador.descarregar()
+    roteador.fechar()
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
 
+app.include_router(casas.router)
 app.include_router(comodos.router)
+app.include_router(historico.router)
+if DRIVER:
+    # Com driver, estado e atributos só mudam pelo gateway (após a confirmação)
+    app.include_router(gateway.router_estado)
+if ASYNC_HABILITADO:
+    # Rotas assíncronas têm prioridade sobre as síncronas de mesmo caminho
+    instrumentar_engine(iniciar_async().sync_engine)
+    from ProjetoDomotica.routers import dispositivos_async
+    app.include_router(dispositivos_async.router)
+app.include_router(gateway.router)
 app.include_router(dispositivos.router)
 app.include_router(acoes.router)
+app.include_router(agendamentos.router)
 app.include_router(cenas.router)
+app.include_router(regras.router)
+app.include_router(estado.router)
+app.include_router(cache.router)
+app.include_router(casa.router)
+app.include_router(metricas.router)
+conferir_rotas(app.routes)
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return pagina_inicial.responder(request)
@@ -1,8 +1,14 @@
-from sqlalchemy import Column, Integer, String, Boolean, Table, ForeignKey
-from sqlalchemy.orm import relationship, mapped_column
+from sqlalchemy import Column, Integer, String, Boolean, Float, JSON, Table, ForeignKey, Index
+from sqlalchemy.orm import relationship, mapped_column, validates
 from ProjetoDomotica.database.database import Base
 
 
+def normalizar(texto: str) -> str:
+    # Chave de unicidade sem diferença de maiúsculas/minúsculas, também fora
+    # do ASCII ("SALÃO" == "salão"), ao contrário do ILIKE do SQLite
+    return texto.casefold()
+
+
 # Tabela de associação entre Comodo e Dispositivo
 comodo_dispositivo = Table(
     "comodo_dispositivo",
@@ -17,6 +23,10 @@ cena_acoes = Table(
     Base.metadata,
     Column("cena_id", Integer, ForeignKey("cenas.id", ondelete="CASCADE"), primary_key=True),
     Column("acao_id", Integer, ForeignKey("acoes.id", ondelete="CASCADE"), primary_key=True),
+    # Ações com a mesma ordem são disparadas em paralelo; a ordem define os passos da cena
+    Column("ordem", Integer, nullable=False, default=0),
+    # Espera (em segundos) antes de aplicar a ação dentro do seu passo
+    Column("intervalo", Float, nullable=False, default=0),
 )
 
 # Modelos (Classes)
@@ -25,22 +35,34 @@ class Dispositivo(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String, nullable=False)
-    tipo = Column(String, nullable=False)
-    estado = Column(Boolean, nullable=False, default=False)
+    nome_normalizado = Column(String, nullable=False, unique=True, index=True)
+    tipo = Column(String, nullable=False, index=True)
+    estado = Column(Boolean, nullable=False, default=False, index=True)
+    # Atributos do tipo (brilho, setpoint, posição...) fora do padrão; NULL quando
+    # todos estão no padrão, como nos dispositivos só liga/desliga
+    atributos = Column(JSON(none_as_null=True), nullable=True)
     
     # Relação com Comodo (Many-to-Many)
+    # Sempre serializada em DispositivoOut: carregada com um único SELECT ... IN
     comodos = relationship(
         "Comodo",
         secondary=comodo_dispositivo,
         back_populates="dispositivos",
         passive_deletes=True,
+        lazy="selectin",
     )
 
+    @validates("nome")
+    def _normalizar_nome(self, chave, valor):
+        self.nome_normalizado = normalizar(valor)
+        return valor
+
 class Comodo(Base):
     __tablename__ = "comodos"
 
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String, nullable=False, unique=True)
+    nome_normalizado = Column(String, nullable=False, unique=True, index=True)
     
     # Relação com Dispositivo (Many-to-Many)
     dispositivos = relationship(
@@ -50,12 +72,25 @@ class Comodo(Base):
         passive_deletes=True,
     )
 
+    @validates("nome")
+    def _normalizar_nome(self, chave, valor):
+        self.nome_normalizado = normalizar(valor)
+        return valor
+
 class Acao(Base):
     __tablename__ = "acoes"
+    __table_args__ = (
+        Index("ix_acoes_descricao_dispositivo", "descricao_normalizada", "dispositivo_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     descricao = Column(String, nullable=False)
+    descricao_normalizada = Column(String, nullable=False)
     dispositivo_id = Column(Integer, ForeignKey("dispositivos.id", ondelete="CASCADE"))
+    estado = Column(Boolean, nullable=True)   # estado alvo; None alterna o estado atual (sem alvo)
+    # Atributos alvo do dispositivo (ex.: {"brilho": 30}); com alvo e estado None,
+    # a ação só ajusta os atributos
+    alvo = Column(JSON(none_as_null=True), nullable=True)
 
     # Relação com Dispositivo (Many-to-One)
     dispositivo = relationship("Dispositivo")
@@ -67,17 +102,78 @@ class Acao(Base):
         back_populates="acoes",
     )
 
+    @validates("descricao")
+    def _normalizar_descricao(self, chave, valor):
+        self.descricao_normalizada = normalizar(valor)
+        return valor
+
 class Cena(Base):
     __tablename__ = "cenas"
 
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String, nullable=False, unique=True)
+    nome_normalizado = Column(String, nullable=False, unique=True, index=True)
     palavra_chave = Column(String, nullable=True)   # ← adiciona aqui
     estado = Column(String, default="inativa")
 
     # Relação com Acao (Many-to-Many)
+    # Sempre serializada em CenaOut: carregada com um único SELECT ... IN, na
+    # ordem dos passos, como em GET /cenas/
     acoes = relationship(
         "Acao",
         secondary=cena_acoes,
         back_populates="cenas",
+        lazy="selectin",
+        order_by=(cena_acoes.c.ordem, Acao.id),
     )
+
+    @validates("nome")
+    def _normalizar_nome(self, chave, valor):
+        self.nome_normalizado = normalizar(valor)
+        return valor
+
+class HistoricoEstado(Base):
+    __tablename__ = "historico_estados"
+    __table_args__ = (Index("ix_historico_dispositivo_momento", "dispositivo_id", "momento"),)
+
+    # Somente inserção: uma linha por transição de estado
+    id = Column(Integer, primary_key=True)
+    dispositivo_id = Column(Integer, nullable=False)   # sem FK: o histórico sobrevive à remoção
+    estado = Column(Boolean, nullable=False)
+    momento = Column(Float, nullable=False)   # segundos desde a época (UTC)
+
+class Agendamento(Base):
+    __tablename__ = "agendamentos"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cena_id = Column(Integer, ForeignKey("cenas.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Exatamente um dos dois: expressão cron (horário local) ou intervalo em segundos
+    cron = Column(String, nullable=True)
+    intervalo = Column(Integer, nullable=True)
+    ativo = Column(Boolean, nullable=False, default=True)
+    # Atraso máximo para ainda disparar normalmente; além disso vale a política
+    tolerancia = Column(Integer, nullable=False, default=60)
+    politica_atraso = Column(String, nullable=False, default="executar_uma_vez")
+    proxima_execucao = Column(Float, nullable=True, index=True)   # segundos desde a época
+    ultima_execucao = Column(Float, nullable=True)
+
+class Regra(Base):
+    __tablename__ = "regras"
+
+    id = Column(Integer, primary_key=True, index=True)
+    nome = Column(String, nullable=False)
+    nome_normalizado = Column(String, nullable=False, unique=True, index=True)
+    cena_id = Column(Integer, ForeignKey("cenas.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Gatilho: exatamente um dos dois
+    dispositivo_id = Column(Integer, ForeignKey("dispositivos.id", ondelete="CASCADE"), nullable=True, index=True)
+    comodo_id = Column(Integer, ForeignKey("comodos.id", ondelete="CASCADE"), nullable=True, index=True)
+    # Dispositivo: estado que dispara (None = qualquer mudança); cômodo: todos
+    # os dispositivos do cômodo nesse estado
+    estado = Column(Boolean, nullable=True)
+    espera = Column(Float, nullable=False, default=1.0)   # segundos mínimos entre dois disparos
+    ativa = Column(Boolean, nullable=False, default=True)
+
+    @validates("nome")
+    def _normalizar_nome(self, chave, valor):
+        self.nome_normalizado = normalizar(valor)
+        return valor
@@ -1,12 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from ProjetoDomotica.database.database import get_db
+from ProjetoDomotica.database.paginacao import Paginacao, paginar_linhas
+from ProjetoDomotica.database.serializacao import responder
 from ProjetoDomotica.model.models import Acao, Dispositivo
 from ProjetoDomotica.database.schemas import AcaoCreate, AcaoOut, AcaoUpdate
+from ProjetoDomotica.routers.dispositivos import validar_atributos
+from ProjetoDomotica.services.rotas import Rota
+from ProjetoDomotica.services.plano import planos
+from ProjetoDomotica.services.respostas import versoes
 from typing import List, Optional
 
 
-router = APIRouter(prefix="/acoes", tags=["Ações"])
+router = APIRouter(prefix="/acoes", tags=["Ações"], route_class=Rota)
 
 @router.post("/", response_model=AcaoOut, status_code=status.HTTP_201_CREATED)
 def criar_acao(payload: AcaoCreate, db: Session = Depends(get_db)):
@@ -17,32 +25,37 @@ def criar_acao(payload: AcaoCreate, db: Session = Depends(get_db)):
             detail="Dispositivo não encontrado.",
         )
 
-    existente = (
-        db.query(Acao)
-        .filter(Acao.descricao.ilike(payload.descricao), Acao.dispositivo_id == payload.dispositivo_id)
-        .first()
-    )
-    if existente:
+    acao = Acao(**payload.dict())
+    if payload.alvo is not None:
+        acao.alvo = validar_atributos(dispositivo.tipo, payload.alvo) or None
+    db.add(acao)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Já existe uma ação com essa descrição para este dispositivo.",
         )
-
-    acao = Acao(**payload.dict())
-    db.add(acao)
-    db.commit()
     db.refresh(acao)
+    versoes.alterar("acoes", acao.id)
     return acao
 
 @router.get("/", response_model=List[AcaoOut])
 def listar_acoes(
+    response: Response,
     dispositivo_id: Optional[int] = Query(None, description="Filtrar por dispositivo"),
+    pagina: Paginacao = Depends(),
     db: Session = Depends(get_db),
 ):
-    query = db.query(Acao)
+    stmt = select(Acao.id, Acao.descricao, Acao.dispositivo_id, Acao.estado, Acao.alvo)
     if dispositivo_id:
-        query = query.filter(Acao.dispositivo_id == dispositivo_id)
-    return query.all()
+        stmt = stmt.where(Acao.dispositivo_id == dispositivo_id)
+    linhas = paginar_linhas(db, stmt, Acao.id, pagina, response)
+    return responder([
+        {"descricao": descricao, "dispositivo_id": dispositivo_id_, "estado": estado, "alvo": alvo, "id": id_}
+        for id_, descricao, dispositivo_id_, estado, alvo in linhas
+    ], response)
 
 @router.patch("/{acao_id}", response_model=AcaoOut)
 def atualizar_acao(acao_id: int, payload: AcaoUpdate, db: Session = Depends(get_db)):
@@ -56,16 +69,6 @@ def atualizar_acao(acao_id: int, payload: AcaoUpdate, db: Session = Depends(get_
     data = payload.dict(exclude_unset=True)
 
     if "descricao" in data:
-        existente = (
-            db.query(Acao)
-            .filter(Acao.descricao.ilike(data["descricao"]), Acao.dispositivo_id == acao.dispositivo_id, Acao.id != acao.id)
-            .first()
-        )
-        if existente:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Já existe uma ação com essa descrição para este dispositivo.",
-            )
         acao.descricao = data["descricao"]
 
     if "dispositivo_id" in data:
@@ -77,7 +80,27 @@ def atualizar_acao(acao_id: int, payload: AcaoUpdate, db: Session = Depends(get_
             )
         acao.dispositivo_id = data["dispositivo_id"]
 
-    db.commit()
+    if "estado" in data:
+        acao.estado = data["estado"]
+
+    if "alvo" in data or "dispositivo_id" in data:
+        # O alvo precisa valer para o tipo do dispositivo (novo ou atual)
+        alvo = data["alvo"] if "alvo" in data else acao.alvo
+        if alvo:
+            tipo = db.scalar(select(Dispositivo.tipo).where(Dispositivo.id == acao.dispositivo_id))
+            alvo = validar_atributos(tipo, alvo)
+        acao.alvo = alvo or None
+
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Já existe uma ação com essa descrição para este dispositivo.",
+        )
+    versoes.alterar("acoes", acao_id)
+    planos.invalidar_acao(acao_id)
     db.refresh(acao)
     return acao
 
@@ -91,4 +114,6 @@ def remover_acao(acao_id: int, db: Session = Depends(get_db)):
         )
     db.delete(acao)
     db.commit()
+    versoes.alterar("acoes", acao_id)
+    planos.invalidar_acao(acao_id)
     return
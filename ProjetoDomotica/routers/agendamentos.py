@@ -0,0 +1,91 @@
+import time
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ProjetoDomotica.database.database import get_db
+from ProjetoDomotica.model.models import Agendamento, Cena
+from ProjetoDomotica.database.schemas import AgendamentoCreate, AgendamentoOut, AgendamentoUpdate, DisparoOut
+from ProjetoDomotica.services.agendador import ExpressaoCron, agendador, proxima_execucao
+from ProjetoDomotica.services.rotas import Rota
+
+
+# Incluído antes de routers/cenas.py: /cenas/agendamentos/... não deve cair em /cenas/{cena_id}
+router = APIRouter(prefix="/cenas", tags=["Agendamentos"], route_class=Rota)
+
+
+def _validar(agendamento: Agendamento):
+    if (agendamento.cron is None) == (agendamento.intervalo is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe uma expressão cron ou um intervalo, não ambos.",
+        )
+    try:
+        if agendamento.cron is not None:
+            ExpressaoCron(agendamento.cron)
+        return proxima_execucao(agendamento, time.time())
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+@router.get("/agendamentos/proximos", response_model=List[DisparoOut])
+def listar_proximos_disparos(limite: int = Query(20, ge=1, le=1000, description="Quantidade de disparos")):
+    return agendador.proximos(limite)
+
+@router.post("/{cena_id}/agendamentos", response_model=AgendamentoOut, status_code=status.HTTP_201_CREATED)
+def criar_agendamento(cena_id: int, payload: AgendamentoCreate, db: Session = Depends(get_db)):
+    if not db.get(Cena, cena_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cena não encontrada.",
+        )
+
+    agendamento = Agendamento(cena_id=cena_id, **payload.dict())
+    agendamento.proxima_execucao = _validar(agendamento)
+    db.add(agendamento)
+    db.commit()
+    db.refresh(agendamento)
+    agendador.definir(agendamento)
+    return agendamento
+
+@router.get("/{cena_id}/agendamentos", response_model=List[AgendamentoOut])
+def listar_agendamentos(cena_id: int, db: Session = Depends(get_db)):
+    return db.scalars(
+        select(Agendamento).where(Agendamento.cena_id == cena_id).order_by(Agendamento.id)
+    ).all()
+
+@router.patch("/agendamentos/{agendamento_id}", response_model=AgendamentoOut)
+def atualizar_agendamento(agendamento_id: int, payload: AgendamentoUpdate, db: Session = Depends(get_db)):
+    agendamento = db.get(Agendamento, agendamento_id)
+    if not agendamento:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Agendamento não encontrado.",
+        )
+
+    data = payload.dict(exclude_unset=True)
+    # Trocar cron por intervalo (ou o contrário) descarta o anterior
+    if data.get("cron") is not None:
+        data.setdefault("intervalo", None)
+    elif data.get("intervalo") is not None:
+        data.setdefault("cron", None)
+    for k, v in data.items():
+        setattr(agendamento, k, v)
+
+    agendamento.proxima_execucao = _validar(agendamento)
+    db.commit()
+    db.refresh(agendamento)
+    agendador.definir(agendamento)
+    return agendamento
+
+@router.delete("/agendamentos/{agendamento_id}", status_code=status.HTTP_204_NO_CONTENT)
+def remover_agendamento(agendamento_id: int, db: Session = Depends(get_db)):
+    agendamento = db.get(Agendamento, agendamento_id)
+    if not agendamento:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Agendamento não encontrado.",
+        )
+    db.delete(agendamento)
+    db.commit()
+    agendador.remover(agendamento_id)
+    return
@@ -0,0 +1,25 @@
+from fastapi import APIRouter
+from ProjetoDomotica.services.idempotencia import chaves
+from ProjetoDomotica.services.plano import planos
+from ProjetoDomotica.services.respostas import respostas
+from ProjetoDomotica.services.topologia import topologia
+from ProjetoDomotica.services.rotas import Rota
+
+
+router = APIRouter(prefix="/cache", tags=["Cache"], route_class=Rota)
+
+@router.get("/topologia")
+def estatisticas_topologia():
+    return topologia.estatisticas()
+
+@router.get("/planos")
+def estatisticas_planos():
+    return planos.estatisticas()
+
+@router.get("/respostas")
+def estatisticas_respostas():
+    return respostas.estatisticas()
+
+@router.get("/idempotencia")
+def estatisticas_idempotencia():
+    return chaves.estatisticas()
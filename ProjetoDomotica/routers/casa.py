@@ -0,0 +1,76 @@
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ProjetoDomotica.database.database import get_db
+from ProjetoDomotica.services.casa import (
+    TAMANHO_LOTE,
+    ErroDeImportacao,
+    Importador,
+    exportar,
+    exportar_json,
+    ler_json,
+    ler_ndjson,
+)
+from ProjetoDomotica.services.topologia import topologia
+from ProjetoDomotica.services.resumo import resumo
+from ProjetoDomotica.services.comandos import indice
+from ProjetoDomotica.services.rotas import Rota
+from ProjetoDomotica.services.plano import planos
+from ProjetoDomotica.services.respostas import versoes
+
+
+router = APIRouter(prefix="/casa", tags=["Casa"], route_class=Rota)
+
+
+def _processar(importador: Importador, registros: list):
+    for numero, registro in registros:
+        importador.adicionar(numero, registro)
+
+@router.post("/importar")
+async def importar_casa(request: Request, db: Session = Depends(get_db)):
+    tipo_conteudo = request.headers.get("content-type", "")
+    leitor = ler_json if tipo_conteudo.startswith("application/json") else ler_ndjson
+    importador = Importador(db)
+
+    # O corpo é lido aos pedaços; cada bloco de registros vai ao threadpool
+    try:
+        bloco = []
+        async for numero, registro in leitor(request.stream()):
+            bloco.append((numero, registro))
+            if len(bloco) >= TAMANHO_LOTE:
+                await run_in_threadpool(_processar, importador, bloco)
+                bloco = []
+        await run_in_threadpool(_processar, importador, bloco)
+        totais = await run_in_threadpool(importador.concluir)
+        await run_in_threadpool(db.commit)
+    except ErroDeImportacao as exc:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    except UnicodeDecodeError:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="O documento deve estar em UTF-8.",
+        )
+    except IntegrityError:
+        await run_in_threadpool(db.rollback)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A importação contém nomes repetidos ou já cadastrados.",
+        )
+
+    topologia.limpar()
+    resumo.limpar()
+    indice.limpar()
+    planos.limpar()
+    versoes.limpar()
+    return totais
+
+@router.get("/exportar")
+def exportar_casa(formato: Literal["ndjson", "json"] = Query("ndjson")):
+    if formato == "json":
+        return StreamingResponse(exportar_json(), media_type="application/json")
+    return StreamingResponse(exportar(), media_type="application/x-ndjson")
@@ -0,0 +1,46 @@
+from typing import List
+from fastapi import APIRouter, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from ProjetoDomotica.database.database import CASA_PADRAO, id_de_casa_valido, roteador
+from ProjetoDomotica.database.schemas import CasaCreate, CasaOut
+from ProjetoDomotica.services.casas import criar_casa, iniciar_casa, remover_casa
+from ProjetoDomotica.services.rotas import Rota
+
+
+# Cada casa tem o próprio banco; as demais rotas escolhem a casa pelo
+# prefixo /casas/<casa>/... ou pelo cabeçalho X-Casa
+router = APIRouter(prefix="/casas", tags=["Casas"], route_class=Rota)
+
+@router.post("/", response_model=CasaOut, status_code=status.HTTP_201_CREATED)
+async def criar(payload: CasaCreate):
+    if not id_de_casa_valido(payload.id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use só letras minúsculas, números, '-' e '_' no identificador da casa.",
+        )
+    if not await run_in_threadpool(criar_casa, payload.id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Já existe uma casa com esse identificador.",
+        )
+    iniciar_casa(payload.id)
+    return {"id": payload.id}
+
+@router.get("/", response_model=List[CasaOut])
+async def listar():
+    return [{"id": casa} for casa in await run_in_threadpool(roteador.casas)]
+
+@router.delete("/{casa}", status_code=status.HTTP_204_NO_CONTENT)
+async def remover(casa: str):
+    if casa == CASA_PADRAO:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A casa padrão não pode ser removida.",
+        )
+    if not id_de_casa_valido(casa) or not roteador.existe(casa):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Casa não encontrada.",
+        )
+    await remover_casa(casa)
+    return
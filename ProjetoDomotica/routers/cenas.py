@@ -1,39 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from ProjetoDomotica.database.database import get_db
-from ProjetoDomotica.model.models import Cena, Acao
-from ProjetoDomotica.database.schemas import CenaCreate, CenaOut, CenaUpdate
+from ProjetoDomotica.database.paginacao import Paginacao, paginar_linhas
+from ProjetoDomotica.database.serializacao import responder
+from ProjetoDomotica.model.models import Agendamento, Cena, Acao, Regra, cena_acoes
+from ProjetoDomotica.database.schemas import ComandoIn, ComandoOut, CenaCreate, CenaOut, CenaUpdate, ExecucaoOut, PlanoOut
+from ProjetoDomotica.services.agendador import agendador
+from ProjetoDomotica.services.comandos import indice
+from ProjetoDomotica.services.execucao import carregar_passos, executor
+from ProjetoDomotica.services.idempotencia import idempotente
+from ProjetoDomotica.services.rotas import Rota
+from ProjetoDomotica.services.plano import planos
+from ProjetoDomotica.services.regras import motor
+from ProjetoDomotica.services.respostas import em_cache, versoes
 from typing import List, Optional
 
 
-router = APIRouter(prefix="/cenas", tags=["Cenas"])
+router = APIRouter(prefix="/cenas", tags=["Cenas"], route_class=Rota)
 
 @router.post("/", response_model=CenaOut, status_code=status.HTTP_201_CREATED)
 def criar_cena(payload: CenaCreate, db: Session = Depends(get_db)):
-    existente = db.query(Cena).filter(Cena.nome.ilike(payload.nome)).first()
-    if existente:
+    cena = Cena(**payload.dict())
+    db.add(cena)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Já existe uma cena com esse nome.",
         )
-
-    cena = Cena(**payload.dict())
-    db.add(cena)
-    db.commit()
     db.refresh(cena)
+    versoes.alterar("cenas", cena.id)
+    indice.definir(cena.id, cena.nome, cena.palavra_chave)
     return cena
 
 @router.get("/", response_model=List[CenaOut])
+@em_cache("cenas", "acoes")
 def listar_cenas(
+    response: Response,
     nome: Optional[str] = Query(None, description="Filtrar cenas pelo nome"),
+    pagina: Paginacao = Depends(),
     db: Session = Depends(get_db),
 ):
-    query = db.query(Cena)
+    stmt = select(Cena.id, Cena.nome, Cena.palavra_chave, Cena.estado)
     if nome:
-        query = query.filter(Cena.nome.ilike(f"%{nome}%"))
-    return query.all()
+        stmt = stmt.where(Cena.nome.ilike(f"%{nome}%"))
+    linhas = paginar_linhas(db, stmt, Cena.id, pagina, response)
+
+    # Ações de todas as cenas da página num único SELECT, agrupadas em Python
+    acoes = {id_: [] for id_, *_ in linhas}
+    if acoes:
+        consulta = (
+            select(cena_acoes.c.cena_id, Acao.id, Acao.descricao, Acao.dispositivo_id, Acao.estado, Acao.alvo)
+            .join(Acao, Acao.id == cena_acoes.c.acao_id)
+            .where(cena_acoes.c.cena_id.in_(acoes))
+            .order_by(cena_acoes.c.cena_id, cena_acoes.c.ordem, Acao.id)
+        )
+        for cena_id, acao_id, descricao, dispositivo_id, estado, alvo in db.execute(consulta):
+            acoes[cena_id].append(
+                {"descricao": descricao, "dispositivo_id": dispositivo_id, "estado": estado, "alvo": alvo, "id": acao_id}
+            )
+
+    return responder([
+        {"nome": nome_, "palavra_chave": palavra_chave, "estado": estado, "id": id_, "acoes": acoes[id_]}
+        for id_, nome_, palavra_chave, estado in linhas
+    ], response)
+
+@router.post("/comando", response_model=ComandoOut, status_code=status.HTTP_202_ACCEPTED)
+async def executar_comando(payload: ComandoIn, db: Session = Depends(get_db)):
+    # Frase livre (ex.: assistente de voz) casada com palavra-chave e nome das cenas
+    encontrada = await run_in_threadpool(indice.buscar, db, payload.texto)
+    if not encontrada:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Nenhuma cena corresponde ao comando.",
+        )
+
+    passos = await run_in_threadpool(carregar_passos, db, encontrada["cena_id"])
+    return {**encontrada, "execucao": executor.iniciar(encontrada["cena_id"], passos)}
+
+@router.get("/execucoes/{execucao_id}", response_model=ExecucaoOut)
+def obter_execucao(execucao_id: str):
+    execucao = executor.obter(execucao_id)
+    if not execucao:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Execução não encontrada.",
+        )
+    return execucao
 
 @router.get("/{cena_id}", response_model=CenaOut)
+@em_cache("acoes", entidade=("cenas", "cena_id"))
 def obter_cena(cena_id: int, db: Session = Depends(get_db)):
     cena = db.get(Cena, cena_id)
     if not cena:
@@ -55,23 +116,25 @@ def atualizar_cena(cena_id: int, payload: CenaUpdate, db: Session = Depends(get_
     data = payload.dict(exclude_unset=True)
 
     if "nome" in data:
-        existente = (
-            db.query(Cena)
-            .filter(Cena.nome.ilike(data["nome"]), Cena.id != cena.id)
-            .first()
-        )
-        if existente:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Já existe uma cena com esse nome.",
-            )
         cena.nome = data["nome"]
 
     if "descricao" in data:
         cena.descricao = data["descricao"]
 
-    db.commit()
+    if "palavra_chave" in data:
+        cena.palavra_chave = data["palavra_chave"]
+
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Já existe uma cena com esse nome.",
+        )
     db.refresh(cena)
+    versoes.alterar("cenas", cena.id)
+    indice.definir(cena.id, cena.nome, cena.palavra_chave)
     return cena
 
 @router.delete("/{cena_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -82,12 +145,51 @@ def remover_cena(cena_id: int, db: Session = Depends(get_db)):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Cena não encontrada.",
         )
+    agendamento_ids = db.scalars(select(Agendamento.id).where(Agendamento.cena_id == cena_id)).all()
+    db.execute(delete(Agendamento).where(Agendamento.cena_id == cena_id))
+    regra_ids = db.scalars(select(Regra.id).where(Regra.cena_id == cena_id)).all()
+    db.execute(delete(Regra).where(Regra.cena_id == cena_id))
     db.delete(cena)
     db.commit()
+    versoes.alterar("cenas", cena_id)
+    for agendamento_id in agendamento_ids:
+        agendador.remover(agendamento_id)
+    motor.remover_varias(regra_ids)
+    indice.remover(cena_id)
+    planos.invalidar_cena(cena_id)
     return
 
+@router.get("/{cena_id}/plano", response_model=PlanoOut)
+def planejar_cena(cena_id: int, db: Session = Depends(get_db)):
+    # Simulação: o que a execução mudaria agora, sem aplicar nada
+    if db.get(Cena, cena_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cena não encontrada.",
+        )
+    return planos.plano(db, cena_id)
+
+@router.post("/{cena_id}/executar", response_model=ExecucaoOut, status_code=status.HTTP_202_ACCEPTED)
+async def executar_cena(cena_id: int, db: Session = Depends(get_db)):
+    cena = await run_in_threadpool(db.get, Cena, cena_id)
+    if not cena:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cena não encontrada.",
+        )
+
+    passos = await run_in_threadpool(carregar_passos, db, cena_id)
+    return executor.iniciar(cena_id, passos)
+
 @router.post("/{cena_id}/acoes/{acao_id}", response_model=CenaOut)
-def adicionar_acao_na_cena(cena_id: int, acao_id: int, db: Session = Depends(get_db)):
+@idempotente()
+def adicionar_acao_na_cena(
+    cena_id: int,
+    acao_id: int,
+    ordem: Optional[int] = Query(None, ge=0, description="Passo da cena; por padrão, após a última ação"),
+    intervalo: float = Query(0, ge=0, description="Espera em segundos antes de aplicar a ação"),
+    db: Session = Depends(get_db),
+):
     cena = db.get(Cena, cena_id)
     if not cena:
         raise HTTPException(
@@ -103,8 +205,17 @@ def adicionar_acao_na_cena(cena_id: int, acao_id: int, db: Session = Depends(get
         )
 
     if acao not in cena.acoes:
-        cena.acoes.append(acao)
+        if ordem is None:
+            # Passo seguinte ao último: a contagem repetiria um passo depois de uma remoção
+            ordem = db.scalar(
+                select(func.coalesce(func.max(cena_acoes.c.ordem), -1) + 1).where(cena_acoes.c.cena_id == cena_id)
+            )
+        db.execute(
+            cena_acoes.insert().values(cena_id=cena_id, acao_id=acao_id, ordem=ordem, intervalo=intervalo)
+        )
         db.commit()
+        versoes.alterar("cenas", cena_id)
+        planos.invalidar_cena(cena_id)
         db.refresh(cena)
 
     return cena
@@ -128,6 +239,8 @@ def remover_acao_da_cena(cena_id: int, acao_id: int, db: Session = Depends(get_d
     if acao in cena.acoes:
         cena.acoes.remove(acao)
         db.commit()
+        versoes.alterar("cenas", cena_id)
+        planos.invalidar_cena(cena_id)
         db.refresh(cena)
 
     return cena
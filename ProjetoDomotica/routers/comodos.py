@@ -1,30 +1,50 @@
 # routers/comodos.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from ProjetoDomotica.database.database import get_db
-from ProjetoDomotica.model.models import Comodo
-from ProjetoDomotica.database.schemas import ComodoCreate, ComodoOut
+from ProjetoDomotica.database.paginacao import Paginacao, paginar_linhas
+from ProjetoDomotica.database.serializacao import responder
+from ProjetoDomotica.model.models import Comodo, Dispositivo, Regra
+from ProjetoDomotica.services.topologia import topologia
+from ProjetoDomotica.services.resumo import resumo
+from ProjetoDomotica.services.regras import motor
+from ProjetoDomotica.services.respostas import em_cache, versoes
+from ProjetoDomotica.services.rotas import Rota
+from ProjetoDomotica.database.schemas import ComodoCreate, ComodoOut, ComodoResumoOut
 
 
-router = APIRouter(prefix="/comodos", tags=["Cômodos"])
+router = APIRouter(prefix="/comodos", tags=["Cômodos"], route_class=Rota)
 
 @router.post("/", response_model=ComodoOut, status_code=status.HTTP_201_CREATED)
 def criar_comodo(payload: ComodoCreate, db: Session = Depends(get_db)):
-    existente = db.query(Comodo).filter(Comodo.nome.ilike(payload.nome)).first()
-    if existente:
+    c = Comodo(nome=payload.nome)
+    db.add(c)
+    # A unicidade (sem diferenciar maiúsculas) é garantida pelo índice em nome_normalizado
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Já existe um cômodo com esse nome.",
         )
-    c = Comodo(nome=payload.nome)
-    db.add(c)
-    db.commit()
     db.refresh(c)
+    versoes.alterar("comodos", c.id)
+    resumo.definir_comodo(c.id, c.nome)
     return c
 
 @router.get("/", response_model=list[ComodoOut])
-def listar_comodos(db: Session = Depends(get_db)):
-    return db.query(Comodo).all()
+@em_cache("comodos")
+def listar_comodos(response: Response, pagina: Paginacao = Depends(), db: Session = Depends(get_db)):
+    linhas = paginar_linhas(db, select(Comodo.id, Comodo.nome), Comodo.id, pagina, response)
+    return responder([{"nome": nome, "id": id_} for id_, nome in linhas], response)
+
+@router.get("/resumo", response_model=list[ComodoResumoOut])
+def resumo_comodos(db: Session = Depends(get_db)):
+    # Servido pelos contadores em memória, sem JOIN entre cômodos e dispositivos
+    return resumo.resumo(db)
 
 @router.put("/{comodo_id}", response_model=ComodoOut)
 def atualizar_comodo(comodo_id: int, payload: ComodoCreate, db: Session = Depends(get_db)):
@@ -35,20 +55,19 @@ def atualizar_comodo(comodo_id: int, payload: ComodoCreate, db: Session = Depend
             detail="Cômodo não encontrado.",
         )
 
-    existente = (
-        db.query(Comodo)
-        .filter(Comodo.nome.ilike(payload.nome), Comodo.id != comodo_id)
-        .first()
-    )
-    if existente:
+    c.nome = payload.nome
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Já existe um cômodo com esse nome.",
         )
-
-    c.nome = payload.nome
-    db.commit()
+    versoes.alterar("comodos", comodo_id)
+    topologia.invalidar_comodo(comodo_id)
     db.refresh(c)
+    resumo.definir_comodo(c.id, c.nome)
     return c
 
 @router.delete("/{comodo_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -60,14 +79,20 @@ def remover_comodo(comodo_id: int, db: Session = Depends(get_db)):
             detail="Cômodo não encontrado.",
         )
 
-    if c.dispositivos:
+    if topologia.dispositivos_do_comodo(db, comodo_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Não é possível remover um cômodo com dispositivos vinculados.",
         )
 
+    regra_ids = db.scalars(select(Regra.id).where(Regra.comodo_id == comodo_id)).all()
+    db.execute(delete(Regra).where(Regra.comodo_id == comodo_id))
     db.delete(c)
     db.commit()
+    versoes.alterar("comodos", comodo_id)
+    topologia.invalidar_comodo(comodo_id)
+    resumo.remover_comodo(comodo_id)
+    motor.remover_varias(regra_ids)
     return
 
 @router.get("/{comodo_id}/vinculos")
@@ -79,11 +104,20 @@ def verificar_vinculos(comodo_id: int, db: Session = Depends(get_db)):
             detail="Cômodo não encontrado.",
         )
 
+    # Os vínculos vêm do cache de topologia; só o estado atual é lido do banco
+    dispositivo_ids = topologia.dispositivos_do_comodo(db, comodo_id)
+    dispositivos = (
+        db.query(Dispositivo.id, Dispositivo.nome, Dispositivo.tipo, Dispositivo.estado)
+        .filter(Dispositivo.id.in_(dispositivo_ids))
+        .order_by(Dispositivo.id)
+        .all()
+    ) if dispositivo_ids else []
+
     return {
         "comodo": {"id": c.id, "nome": c.nome},
-        "quantidade_dispositivos": len(c.dispositivos),
+        "quantidade_dispositivos": len(dispositivos),
         "dispositivos": [
             {"id": d.id, "nome": d.nome, "tipo": d.tipo, "estado": d.estado}
-            for d in c.dispositivos
+            for d in dispositivos
         ],
     }
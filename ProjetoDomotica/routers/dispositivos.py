@@ -1,22 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Form, status
-from sqlalchemy.orm import Session
+from typing import Any, Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Form, Response, status
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, lazyload
 from ProjetoDomotica.database.database import get_db
-from ProjetoDomotica.model.models import Dispositivo, Comodo
-from ProjetoDomotica.database.schemas import DispositivoCreate, DispositivoOut, DispositivoUpdate
+from ProjetoDomotica.database.paginacao import Paginacao, paginar_linhas
+from ProjetoDomotica.database.serializacao import responder
+from ProjetoDomotica.model.models import Dispositivo, Comodo, HistoricoEstado, Regra, comodo_dispositivo
+from ProjetoDomotica.services.atributos import SQL_PATCH, alterados, compactar, expandir, mesclar, patch, validar
+from ProjetoDomotica.services.eventos import barramento, delta_estado
+from ProjetoDomotica.services.historico import eventos_de_criacao
+from ProjetoDomotica.services.idempotencia import idempotente
+from ProjetoDomotica.services.plano import planos
+from ProjetoDomotica.services.regras import motor
+from ProjetoDomotica.services.respostas import em_cache, versoes
+from ProjetoDomotica.services.topologia import topologia
+from ProjetoDomotica.services.resumo import resumo
+from ProjetoDomotica.services.rotas import Rota
+from ProjetoDomotica.database.schemas import (
+    AtributosOut,
+    DispositivoCreate,
+    DispositivoOut,
+    DispositivoUpdate,
+    EstadoLoteIn,
+    EstadoLoteOut,
+)
 
 
-router = APIRouter(prefix="/dispositivos", tags=["Dispositivos"])
+router = APIRouter(prefix="/dispositivos", tags=["Dispositivos"], route_class=Rota)
+
+def validar_atributos(tipo: str, valores: dict) -> dict:
+    try:
+        return validar(tipo, valores)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+def aplicar_atributos(d: Dispositivo, tipo: str, valores) -> dict:
+    # Troca de tipo descarta os atributos que o novo tipo não tem; devolve o que mudou
+    atuais = compactar(tipo, d.atributos)
+    mudou = alterados(tipo, atuais, validar_atributos(tipo, valores or {}))
+    d.atributos = mesclar(tipo, atuais, mudou)
+    return mudou
 
 @router.post("/", response_model=DispositivoOut, status_code=status.HTTP_201_CREATED)
 def criar_dispositivo(payload: DispositivoCreate, db: Session = Depends(get_db)):
-    existente = db.query(Dispositivo).filter(Dispositivo.nome.ilike(payload.nome)).first()
-    if existente:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Já existe um dispositivo com esse nome.",
-        )
-
-    d = Dispositivo(nome=payload.nome, tipo=payload.tipo, estado=payload.estado)
+    atributos = compactar(payload.tipo, validar_atributos(payload.tipo, payload.atributos))
+    d = Dispositivo(nome=payload.nome, tipo=payload.tipo, estado=payload.estado, atributos=atributos or None)
     db.add(d)
 
     if payload.comodo_ids:
@@ -31,26 +60,125 @@ def criar_dispositivo(payload: DispositivoCreate, db: Session = Depends(get_db))
 
         d.comodos.extend(comodos)
 
-    db.commit()
+    try:
+        db.flush()
+        eventos = eventos_de_criacao({d.id: d.estado})
+        if eventos:
+            db.execute(insert(HistoricoEstado), eventos)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Já existe um dispositivo com esse nome.",
+        )
     db.refresh(d)
+    versoes.alterar("dispositivos", d.id)
+    topologia.invalidar_dispositivo(d.id, payload.comodo_ids)
+    resumo.definir_dispositivo(d.id, d.tipo, d.estado, payload.comodo_ids)
     return d
 
 @router.get("/", response_model=list[DispositivoOut])
+@em_cache("dispositivos", "comodos")
 def listar_dispositivos(
+    response: Response,
     incluir_comodos: bool = Query(True, description="Se true, retorna os cômodos vinculados"),
+    tipo: Optional[str] = Query(None, description="Filtrar pelo tipo"),
+    estado: Optional[bool] = Query(None, description="Filtrar pelo estado"),
+    comodo_id: Optional[int] = Query(None, description="Filtrar pelo cômodo"),
+    pagina: Paginacao = Depends(),
     db: Session = Depends(get_db),
 ):
-    itens = db.query(Dispositivo).all()
+    stmt = select(Dispositivo.id, Dispositivo.nome, Dispositivo.tipo, Dispositivo.estado, Dispositivo.atributos)
+    if tipo is not None:
+        stmt = stmt.where(Dispositivo.tipo == tipo)
+    if estado is not None:
+        stmt = stmt.where(Dispositivo.estado == estado)
+    if comodo_id is not None:
+        stmt = stmt.join(
+            comodo_dispositivo, comodo_dispositivo.c.dispositivo_id == Dispositivo.id
+        ).where(comodo_dispositivo.c.comodo_id == comodo_id)
+
+    linhas = paginar_linhas(db, stmt, Dispositivo.id, pagina, response)
+
+    # Os cômodos vêm do cache de topologia em vez de um SELECT por página
+    comodos = topologia.comodos_out(db, [l.id for l in linhas]) if incluir_comodos else {}
+
+    return responder([
+        {
+            "nome": nome, "tipo": tipo_, "estado": estado_, "id": id_,
+            "atributos": expandir(tipo_, atributos), "comodos": comodos.get(id_, []),
+        }
+        for id_, nome, tipo_, estado_, atributos in linhas
+    ], response)
+
+def comando_estado_em_lote(payload: EstadoLoteIn):
+    if bool(payload.itens) == (payload.seletor is not None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe a lista de itens ou um seletor, não ambos.",
+        )
 
-    if incluir_comodos:
-        return itens
+    # Um único UPDATE ... RETURNING e um único commit para todo o lote. Só os
+    # dispositivos que mudam são gravados (e publicados); os que já estavam no
+    # estado pedido contam como atualizados pelo SELECT dos encontrados
+    if payload.itens:
+        estados = {item.id: item.estado for item in payload.itens}
+        novo = case(estados, value=Dispositivo.id)
+        filtros = [Dispositivo.id.in_(estados)]
+    else:
+        if payload.estado is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Informe o estado a aplicar aos dispositivos do seletor.",
+            )
+        estados = {}
+        novo = payload.estado
+        filtros = []
+        if payload.seletor.tipo is not None:
+            filtros.append(Dispositivo.tipo == payload.seletor.tipo)
+        if payload.seletor.comodo_id is not None:
+            filtros.append(
+                Dispositivo.id.in_(
+                    select(comodo_dispositivo.c.dispositivo_id)
+                    .where(comodo_dispositivo.c.comodo_id == payload.seletor.comodo_id)
+                )
+            )
 
-    return [
-        {"id": i.id, "nome": i.nome, "tipo": i.tipo, "estado": i.estado, "comodos": []}
-        for i in itens
-    ]
+    comando = (
+        update(Dispositivo)
+        .where(*filtros, Dispositivo.estado != novo)
+        .values(estado=novo)
+        .returning(Dispositivo.id, Dispositivo.estado)
+    )
+    return estados, comando.execution_options(synchronize_session=False), select(Dispositivo.id).where(*filtros)
+
+def publicar_lote(db: Session, linhas):
+    if barramento.ativo and linhas:
+        comodos_por_dispositivo = topologia.comodos_dos_dispositivos(db, [l.id for l in linhas])
+        barramento.publicar([
+            delta_estado(l.id, l.estado, comodos_por_dispositivo[l.id]) for l in linhas
+        ])
+
+def resultado_lote(estados: dict, encontrados) -> dict:
+    atualizados = sorted(encontrados)
+    conjunto = set(atualizados)
+    return {
+        "atualizados": atualizados,
+        "nao_encontrados": sorted(i for i in estados if i not in conjunto),
+    }
+
+@router.post("/estado:lote", response_model=EstadoLoteOut)
+def atualizar_estado_em_lote(payload: EstadoLoteIn, db: Session = Depends(get_db)):
+    estados, comando, encontrados = comando_estado_em_lote(payload)
+    linhas = db.execute(comando).all()
+    encontrados = db.scalars(encontrados).all()
+    db.commit()
+    publicar_lote(db, linhas)
+    return resultado_lote(estados, encontrados)
 
 @router.get("/{dispositivo_id}", response_model=DispositivoOut)
+@em_cache("comodos", entidade=("dispositivos", "dispositivo_id"))
 def obter_dispositivo(dispositivo_id: int, db: Session = Depends(get_db)):
     d = db.get(Dispositivo, dispositivo_id)
     if not d:
@@ -61,6 +189,7 @@ def obter_dispositivo(dispositivo_id: int, db: Session = Depends(get_db)):
     return d
 
 @router.patch("/{dispositivo_id}", response_model=DispositivoOut)
+@idempotente(janela=True)
 def atualizar_dispositivo(dispositivo_id: int, payload: DispositivoUpdate, db: Session = Depends(get_db)):
     d = db.get(Dispositivo, dispositivo_id)
     if not d:
@@ -69,10 +198,13 @@ def atualizar_dispositivo(dispositivo_id: int, payload: DispositivoUpdate, db: S
             detail="Dispositivo não encontrado.",
         )
 
-    data = payload.dict(exclude={"comodo_ids"}, exclude_unset=True)
+    estado_anterior = d.estado
+    data = payload.dict(exclude={"comodo_ids", "atributos"}, exclude_unset=True)
     for k, v in data.items():
         setattr(d, k, v)
+    atributos_alterados = aplicar_atributos(d, d.tipo, payload.atributos)
 
+    comodos_anteriores = [c.id for c in d.comodos]
     if payload.comodo_ids is not None:
         ids_unicos = list(set(payload.comodo_ids))
         novos_comodos = db.query(Comodo).filter(Comodo.id.in_(ids_unicos)).all()
@@ -85,10 +217,46 @@ def atualizar_dispositivo(dispositivo_id: int, payload: DispositivoUpdate, db: S
 
         d.comodos = novos_comodos
 
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Já existe um dispositivo com esse nome.",
+        )
+    versoes.alterar("dispositivos", d.id)
+    if payload.comodo_ids is not None:
+        topologia.invalidar_dispositivo(d.id, comodos_anteriores + payload.comodo_ids)
+    planos.invalidar_dispositivo(d.id)
     db.refresh(d)
+    resumo.definir_dispositivo(d.id, d.tipo, d.estado, [c.id for c in d.comodos])
+
+    if d.estado != estado_anterior or atributos_alterados:
+        estado = d.estado if d.estado != estado_anterior else None
+        barramento.publicar([delta_estado(d.id, estado, (c.id for c in d.comodos), atributos_alterados)])
     return d
 
+@router.patch("/{dispositivo_id}/atributos", response_model=AtributosOut)
+def atualizar_atributos(dispositivo_id: int, payload: Dict[str, Any], db: Session = Depends(get_db)):
+    # Delta: um tick do termostato grava só a temperatura, sem carregar o dispositivo
+    linha = db.execute(
+        select(Dispositivo.tipo, Dispositivo.atributos).where(Dispositivo.id == dispositivo_id)
+    ).first()
+    if not linha:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dispositivo não encontrado.",
+        )
+
+    mudou = alterados(linha.tipo, linha.atributos, validar_atributos(linha.tipo, payload))
+    if mudou:
+        db.connection().exec_driver_sql(SQL_PATCH, (patch(linha.tipo, mudou), dispositivo_id))
+        db.commit()
+        comodo_ids = topologia.comodos_dos_dispositivos(db, [dispositivo_id])[dispositivo_id]
+        barramento.publicar([delta_estado(dispositivo_id, None, comodo_ids, mudou)])
+    return {"id": dispositivo_id, "atributos": {**expandir(linha.tipo, linha.atributos), **mudou}}
+
 @router.delete("/{dispositivo_id}", status_code=status.HTTP_204_NO_CONTENT)
 def remover_dispositivo(dispositivo_id: int, db: Session = Depends(get_db)):
     d = db.get(Dispositivo, dispositivo_id)
@@ -97,13 +265,22 @@ def remover_dispositivo(dispositivo_id: int, db: Session = Depends(get_db)):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Dispositivo não encontrado.",
         )
+    comodo_ids = [c.id for c in d.comodos]
+    regra_ids = db.scalars(select(Regra.id).where(Regra.dispositivo_id == dispositivo_id)).all()
+    db.execute(delete(Regra).where(Regra.dispositivo_id == dispositivo_id))
     db.delete(d)
     db.commit()
+    versoes.alterar("dispositivos", dispositivo_id)
+    topologia.invalidar_dispositivo(dispositivo_id, comodo_ids)
+    resumo.remover_dispositivo(dispositivo_id)
+    planos.invalidar_dispositivo(dispositivo_id)
+    motor.remover_varias(regra_ids)
     return
 
 @router.post("/{dispositivo_id}/comodos/{comodo_id}", status_code=status.HTTP_204_NO_CONTENT)
+@idempotente()
 def vincular(dispositivo_id: int, comodo_id: int, db: Session = Depends(get_db)):
-    d = db.get(Dispositivo, dispositivo_id)
+    d = db.get(Dispositivo, dispositivo_id, options=[lazyload(Dispositivo.comodos)])
     c = db.get(Comodo, comodo_id)
 
     if not d or not c:
@@ -112,14 +289,17 @@ def vincular(dispositivo_id: int, comodo_id: int, db: Session = Depends(get_db))
             detail="Dispositivo ou cômodo não encontrado.",
         )
 
-    if c not in d.comodos:
-        d.comodos.append(c)
+    if comodo_id not in topologia.comodos_dos_dispositivos(db, [dispositivo_id])[dispositivo_id]:
+        db.execute(insert(comodo_dispositivo).values(dispositivo_id=dispositivo_id, comodo_id=comodo_id))
         db.commit()
+        versoes.alterar("dispositivos", dispositivo_id)
+        topologia.invalidar_dispositivo(dispositivo_id, [comodo_id])
+        resumo.vincular(dispositivo_id, comodo_id)
     return
 
 @router.delete("/{dispositivo_id}/comodos/{comodo_id}", status_code=status.HTTP_204_NO_CONTENT)
 def desvincular(dispositivo_id: int, comodo_id: int, db: Session = Depends(get_db)):
-    d = db.get(Dispositivo, dispositivo_id)
+    d = db.get(Dispositivo, dispositivo_id, options=[lazyload(Dispositivo.comodos)])
     c = db.get(Comodo, comodo_id)
 
     if not d or not c:
@@ -128,7 +308,15 @@ def desvincular(dispositivo_id: int, comodo_id: int, db: Session = Depends(get_d
             detail="Dispositivo ou cômodo não encontrado.",
         )
 
-    if c in d.comodos:
-        d.comodos.remove(c)
+    if comodo_id in topologia.comodos_dos_dispositivos(db, [dispositivo_id])[dispositivo_id]:
+        db.execute(
+            delete(comodo_dispositivo).where(
+                comodo_dispositivo.c.dispositivo_id == dispositivo_id,
+                comodo_dispositivo.c.comodo_id == comodo_id,
+            )
+        )
         db.commit()
+        versoes.alterar("dispositivos", dispositivo_id)
+        topologia.invalidar_dispositivo(dispositivo_id, [comodo_id])
+        resumo.desvincular(dispositivo_id, comodo_id)
     return
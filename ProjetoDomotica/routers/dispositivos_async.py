@@ -0,0 +1,134 @@
+# Versões assíncronas (AsyncSession) das rotas quentes de /dispositivos.
+# Incluídas antes de routers/dispositivos.py quando DOMOTICA_ASYNC=1.
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from ProjetoDomotica.database.database import get_async_db
+from ProjetoDomotica.database.paginacao import Paginacao, paginar_linhas_async
+from ProjetoDomotica.database.serializacao import responder
+from ProjetoDomotica.model.models import Dispositivo, Comodo, comodo_dispositivo
+from ProjetoDomotica.routers.dispositivos import aplicar_atributos, comando_estado_em_lote, publicar_lote, resultado_lote
+from ProjetoDomotica.services.atributos import expandir
+from ProjetoDomotica.services.eventos import barramento, delta_estado
+from ProjetoDomotica.services.idempotencia import idempotente
+from ProjetoDomotica.services.plano import planos
+from ProjetoDomotica.services.respostas import em_cache, versoes
+from ProjetoDomotica.services.topologia import topologia
+from ProjetoDomotica.services.resumo import resumo
+from ProjetoDomotica.services.rotas import Rota
+from ProjetoDomotica.database.schemas import (
+    DispositivoOut,
+    DispositivoUpdate,
+    EstadoLoteIn,
+    EstadoLoteOut,
+)
+
+
+router = APIRouter(prefix="/dispositivos", tags=["Dispositivos"], route_class=Rota)
+
+@router.get("/", response_model=list[DispositivoOut])
+@em_cache("dispositivos", "comodos")
+async def listar_dispositivos(
+    response: Response,
+    incluir_comodos: bool = Query(True, description="Se true, retorna os cômodos vinculados"),
+    tipo: Optional[str] = Query(None, description="Filtrar pelo tipo"),
+    estado: Optional[bool] = Query(None, description="Filtrar pelo estado"),
+    comodo_id: Optional[int] = Query(None, description="Filtrar pelo cômodo"),
+    pagina: Paginacao = Depends(),
+    db: AsyncSession = Depends(get_async_db),
+):
+    stmt = select(Dispositivo.id, Dispositivo.nome, Dispositivo.tipo, Dispositivo.estado, Dispositivo.atributos)
+    if tipo is not None:
+        stmt = stmt.where(Dispositivo.tipo == tipo)
+    if estado is not None:
+        stmt = stmt.where(Dispositivo.estado == estado)
+    if comodo_id is not None:
+        stmt = stmt.join(
+            comodo_dispositivo, comodo_dispositivo.c.dispositivo_id == Dispositivo.id
+        ).where(comodo_dispositivo.c.comodo_id == comodo_id)
+
+    linhas = await paginar_linhas_async(db, stmt, Dispositivo.id, pagina, response)
+
+    ids = [l.id for l in linhas]
+    comodos = await db.run_sync(lambda s: topologia.comodos_out(s, ids)) if incluir_comodos else {}
+
+    return responder([
+        {
+            "nome": nome, "tipo": tipo_, "estado": estado_, "id": id_,
+            "atributos": expandir(tipo_, atributos), "comodos": comodos.get(id_, []),
+        }
+        for id_, nome, tipo_, estado_, atributos in linhas
+    ], response)
+
+@router.post("/estado:lote", response_model=EstadoLoteOut)
+async def atualizar_estado_em_lote(payload: EstadoLoteIn, db: AsyncSession = Depends(get_async_db)):
+    estados, comando, encontrados = comando_estado_em_lote(payload)
+    linhas = (await db.execute(comando)).all()
+    encontrados = (await db.scalars(encontrados)).all()
+    await db.commit()
+    await db.run_sync(publicar_lote, linhas)
+    return resultado_lote(estados, encontrados)
+
+@router.get("/{dispositivo_id}", response_model=DispositivoOut)
+@em_cache("comodos", entidade=("dispositivos", "dispositivo_id"))
+async def obter_dispositivo(dispositivo_id: int, db: AsyncSession = Depends(get_async_db)):
+    d = await db.get(Dispositivo, dispositivo_id, options=[selectinload(Dispositivo.comodos)])
+    if not d:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dispositivo não encontrado.",
+        )
+    return d
+
+@router.patch("/{dispositivo_id}", response_model=DispositivoOut)
+@idempotente(janela=True)
+async def atualizar_dispositivo(
+    dispositivo_id: int, payload: DispositivoUpdate, db: AsyncSession = Depends(get_async_db)
+):
+    d = await db.get(Dispositivo, dispositivo_id, options=[selectinload(Dispositivo.comodos)])
+    if not d:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dispositivo não encontrado.",
+        )
+
+    estado_anterior = d.estado
+    data = payload.dict(exclude={"comodo_ids", "atributos"}, exclude_unset=True)
+    for k, v in data.items():
+        setattr(d, k, v)
+    atributos_alterados = aplicar_atributos(d, d.tipo, payload.atributos)
+
+    comodos_anteriores = [c.id for c in d.comodos]
+    if payload.comodo_ids is not None:
+        ids_unicos = list(set(payload.comodo_ids))
+        novos_comodos = (await db.scalars(select(Comodo).where(Comodo.id.in_(ids_unicos)))).all()
+
+        if len(novos_comodos) != len(ids_unicos):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Um ou mais cômodos não existem.",
+            )
+
+        d.comodos = novos_comodos
+
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Já existe um dispositivo com esse nome.",
+        )
+    versoes.alterar("dispositivos", d.id)
+    if payload.comodo_ids is not None:
+        topologia.invalidar_dispositivo(d.id, comodos_anteriores + payload.comodo_ids)
+    planos.invalidar_dispositivo(d.id)
+    resumo.definir_dispositivo(d.id, d.tipo, d.estado, [c.id for c in d.comodos])
+
+    if d.estado != estado_anterior or atributos_alterados:
+        estado = d.estado if d.estado != estado_anterior else None
+        barramento.publicar([delta_estado(d.id, estado, (c.id for c in d.comodos), atributos_alterados)])
+    return d
@@ -0,0 +1,61 @@
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, Query, WebSocket
+from fastapi.responses import StreamingResponse
+from ProjetoDomotica.services.eventos import barramento
+from ProjetoDomotica.services.rotas import Rota
+
+
+router = APIRouter(tags=["Estado em tempo real"], route_class=Rota)
+
+# Comentário SSE enviado periodicamente para manter a conexão aberta
+INTERVALO_KEEPALIVE = 15
+
+
+async def _enviar(websocket: WebSocket, assinatura):
+    while True:
+        await websocket.send_json(await assinatura.proximo())
+
+async def _aguardar_desconexao(websocket: WebSocket):
+    while True:
+        mensagem = await websocket.receive()
+        if mensagem["type"] == "websocket.disconnect":
+            return
+
+@router.websocket("/ws/estado")
+async def estado_ws(websocket: WebSocket, comodo_id: Optional[int] = None):
+    await websocket.accept()
+    assinatura = barramento.assinar(comodo_id)
+    tarefas = [
+        asyncio.create_task(_enviar(websocket, assinatura)),
+        asyncio.create_task(_aguardar_desconexao(websocket)),
+    ]
+    try:
+        await asyncio.wait(tarefas, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for tarefa in tarefas:
+            tarefa.cancel()
+        barramento.cancelar(assinatura)
+
+@router.get("/estado/eventos")
+async def estado_sse(comodo_id: Optional[int] = Query(None, description="Filtrar pelo cômodo")):
+    assinatura = barramento.assinar(comodo_id)
+
+    async def eventos():
+        try:
+            while True:
+                try:
+                    deltas = await asyncio.wait_for(assinatura.proximo(), INTERVALO_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(deltas, separators=(',', ':'))}\n\n"
+        finally:
+            barramento.cancelar(assinatura)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -0,0 +1,194 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+from ProjetoDomotica.database.database import get_db
+from ProjetoDomotica.model.models import Dispositivo, comodo_dispositivo
+from ProjetoDomotica.database.schemas import (
+    ComandoDispositivoIn,
+    ComandoDispositivoOut,
+    DispositivoOut,
+    DispositivoUpdate,
+    EstadoLoteIn,
+    EstadoLoteOut,
+)
+from ProjetoDomotica.routers import dispositivos as rotas_dispositivos
+from ProjetoDomotica.routers.dispositivos import validar_atributos
+from ProjetoDomotica.services.atributos import efetivos
+from ProjetoDomotica.services.gateway import TAMANHO_BLOCO, ComandoNaoConfirmado, obter_gateway
+from ProjetoDomotica.services.idempotencia import idempotente
+from ProjetoDomotica.services.rotas import Rota
+from ProjetoDomotica.services.topologia import topologia
+
+
+# Comandos enviados aos dispositivos pelo driver; o estado só muda no banco
+# depois da confirmação. Incluído antes de routers/dispositivos.py
+router = APIRouter(prefix="/dispositivos", tags=["Dispositivos"], route_class=Rota)
+# Com driver configurado, as escritas de estado das rotas de dispositivos
+# também passam pelo gateway: incluído só nesse caso, antes delas
+router_estado = APIRouter(prefix="/dispositivos", tags=["Dispositivos"], route_class=Rota)
+
+
+def _gateway():
+    gateway = obter_gateway()
+    if gateway is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Nenhum driver de dispositivos configurado.",
+        )
+    return gateway
+
+def _descartar_erro(futuro: asyncio.Future):
+    # Quem não aguarda a confirmação não lê o resultado
+    if not futuro.cancelled():
+        futuro.exception()
+
+def localizar(db: Session, ids) -> dict:
+    # (cômodos, tipo) de cada dispositivo existente; os cômodos agrupam os comandos em lotes
+    ids, encontrados = list(ids), {}
+    for i in range(0, len(ids), TAMANHO_BLOCO):
+        tipos = dict(db.execute(
+            select(Dispositivo.id, Dispositivo.tipo).where(Dispositivo.id.in_(ids[i:i + TAMANHO_BLOCO]))
+        ).all())
+        for dispositivo_id, comodo_ids in topologia.comodos_dos_dispositivos(db, list(tipos)).items():
+            encontrados[dispositivo_id] = (comodo_ids, tipos[dispositivo_id])
+    return encontrados
+
+def selecionar(db: Session, payload: EstadoLoteIn) -> dict:
+    if bool(payload.itens) == (payload.seletor is not None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe a lista de itens ou um seletor, não ambos.",
+        )
+    if payload.itens:
+        return {item.id: item.estado for item in payload.itens}
+    if payload.estado is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe o estado a aplicar aos dispositivos do seletor.",
+        )
+    stmt = select(Dispositivo.id)
+    if payload.seletor.tipo is not None:
+        stmt = stmt.where(Dispositivo.tipo == payload.seletor.tipo)
+    if payload.seletor.comodo_id is not None:
+        stmt = stmt.join(
+            comodo_dispositivo, comodo_dispositivo.c.dispositivo_id == Dispositivo.id
+        ).where(comodo_dispositivo.c.comodo_id == payload.seletor.comodo_id)
+    return dict.fromkeys(db.scalars(stmt), payload.estado)
+
+@router.post("/comando:lote", response_model=EstadoLoteOut)
+async def enviar_comando_em_lote(
+    payload: EstadoLoteIn,
+    response: Response,
+    aguardar: bool = Query(True, description="Se false, responde 202 sem esperar a confirmação"),
+    db: Session = Depends(get_db),
+):
+    gateway = _gateway()
+    estados = await run_in_threadpool(selecionar, db, payload)
+    dispositivos = await run_in_threadpool(localizar, db, estados)
+    nao_encontrados = sorted(i for i in estados if i not in dispositivos)
+    futuros = {
+        i: gateway.enviar(i, {"estado": estados[i]}, comodo_ids)
+        for i, (comodo_ids, _) in dispositivos.items()
+    }
+
+    if not aguardar:
+        for futuro in futuros.values():
+            futuro.add_done_callback(_descartar_erro)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return {"atualizados": [], "nao_encontrados": nao_encontrados}
+
+    resultados = await asyncio.gather(*futuros.values(), return_exceptions=True)
+    atualizados, sem_confirmacao = [], []
+    for dispositivo_id, resultado in zip(futuros, resultados):
+        (sem_confirmacao if isinstance(resultado, Exception) else atualizados).append(dispositivo_id)
+    return {
+        "atualizados": sorted(atualizados),
+        "nao_encontrados": nao_encontrados,
+        "sem_confirmacao": sorted(sem_confirmacao),
+    }
+
+@router.post("/{dispositivo_id}/comando", response_model=ComandoDispositivoOut)
+async def enviar_comando(
+    dispositivo_id: int,
+    payload: ComandoDispositivoIn,
+    response: Response,
+    aguardar: bool = Query(True, description="Se false, responde 202 sem esperar a confirmação"),
+    db: Session = Depends(get_db),
+):
+    gateway = _gateway()
+    if payload.estado is None and not payload.atributos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe o estado ou os atributos do comando.",
+        )
+    dispositivos = await run_in_threadpool(localizar, db, [dispositivo_id])
+    if dispositivo_id not in dispositivos:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dispositivo não encontrado.",
+        )
+    comodo_ids, tipo = dispositivos[dispositivo_id]
+    # Só o que foi pedido vai ao dispositivo; None volta o atributo ao padrão
+    alteracoes = efetivos(tipo, validar_atributos(tipo, payload.atributos))
+    if payload.estado is not None:
+        alteracoes["estado"] = payload.estado
+
+    futuro = gateway.enviar(dispositivo_id, alteracoes, comodo_ids)
+    if not aguardar:
+        futuro.add_done_callback(_descartar_erro)
+        response.status_code = status.HTTP_202_ACCEPTED
+        confirmadas = alteracoes
+    else:
+        try:
+            confirmadas = await futuro
+        except ComandoNaoConfirmado:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="O dispositivo não confirmou o comando.",
+            )
+    atributos = {c: v for c, v in confirmadas.items() if c != "estado"}
+    return {"id": dispositivo_id, "estado": confirmadas.get("estado"), "atributos": atributos}
+
+@router_estado.post("/estado:lote", response_model=EstadoLoteOut)
+async def atualizar_estado_em_lote(payload: EstadoLoteIn, response: Response, db: Session = Depends(get_db)):
+    # O mesmo que /comando:lote, aguardando a confirmação
+    return await enviar_comando_em_lote(payload, response, True, db)
+
+@router_estado.patch("/{dispositivo_id}", response_model=DispositivoOut)
+@idempotente(janela=True)
+async def atualizar_dispositivo(dispositivo_id: int, payload: DispositivoUpdate, db: Session = Depends(get_db)):
+    # Nome, tipo e cômodos vão direto ao banco; estado e atributos, ao
+    # dispositivo, e só mudam no banco depois da confirmação
+    configuracao = payload.dict(exclude={"estado", "atributos"}, exclude_unset=True)
+    if configuracao:
+        await run_in_threadpool(
+            rotas_dispositivos.atualizar_dispositivo, dispositivo_id, DispositivoUpdate(**configuracao), db
+        )
+    dispositivos = await run_in_threadpool(localizar, db, [dispositivo_id])
+    if dispositivo_id not in dispositivos:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dispositivo não encontrado.",
+        )
+    comodo_ids, tipo = dispositivos[dispositivo_id]
+    alteracoes = efetivos(tipo, validar_atributos(tipo, payload.atributos or {}))
+    if payload.estado is not None:
+        alteracoes["estado"] = payload.estado
+
+    if alteracoes:
+        try:
+            await _gateway().enviar(dispositivo_id, alteracoes, comodo_ids)
+        except ComandoNaoConfirmado:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="O dispositivo não confirmou o comando.",
+            )
+    return await run_in_threadpool(_recarregar, db, dispositivo_id)
+
+def _recarregar(db: Session, dispositivo_id: int):
+    # O estado confirmado foi gravado pelo gateway, em outra sessão
+    return db.get(
+        Dispositivo, dispositivo_id, populate_existing=True, options=[selectinload(Dispositivo.comodos)]
+    )
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from ProjetoDomotica.database.database import get_db
+from ProjetoDomotica.model.models import Dispositivo
+from ProjetoDomotica.database.schemas import HistoricoOut, HistoricoResumoOut
+from ProjetoDomotica.services.historico import agregar, gravador, resumir
+from ProjetoDomotica.services.rotas import Rota
+
+
+router = APIRouter(prefix="/dispositivos", tags=["Histórico"], route_class=Rota)
+
+# Limite de intervalos por resposta, para a resolução não explodir a resposta
+MAX_INTERVALOS = 10_000
+
+
+def _periodo(de: Optional[datetime], ate: Optional[datetime]):
+    ate = ate or datetime.now(timezone.utc)
+    de = de or ate - timedelta(days=1)
+    # Datas sem fuso são interpretadas como UTC
+    ate = ate if ate.tzinfo else ate.replace(tzinfo=timezone.utc)
+    de = de if de.tzinfo else de.replace(tzinfo=timezone.utc)
+    if de >= ate:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="O início do período deve ser anterior ao fim.",
+        )
+    return de.timestamp(), ate.timestamp()
+
+@router.get("/historico/resumo", response_model=List[HistoricoResumoOut])
+def resumo_historico(
+    de: Optional[datetime] = Query(None, description="Início do período (padrão: 24h atrás)"),
+    ate: Optional[datetime] = Query(None, description="Fim do período (padrão: agora)"),
+    db: Session = Depends(get_db),
+):
+    inicio, fim = _periodo(de, ate)
+    gravador.descarregar()
+    return resumir(db, inicio, fim)
+
+@router.get("/{dispositivo_id}/historico", response_model=HistoricoOut)
+def historico_dispositivo(
+    dispositivo_id: int,
+    de: Optional[datetime] = Query(None, description="Início do período (padrão: 24h atrás)"),
+    ate: Optional[datetime] = Query(None, description="Fim do período (padrão: agora)"),
+    resolucao: int = Query(3600, ge=1, description="Tamanho de cada intervalo, em segundos"),
+    db: Session = Depends(get_db),
+):
+    if not db.get(Dispositivo, dispositivo_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dispositivo não encontrado.",
+        )
+
+    inicio, fim = _periodo(de, ate)
+    if (fim - inicio) / resolucao > MAX_INTERVALOS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Resolução muito fina para o período pedido.",
+        )
+
+    # Garante que as transições ainda em memória entrem na consulta
+    gravador.descarregar()
+    return {
+        "dispositivo_id": dispositivo_id,
+        "de": inicio,
+        "ate": fim,
+        "resolucao": resolucao,
+        **agregar(db, dispositivo_id, inicio, fim, resolucao),
+    }
@@ -0,0 +1,87 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from collections import Counter, defaultdict
+from ProjetoDomotica.database.database import roteador
+from ProjetoDomotica.services.canal import canal
+from ProjetoDomotica.services.eventos import barramento
+from ProjetoDomotica.services.metricas import registro
+from ProjetoDomotica.services.topologia import topologia
+from ProjetoDomotica.services.resumo import resumo
+from ProjetoDomotica.services.gateway import gateways
+from ProjetoDomotica.services.idempotencia import chaves
+from ProjetoDomotica.services.regras import motor
+from ProjetoDomotica.services.respostas import respostas
+
+
+router = APIRouter(tags=["Métricas"])
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metricas():
+    # Somados sobre as casas em memória
+    estatisticas = defaultdict(Counter)
+    for _, cache in topologia.instancias():
+        for nome, dados in cache.estatisticas().items():
+            estatisticas[nome].update(dados)
+    contadores = [c for _, c in resumo.instancias()]
+    casas = roteador.estatisticas()
+    extras = [
+        ("domotica_cache_topologia_acertos_total", "counter", "Acertos do cache de topologia.",
+         [((("mapa", nome),), dados["acertos"]) for nome, dados in estatisticas.items()]),
+        ("domotica_cache_topologia_falhas_total", "counter", "Falhas do cache de topologia.",
+         [((("mapa", nome),), dados["falhas"]) for nome, dados in estatisticas.items()]),
+        ("domotica_cache_topologia_itens", "gauge", "Itens no cache de topologia.",
+         [((("mapa", nome),), dados["itens"]) for nome, dados in estatisticas.items()]),
+        ("domotica_assinantes_estado", "gauge", "Assinantes de estado em tempo real.",
+         [((), barramento.quantidade_assinantes)]),
+        ("domotica_resumo_reconciliacoes_total", "counter", "Conferências dos contadores de /comodos/resumo.",
+         [((), sum(c.reconciliacoes for c in contadores))]),
+        ("domotica_resumo_divergencias_total", "counter", "Conferências que encontraram contadores divergentes.",
+         [((), sum(c.divergencias for c in contadores))]),
+        ("domotica_casas_abertas", "gauge", "Casas com engine aberto.",
+         [((("modo", "sync"),), casas["abertas"]), ((("modo", "async"),), casas["abertas_async"])]),
+        ("domotica_casas_aberturas_total", "counter", "Engines de casa abertos (falhas do LRU de engines).",
+         [((), casas["aberturas"])]),
+    ]
+    eventos = Counter()
+    for gateway in gateways():
+        eventos.update(gateway.estatisticas)
+    if eventos:
+        extras.append(
+            ("domotica_gateway_comandos_total", "counter", "Eventos do gateway de dispositivos (comandos, lotes, reenvios).",
+             [((("evento", nome),), valor) for nome, valor in sorted(eventos.items())])
+        )
+    cache_respostas = respostas.estatisticas()
+    extras += [
+        ("domotica_cache_respostas_total", "counter", "Requisições GET com ETag (acertos, 304, falhas).",
+         [((("resultado", nome),), cache_respostas.get(nome, 0)) for nome in ("acertos", "nao_modificadas", "falhas")]),
+        ("domotica_cache_respostas_bytes", "gauge", "Bytes de corpo no cache de respostas.",
+         [((), cache_respostas["bytes"])]),
+    ]
+    idempotencia = chaves.estatisticas()
+    extras += [
+        ("domotica_comandos_idempotencia_total", "counter",
+         "Comandos repetidos por Idempotency-Key, agrupados ou substituídos na janela.",
+         [((("evento", nome),), idempotencia.get(nome, 0))
+          for nome in ("repeticoes", "conflitos", "agrupadas", "substituidas", "janelas")]),
+        ("domotica_comandos_idempotencia_itens", "gauge", "Respostas guardadas por Idempotency-Key.",
+         [((), idempotencia["itens"])]),
+    ]
+    regras = Counter()
+    for _, instancia in motor.instancias():
+        regras.update(instancia.eventos)
+    if regras:
+        extras.append(
+            ("domotica_regras_eventos_total", "counter", "Avaliações das regras (disparos, bloqueios de ciclo e cascata).",
+             [((("evento", nome),), valor) for nome, valor in sorted(regras.items())])
+        )
+    if canal.ativo:
+        # Por worker: cada processo responde com os próprios números
+        extras += [
+            ("domotica_canal_notificacoes_total", "counter", "Notificações entre workers (enviadas, recebidas, falhas).",
+             [((("evento", nome),), canal.eventos.get(nome, 0)) for nome in ("enviadas", "recebidas", "lotes", "falhas", "erros")]),
+            ("domotica_canal_lider", "gauge", "1 se este worker dispara os agendamentos.",
+             [((), int(canal.lider))]),
+        ]
+    return PlainTextResponse(
+        registro.exportar(extras), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,122 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ProjetoDomotica.database.database import get_db
+from ProjetoDomotica.database.paginacao import Paginacao, paginar_linhas
+from ProjetoDomotica.database.serializacao import responder
+from ProjetoDomotica.model.models import Cena, Comodo, Dispositivo, Regra
+from ProjetoDomotica.database.schemas import RegraCreate, RegraOut, RegraUpdate
+from ProjetoDomotica.services.rotas import Rota
+from ProjetoDomotica.services.regras import motor
+from typing import List, Optional
+
+
+router = APIRouter(prefix="/regras", tags=["Regras"], route_class=Rota)
+
+_COLUNAS = (Regra.id, Regra.nome, Regra.cena_id, Regra.dispositivo_id, Regra.comodo_id, Regra.estado, Regra.espera, Regra.ativa)
+
+
+def _validar(db: Session, regra: Regra):
+    if (regra.dispositivo_id is None) == (regra.comodo_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe um dispositivo ou um cômodo como gatilho, não ambos.",
+        )
+    if regra.comodo_id is not None and regra.estado is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Gatilhos de cômodo precisam do estado (todos ligados ou todos desligados).",
+        )
+    for modelo, id_, detalhe in (
+        (Cena, regra.cena_id, "Cena não encontrada."),
+        (Dispositivo, regra.dispositivo_id, "Dispositivo não encontrado."),
+        (Comodo, regra.comodo_id, "Cômodo não encontrado."),
+    ):
+        if id_ is not None and db.get(modelo, id_) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=detalhe)
+
+def _gravar(db: Session, regra: Regra):
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Já existe uma regra com esse nome.",
+        )
+    db.refresh(regra)
+    motor.definir(regra)
+
+@router.post("/", response_model=RegraOut, status_code=status.HTTP_201_CREATED)
+def criar_regra(payload: RegraCreate, db: Session = Depends(get_db)):
+    regra = Regra(**payload.dict())
+    _validar(db, regra)
+    db.add(regra)
+    _gravar(db, regra)
+    return regra
+
+@router.get("/", response_model=List[RegraOut])
+def listar_regras(
+    response: Response,
+    cena_id: Optional[int] = Query(None, description="Filtrar pela cena disparada"),
+    dispositivo_id: Optional[int] = Query(None, description="Filtrar pelo dispositivo do gatilho"),
+    comodo_id: Optional[int] = Query(None, description="Filtrar pelo cômodo do gatilho"),
+    pagina: Paginacao = Depends(),
+    db: Session = Depends(get_db),
+):
+    stmt = select(*_COLUNAS)
+    for coluna, valor in ((Regra.cena_id, cena_id), (Regra.dispositivo_id, dispositivo_id), (Regra.comodo_id, comodo_id)):
+        if valor is not None:
+            stmt = stmt.where(coluna == valor)
+    linhas = paginar_linhas(db, stmt, Regra.id, pagina, response)
+    return responder([linha._asdict() for linha in linhas], response)
+
+@router.get("/estatisticas")
+def estatisticas_regras():
+    return motor.estatisticas()
+
+@router.get("/{regra_id}", response_model=RegraOut)
+def obter_regra(regra_id: int, db: Session = Depends(get_db)):
+    regra = db.get(Regra, regra_id)
+    if not regra:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Regra não encontrada.",
+        )
+    return regra
+
+@router.patch("/{regra_id}", response_model=RegraOut)
+def atualizar_regra(regra_id: int, payload: RegraUpdate, db: Session = Depends(get_db)):
+    regra = db.get(Regra, regra_id)
+    if not regra:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Regra não encontrada.",
+        )
+
+    data = payload.dict(exclude_unset=True)
+    # Trocar o gatilho de dispositivo para cômodo (ou o contrário) descarta o anterior
+    if data.get("dispositivo_id") is not None:
+        data.setdefault("comodo_id", None)
+    elif data.get("comodo_id") is not None:
+        data.setdefault("dispositivo_id", None)
+    for k, v in data.items():
+        setattr(regra, k, v)
+
+    _validar(db, regra)
+    _gravar(db, regra)
+    return regra
+
+@router.delete("/{regra_id}", status_code=status.HTTP_204_NO_CONTENT)
+def remover_regra(regra_id: int, db: Session = Depends(get_db)):
+    regra = db.get(Regra, regra_id)
+    if not regra:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Regra não encontrada.",
+        )
+    db.delete(regra)
+    db.commit()
+    motor.remover(regra_id)
+    return
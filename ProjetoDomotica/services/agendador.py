@@ -0,0 +1,310 @@
+import asyncio
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+from ProjetoDomotica.database.database import SessionLocal
+from ProjetoDomotica.model.models import Agendamento, Cena
+from ProjetoDomotica.services.canal import PorCasaReplicado
+from ProjetoDomotica.services.execucao import carregar_passos, executor
+
+
+# (nome, mínimo, máximo) de cada campo: minuto hora dia mês dia_da_semana
+_CAMPOS_CRON = (("minuto", 0, 59), ("hora", 0, 23), ("dia", 1, 31), ("mes", 1, 12), ("dia_semana", 0, 7))
+# Limite da busca pela próxima data (expressões como "0 0 31 2 *" nunca disparam)
+_MAX_ANOS_BUSCA = 5
+
+
+class ExpressaoCron:
+    # Cron de 5 campos com *, listas (1,5), faixas (1-5) e passos (*/15, 8-18/2).
+    # Dia da semana: 0 ou 7 = domingo. Avaliada no horário local do servidor.
+
+    def __init__(self, texto: str):
+        campos = texto.split()
+        if len(campos) != 5:
+            raise ValueError("A expressão cron deve ter 5 campos: minuto hora dia mês dia_da_semana.")
+        self.texto = texto
+        valores = [self._campo(c, nome, minimo, maximo) for c, (nome, minimo, maximo) in zip(campos, _CAMPOS_CRON)]
+        self.minutos, self.horas, self.dias, self.meses, dias_semana = valores
+        self.dias_semana = {d % 7 for d in dias_semana}
+        # Como no cron: com dia e dia da semana restritos, basta um dos dois coincidir
+        self.dia_restrito = campos[2] != "*"
+        self.semana_restrita = campos[4] != "*"
+
+    @staticmethod
+    def _campo(texto: str, nome: str, minimo: int, maximo: int) -> frozenset:
+        valores = set()
+        for parte in texto.split(","):
+            faixa, _, passo = parte.partition("/")
+            try:
+                passo = int(passo) if passo else 1
+                if faixa == "*":
+                    inicio, fim = minimo, maximo
+                elif "-" in faixa:
+                    inicio, fim = (int(v) for v in faixa.split("-", 1))
+                else:
+                    inicio = fim = int(faixa)
+                    if passo != 1:
+                        fim = maximo
+            except ValueError:
+                raise ValueError(f"Campo {nome} inválido na expressão cron: {texto!r}.") from None
+            if passo < 1 or inicio < minimo or fim > maximo or inicio > fim:
+                raise ValueError(f"Campo {nome} fora do intervalo {minimo}-{maximo}: {texto!r}.")
+            valores.update(range(inicio, fim + 1, passo))
+        return frozenset(valores)
+
+    def _dia_coincide(self, data: datetime) -> bool:
+        no_mes = data.day in self.dias
+        na_semana = (data.isoweekday() % 7) in self.dias_semana
+        if self.dia_restrito and self.semana_restrita:
+            return no_mes or na_semana
+        return no_mes and na_semana
+
+    def proxima(self, apos: float) -> float:
+        data = datetime.fromtimestamp(apos).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limite = data.year + _MAX_ANOS_BUSCA
+        while data.year <= limite:
+            if data.month not in self.meses:
+                data = (data.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._dia_coincide(data):
+                data = data.replace(hour=0, minute=0) + timedelta(days=1)
+            elif data.hour not in self.horas:
+                data = data.replace(minute=0) + timedelta(hours=1)
+            elif data.minute not in self.minutos:
+                data += timedelta(minutes=1)
+            else:
+                return data.timestamp()
+        raise ValueError(f"A expressão cron {self.texto!r} não dispara nos próximos {_MAX_ANOS_BUSCA} anos.")
+
+
+class Entrada:
+    # Cópia em memória de um agendamento ativo
+    __slots__ = ("id", "cena_id", "cron", "intervalo", "tolerancia", "politica_atraso", "versao")
+
+    def __init__(self, agendamento: Agendamento, versao: int):
+        self.id = agendamento.id
+        self.cena_id = agendamento.cena_id
+        self.cron = ExpressaoCron(agendamento.cron) if agendamento.cron else None
+        self.intervalo = agendamento.intervalo
+        self.tolerancia = agendamento.tolerancia
+        self.politica_atraso = agendamento.politica_atraso
+        self.versao = versao
+
+    def proxima(self, apos: float, anterior: float = None) -> float:
+        if self.cron is not None:
+            return self.cron.proxima(apos)
+        if anterior is None:
+            return apos + self.intervalo
+        # Mantém a fase do intervalo: pula os disparos que ficaram para trás
+        passos = max(1, int((apos - anterior) // self.intervalo) + 1)
+        return anterior + passos * self.intervalo
+
+
+def proxima_execucao(agendamento: Agendamento, apos: float) -> float:
+    return Entrada(agendamento, 0).proxima(apos)
+
+
+class Agendador:
+    # Um único laço no event loop; os agendamentos ficam num heap ordenado
+    # pelo próximo disparo (O(log n) por disparo). Alterações não mexem no
+    # heap: a versão da entrada muda e as posições antigas são descartadas
+
+    def __init__(self):
+        self._heap = []            # (momento, agendamento_id, versao)
+        self._entradas = {}        # agendamento_id -> Entrada
+        self._lock = threading.Lock()
+        self._versao = 0
+        self._loop = None
+        self._acordar = None
+        self._tarefa = None
+        self.disparos = 0
+        self.atrasados = 0
+
+    def iniciar(self):
+        # Chamado na inicialização da app (ou ao assumir a liderança), dentro do event loop
+        self.parar()
+        self._loop = asyncio.get_running_loop()
+        self._acordar = asyncio.Event()
+        agora = time.time()
+        with SessionLocal() as db:
+            agendamentos = db.scalars(select(Agendamento).where(Agendamento.ativo.is_(True))).all()
+            with self._lock:
+                self._heap, self._entradas = [], {}
+            for agendamento in agendamentos:
+                try:
+                    momento = self._recuperar(agendamento, agora)
+                except ValueError:
+                    agendamento.ativo = False
+                    continue
+                agendamento.proxima_execucao = momento
+                self._inserir(agendamento, momento)
+            db.commit()
+        self._tarefa = self._loop.create_task(self._laco())
+
+    def carregar(self):
+        # Workers que não são o líder: só os agendamentos, sem o laço (para
+        # /agendamentos/proximos); as alterações chegam pelo canal
+        agora = time.time()
+        with SessionLocal() as db:
+            for agendamento in db.scalars(select(Agendamento).where(Agendamento.ativo.is_(True))):
+                try:
+                    self._inserir(agendamento, agendamento.proxima_execucao or proxima_execucao(agendamento, agora))
+                except ValueError:
+                    continue
+
+    def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            self._tarefa = None
+
+    def definir(self, agendamento: Agendamento):
+        # Chamado pelas rotas após gravar o agendamento
+        if not agendamento.ativo or agendamento.proxima_execucao is None:
+            self.remover(agendamento.id)
+            return
+        self._inserir(agendamento, agendamento.proxima_execucao)
+
+    def recarregar(self, agendamento_id: int):
+        # Agendamento gravado por outro worker
+        with SessionLocal() as db:
+            agendamento = db.get(Agendamento, agendamento_id)
+            if agendamento is None:
+                self.remover(agendamento_id)
+            else:
+                self.definir(agendamento)
+
+    def remover(self, agendamento_id: int):
+        with self._lock:
+            self._entradas.pop(agendamento_id, None)
+
+    def proximos(self, limite: int) -> list:
+        # Expande o heap sem alterá-lo: cada disparo retirado empurra o seguinte
+        with self._lock:
+            fila = [item for item in self._heap if self._valido(item)]
+            entradas = dict(self._entradas)
+        heapq.heapify(fila)
+        resultado, agora = [], time.time()
+        while fila and len(resultado) < limite:
+            momento, agendamento_id, versao = heapq.heappop(fila)
+            entrada = entradas[agendamento_id]
+            if momento >= agora:
+                resultado.append({"agendamento_id": agendamento_id, "cena_id": entrada.cena_id, "momento": momento})
+            try:
+                # Momentos já passados (disparados pelo líder, em outro worker) pulam para o próximo
+                heapq.heappush(fila, (entrada.proxima(max(momento, agora), momento), agendamento_id, versao))
+            except ValueError:
+                continue
+        return resultado
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {"agendamentos": len(self._entradas), "heap": len(self._heap),
+                    "disparos": self.disparos, "atrasados": self.atrasados}
+
+    def _recuperar(self, agendamento: Agendamento, agora: float) -> float:
+        # Disparos perdidos enquanto o processo estava parado: dentro da
+        # tolerância, ou com a política "executar_uma_vez", disparam já (uma
+        # única vez, mesmo que vários tenham sido perdidos)
+        momento = agendamento.proxima_execucao
+        if momento is None:
+            return proxima_execucao(agendamento, agora)
+        if momento >= agora:
+            return momento
+        self.atrasados += 1
+        if agora - momento <= agendamento.tolerancia or agendamento.politica_atraso == "executar_uma_vez":
+            return agora
+        return Entrada(agendamento, 0).proxima(agora, momento)
+
+    def _inserir(self, agendamento: Agendamento, momento: float):
+        with self._lock:
+            self._versao += 1
+            entrada = Entrada(agendamento, self._versao)
+            self._entradas[entrada.id] = entrada
+            heapq.heappush(self._heap, (momento, entrada.id, entrada.versao))
+            # Compacta quando as posições descartadas dominam o heap
+            if len(self._heap) > 2 * len(self._entradas) + 1024:
+                self._heap = [item for item in self._heap if self._valido(item)]
+                heapq.heapify(self._heap)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._acordar.set)
+
+    def _valido(self, item) -> bool:
+        entrada = self._entradas.get(item[1])
+        return entrada is not None and entrada.versao == item[2]
+
+    def _retirar_vencidos(self, agora: float):
+        # Devolve as entradas vencidas e o tempo até o próximo disparo
+        vencidos = []
+        with self._lock:
+            while self._heap:
+                momento, agendamento_id, versao = self._heap[0]
+                if not self._valido(self._heap[0]):
+                    heapq.heappop(self._heap)
+                    continue
+                if momento > agora:
+                    return vencidos, momento - agora
+                heapq.heappop(self._heap)
+                vencidos.append((momento, self._entradas[agendamento_id]))
+        return vencidos, None
+
+    async def _laco(self):
+        while True:
+            self._acordar.clear()
+            vencidos, espera = self._retirar_vencidos(time.time())
+            for momento, entrada in vencidos:
+                await self._disparar(entrada, momento)
+            if vencidos:
+                continue
+            try:
+                await asyncio.wait_for(self._acordar.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _disparar(self, entrada: Entrada, momento: float):
+        agora = time.time()
+        try:
+            proxima = entrada.proxima(agora, momento)
+        except ValueError:
+            proxima = None
+        try:
+            passos = await asyncio.to_thread(_carregar_disparo, entrada.id, entrada.cena_id, agora, proxima)
+        except Exception:
+            passos = []
+        if passos is None:
+            # A cena (ou o agendamento) foi removida
+            self.remover(entrada.id)
+            return
+        self.disparos += 1
+        if passos:
+            executor.iniciar(entrada.cena_id, passos)
+        with self._lock:
+            if proxima is not None and self._entradas.get(entrada.id) is entrada:
+                heapq.heappush(self._heap, (proxima, entrada.id, entrada.versao))
+            elif proxima is None:
+                self._entradas.pop(entrada.id, None)
+
+
+def _carregar_disparo(agendamento_id: int, cena_id: int, agora: float, proxima):
+    with SessionLocal() as db:
+        if db.get(Cena, cena_id) is None:
+            db.execute(update(Agendamento).where(Agendamento.id == agendamento_id).values(ativo=False))
+            db.commit()
+            return None
+        db.execute(
+            update(Agendamento)
+            .where(Agendamento.id == agendamento_id)
+            .values(ultima_execucao=agora, proxima_execucao=proxima, ativo=proxima is not None)
+        )
+        passos = carregar_passos(db, cena_id)
+        db.commit()
+        return passos
+
+
+# Um laço por casa, iniciado com a app (ou com a criação da casa); o laço
+# herda a casa e dispara as cenas no banco dela. Nunca descartado. Com vários
+# workers só o líder tem o laço; os outros acompanham pelo canal
+agendador = PorCasaReplicado(Agendador, "agendador", max_itens=None, replicar=(
+    "remover", ("definir", lambda agendamento: ("recarregar", [agendamento.id])),
+))
@@ -0,0 +1,100 @@
+import json
+
+
+class Atributo:
+    __slots__ = ("tipo", "minimo", "maximo", "opcoes", "padrao")
+
+    def __init__(self, tipo, minimo=None, maximo=None, opcoes=None, padrao=None):
+        self.tipo = tipo
+        self.minimo = minimo
+        self.maximo = maximo
+        self.opcoes = opcoes
+        self.padrao = padrao
+
+    def normalizar(self, nome: str, valor):
+        if isinstance(valor, bool) or not isinstance(valor, (int, float, str)):
+            raise ValueError(f"Valor inválido para {nome!r}.")
+        if self.opcoes is not None:
+            if valor not in self.opcoes:
+                raise ValueError(f"{nome!r} deve ser um de: {', '.join(self.opcoes)}.")
+            return valor
+        if isinstance(valor, str) or (self.tipo is int and valor != int(valor)):
+            raise ValueError(f"{nome!r} deve ser um número{' inteiro' if self.tipo is int else ''}.")
+        valor = self.tipo(valor)
+        if (self.minimo is not None and valor < self.minimo) or (self.maximo is not None and valor > self.maximo):
+            raise ValueError(f"{nome!r} deve estar entre {self.minimo} e {self.maximo}.")
+        return valor
+
+
+# Atributos além do liga/desliga, por tipo de dispositivo. Tipos fora daqui
+# (lampada, tomada, tv, ...) só têm o estado booleano.
+ATRIBUTOS_POR_TIPO = {
+    "dimmer": {
+        "brilho": Atributo(int, 0, 100, padrao=100),
+    },
+    "termostato": {
+        "setpoint": Atributo(float, 5, 35, padrao=21.0),
+        "modo": Atributo(str, opcoes=("auto", "aquecer", "resfriar", "ventilar"), padrao="auto"),
+        "temperatura": Atributo(float, -40, 80),   # leitura do sensor
+    },
+    "persiana": {
+        "posicao": Atributo(int, 0, 100, padrao=0),   # % aberta
+    },
+}
+
+
+def validar(tipo: str, valores: dict) -> dict:
+    # Delta normalizado; None volta o atributo ao padrão
+    catalogo = ATRIBUTOS_POR_TIPO.get(tipo, {})
+    normalizados = {}
+    for nome, valor in valores.items():
+        if nome not in catalogo:
+            raise ValueError(f"Atributo {nome!r} não existe para dispositivos do tipo {tipo!r}.")
+        normalizados[nome] = None if valor is None else catalogo[nome].normalizar(nome, valor)
+    return normalizados
+
+
+def expandir(tipo: str, compacto) -> dict:
+    # Todos os atributos do tipo, com os padrões no lugar dos ausentes
+    catalogo = ATRIBUTOS_POR_TIPO.get(tipo, {})
+    compacto = compacto or {}
+    return {nome: compacto.get(nome, atributo.padrao) for nome, atributo in catalogo.items()}
+
+
+def compactar(tipo: str, valores) -> dict:
+    # Só o que difere do padrão (e existe no tipo): o que vai para o banco
+    catalogo = ATRIBUTOS_POR_TIPO.get(tipo, {})
+    return {
+        nome: valor for nome, valor in (valores or {}).items()
+        if nome in catalogo and valor is not None and valor != catalogo[nome].padrao
+    }
+
+
+def efetivos(tipo: str, delta: dict) -> dict:
+    # Delta já validado, com o padrão no lugar de None
+    catalogo = ATRIBUTOS_POR_TIPO.get(tipo, {})
+    return {nome: catalogo[nome].padrao if valor is None else valor for nome, valor in delta.items()}
+
+
+def alterados(tipo: str, compacto, delta: dict) -> dict:
+    # Campos do delta (já validado) que mudam o valor atual, com o valor efetivo
+    atuais = expandir(tipo, compacto)
+    return {nome: valor for nome, valor in efetivos(tipo, delta).items() if atuais.get(nome) != valor}
+
+
+def mesclar(tipo: str, compacto, alteracoes: dict):
+    # Novo valor da coluna depois de aplicar as alterações (None se tudo no padrão)
+    return compactar(tipo, {**expandir(tipo, compacto), **alteracoes}) or None
+
+
+def patch(tipo: str, alteracoes: dict) -> str:
+    # JSON merge patch (json_patch do SQLite): padrões viram null e saem da coluna
+    catalogo = ATRIBUTOS_POR_TIPO.get(tipo, {})
+    return json.dumps(
+        {nome: None if valor == catalogo[nome].padrao else valor for nome, valor in alteracoes.items()},
+        separators=(",", ":"),
+    )
+
+
+# Aplica só os campos alterados; a coluna volta a NULL quando tudo está no padrão
+SQL_PATCH = "UPDATE dispositivos SET atributos = nullif(json_patch(coalesce(atributos, '{}'), ?), '{}') WHERE id = ?"
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+
+from ProjetoDomotica.database.database import MAX_CASAS_ABERTAS, PorCasa, casa_atual, usar_casa
+from ProjetoDomotica.services.eventos import barramento
+
+try:
+    import fcntl
+except ImportError:
+    # Sem fcntl (Windows) só o modo de um processo é suportado
+    fcntl = None
+
+
+# Processos (workers) servindo os mesmos bancos. Com mais de um, o estado em
+# memória de cada processo é mantido coerente pelo canal
+WORKERS = int(os.getenv("DOMOTICA_WORKERS", "1"))
+# Log de notificações compartilhado pelos workers; o lock do líder e as
+# versões das respostas ficam em arquivos ao lado (.lider, .versoes)
+CAMINHO_CANAL = os.getenv("DOMOTICA_CANAL", "./canal.db")
+# Atraso típico de uma notificação entre workers
+INTERVALO_CANAL = float(os.getenv("DOMOTICA_CANAL_INTERVALO", "0.02"))
+# Notificações mais antigas que isso são apagadas do log
+RETENCAO_CANAL = float(os.getenv("DOMOTICA_CANAL_RETENCAO", "60"))
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS notificacoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    momento REAL NOT NULL,
+    origem TEXT NOT NULL,
+    casa TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    dados TEXT NOT NULL
+)
+"""
+
+
+class Canal:
+    # Notificações entre workers num log SQLite só de inserções: cada processo
+    # grava as suas em lotes e lê as dos outros (PRAGMA data_version evita a
+    # consulta quando ninguém escreveu). Quem estava de pé recebe tudo, na
+    # ordem do log. Um dos processos é o líder (lock no arquivo .lider): só ele
+    # dispara os agendamentos e limpa o log; se cair, outro assume
+
+    def __init__(self, caminho: str = CAMINHO_CANAL, ativo: bool = WORKERS > 1, intervalo: float = INTERVALO_CANAL):
+        if ativo and fcntl is None:
+            raise RuntimeError("O modo com vários workers requer um sistema POSIX (fcntl).")
+        self.caminho = caminho
+        self.ativo = ativo
+        self.intervalo = intervalo
+        self.origem = uuid.uuid4().hex
+        # Sozinho, o processo é sempre o líder
+        self.lider = not ativo
+        self._destinos = {}
+        self._ao_assumir = []
+        self._pendentes = []
+        self._lidas = deque()      # (momento, último id lido), para a limpeza
+        self._ultimo = 0
+        self._conexao = None
+        self._lider_fd = None
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self.eventos = defaultdict(int)
+
+    def preparar(self):
+        # Uma vez, antes de iniciar os workers: log vazio e versões zeradas
+        with self._conectar() as conexao:
+            conexao.execute(_ESQUEMA)
+            conexao.execute("DELETE FROM notificacoes")
+        if os.path.exists(self.caminho + ".versoes"):
+            # Os workers criam um arquivo novo, com outro prefixo de ETag
+            os.remove(self.caminho + ".versoes")
+
+    def registrar(self, tipo: str, destino):
+        # destino(dados) roda na thread do canal, na casa de quem enviou
+        self._destinos[tipo] = destino
+
+    def ao_assumir(self, funcao):
+        # Chamada no event loop quando este processo passa a ser o líder
+        self._ao_assumir.append(funcao)
+
+    def enviar(self, tipo: str, dados):
+        if not self.ativo:
+            return
+        with self._lock:
+            self._pendentes.append((time.time(), self.origem, casa_atual.get(), tipo, json.dumps(dados)))
+        self._acordar.set()
+
+    def no_loop(self, funcao, *args):
+        # Para destinos que precisam do event loop do worker
+        self._loop.call_soon_threadsafe(funcao, *args)
+
+    def iniciar(self):
+        # Na inicialização de cada worker, dentro do event loop
+        if not self.ativo:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._conexao = self._conectar()
+        self._conexao.execute(_ESQUEMA)
+        # Só o que for gravado daqui em diante: o estado anterior vem do banco
+        self._ultimo = self._conexao.execute("SELECT COALESCE(MAX(id), 0) FROM notificacoes").fetchone()[0]
+        self._tentar_liderar()
+        self._thread = threading.Thread(target=self._laco, name="canal", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        if self._thread is None:
+            return
+        self._parar.set()
+        self._acordar.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        try:
+            self._gravar()
+        except sqlite3.Error:
+            self.eventos["erros"] += 1
+        self._conexao.close()
+        if self._lider_fd is not None:
+            os.close(self._lider_fd)
+            self._lider_fd = None
+            self.lider = False
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            pendentes = len(self._pendentes)
+        return {
+            "ativo": self.ativo, "workers": WORKERS, "lider": self.lider,
+            "origem": self.origem, "ultimo": self._ultimo, "pendentes": pendentes, **self.eventos,
+        }
+
+    def _conectar(self):
+        conexao = sqlite3.connect(self.caminho, isolation_level=None, check_same_thread=False)
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=NORMAL")
+        conexao.execute("PRAGMA busy_timeout=5000")
+        return conexao
+
+    def _laco(self):
+        versao, proxima_tentativa = None, time.monotonic() + 1
+        while not self._parar.is_set():
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            try:
+                self._gravar()
+                # Muda quando outra conexão grava no log
+                atual = self._conexao.execute("PRAGMA data_version").fetchone()[0]
+                if atual != versao:
+                    versao = atual
+                    self._ler()
+                self._limpar()
+                if not self.lider and time.monotonic() >= proxima_tentativa:
+                    proxima_tentativa = time.monotonic() + 1
+                    if self._tentar_liderar():
+                        for funcao in self._ao_assumir:
+                            self._loop.call_soon_threadsafe(funcao)
+            except sqlite3.Error:
+                self.eventos["erros"] += 1
+
+    def _gravar(self):
+        with self._lock:
+            lote, self._pendentes = self._pendentes, []
+        if not lote:
+            return
+        try:
+            with self._conexao:
+                self._conexao.execute("BEGIN IMMEDIATE")
+                self._conexao.executemany(
+                    "INSERT INTO notificacoes (momento, origem, casa, tipo, dados) VALUES (?, ?, ?, ?, ?)", lote
+                )
+        except sqlite3.Error:
+            # Volta para a fila e tenta na próxima volta
+            with self._lock:
+                self._pendentes[:0] = lote
+            raise
+        self.eventos["enviadas"] += len(lote)
+        self.eventos["lotes"] += 1
+
+    def _ler(self):
+        linhas = self._conexao.execute(
+            "SELECT id, origem, casa, tipo, dados FROM notificacoes WHERE id > ? ORDER BY id", (self._ultimo,)
+        ).fetchall()
+        for id_, origem, casa, tipo, dados in linhas:
+            self._ultimo = id_
+            destino = self._destinos.get(tipo)
+            if origem == self.origem or destino is None:
+                continue
+            self.eventos["recebidas"] += 1
+            try:
+                with usar_casa(casa):
+                    destino(json.loads(dados))
+            except Exception:
+                self.eventos["falhas"] += 1
+        if linhas:
+            self._lidas.append((time.time(), self._ultimo))
+
+    def _limpar(self):
+        # O líder apaga até o último id lido antes da retenção (sem índice por momento)
+        limite, ate = time.time() - RETENCAO_CANAL, None
+        while self._lidas and self._lidas[0][0] < limite:
+            ate = self._lidas.popleft()[1]
+        if ate is not None and self.lider:
+            self._conexao.execute("DELETE FROM notificacoes WHERE id <= ?", (ate,))
+
+    def _tentar_liderar(self) -> bool:
+        fd = os.open(self.caminho + ".lider", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # Liberado pelo sistema se o processo morrer
+        self._lider_fd = fd
+        self.lider = True
+        self.eventos["liderancas"] += 1
+        return True
+
+
+canal = Canal()
+
+
+class PorCasaReplicado(PorCasa):
+    # PorCasa cujas alterações (os métodos em `replicar`) são repetidas nos
+    # outros workers, na mesma casa, quando o canal está ativo. Um método pode
+    # vir com um conversor para argumentos que não vão em JSON:
+    # ("definir", lambda regra: ("recarregar", [regra.id])). Nos outros
+    # workers, casas sem instância são ignoradas (carregam do banco depois)
+
+    def __init__(self, fabrica, nome: str, replicar=(), max_itens=MAX_CASAS_ABERTAS):
+        super().__init__(fabrica, max_itens)
+        self._nome = nome
+        self._replicar = dict(item if isinstance(item, tuple) else (item, None) for item in replicar)
+        canal.registrar(nome, self._aplicar)
+
+    def __getattr__(self, nome):
+        metodo = getattr(self.atual(), nome)
+        if not canal.ativo or nome not in self._replicar:
+            return metodo
+        conversor = self._replicar[nome]
+
+        def replicado(*args):
+            resultado = metodo(*args)
+            canal.enviar(self._nome, conversor(*args) if conversor else (nome, args))
+            return resultado
+
+        return replicado
+
+    def _aplicar(self, dados):
+        metodo, args = dados
+        with self._lock:
+            instancia = self._instancias.get(casa_atual.get())
+        if instancia is not None:
+            getattr(instancia, metodo)(*args)
+
+
+# Deltas de estado publicados aqui chegam aos assinantes (e aos ouvintes que
+# aceitam deltas remotos) dos outros workers
+barramento.ouvir(lambda deltas: canal.enviar("estado", deltas))
+canal.registrar("estado", lambda deltas: barramento.publicar(deltas, remoto=True))
@@ -0,0 +1,316 @@
+import codecs
+import json
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from ProjetoDomotica.database.database import SessionLocal
+from ProjetoDomotica.model.models import (
+    Acao,
+    Cena,
+    Comodo,
+    Dispositivo,
+    HistoricoEstado,
+    cena_acoes,
+    comodo_dispositivo,
+    normalizar,
+)
+from ProjetoDomotica.services.atributos import compactar, validar
+from ProjetoDomotica.services.historico import eventos_de_criacao
+
+
+TAMANHO_LOTE = 1000
+
+# Ordem de dependência: cada tipo de registro só referencia tipos anteriores
+REGISTROS = ("comodo", "dispositivo", "vinculo", "acao", "cena", "cena_acao")
+
+
+class ErroDeImportacao(ValueError):
+    def __init__(self, linha: int, mensagem: str):
+        super().__init__(f"Linha {linha}: {mensagem}")
+        self.linha = linha
+
+
+class Importador:
+    # Lê os registros um a um, acumula por tipo e grava em lotes (executemany)
+    # numa única transação; nomes são resolvidos para ids pelo caminho
+
+    def __init__(self, db: Session, tamanho_lote: int = TAMANHO_LOTE):
+        self.db = db
+        self.tamanho_lote = tamanho_lote
+        self.pendentes = {registro: [] for registro in REGISTROS}
+        self.totais = {registro: 0 for registro in REGISTROS}
+        self.comodos = {}        # nome normalizado -> id
+        self.dispositivos = {}
+        self.cenas = {}
+        self.acoes = {}          # (descrição normalizada, dispositivo_id) -> id
+        self.tipos = {}          # dispositivo_id -> tipo (valida o alvo das ações)
+
+    def adicionar(self, linha: int, registro: dict):
+        tipo = registro.get("registro")
+        if tipo not in self.pendentes:
+            raise ErroDeImportacao(linha, f"tipo de registro inválido: {tipo!r}.")
+
+        # Garante que as referências deste registro já estejam gravadas
+        for anterior in REGISTROS[:REGISTROS.index(tipo)]:
+            if self.pendentes[anterior] and self._depende(tipo, anterior):
+                self._gravar(anterior)
+
+        try:
+            self.pendentes[tipo].append(getattr(self, f"_linha_{tipo}")(registro))
+        except KeyError as exc:
+            raise ErroDeImportacao(linha, f"campo obrigatório ausente: {exc.args[0]}.") from exc
+        except LookupError as exc:
+            raise ErroDeImportacao(linha, str(exc)) from exc
+        except (TypeError, ValueError) as exc:
+            raise ErroDeImportacao(linha, "valor inválido.") from exc
+
+        if len(self.pendentes[tipo]) >= self.tamanho_lote:
+            self._gravar(tipo)
+
+    def concluir(self) -> dict:
+        for tipo in REGISTROS:
+            if self.pendentes[tipo]:
+                self._gravar(tipo)
+        return self.totais
+
+    @staticmethod
+    def _depende(tipo: str, anterior: str) -> bool:
+        return (tipo, anterior) in {
+            ("vinculo", "comodo"), ("vinculo", "dispositivo"),
+            ("acao", "dispositivo"),
+            ("cena_acao", "cena"), ("cena_acao", "acao"), ("cena_acao", "dispositivo"),
+        }
+
+    def _resolver(self, mapa: dict, modelo, nome: str, rotulo: str) -> int:
+        chave = normalizar(nome)
+        if chave not in mapa:
+            # Referência a um registro que já existia antes da importação
+            existente = self.db.scalar(select(modelo.id).where(modelo.nome_normalizado == chave))
+            if existente is None:
+                raise LookupError(f"{rotulo} não encontrado: {nome!r}.")
+            mapa[chave] = existente
+        return mapa[chave]
+
+    def _resolver_acao(self, descricao: str, dispositivo_id: int) -> int:
+        chave = (normalizar(descricao), dispositivo_id)
+        if chave not in self.acoes:
+            existente = self.db.scalar(
+                select(Acao.id).where(Acao.descricao_normalizada == chave[0], Acao.dispositivo_id == dispositivo_id)
+            )
+            if existente is None:
+                raise LookupError(f"ação não encontrada: {descricao!r}.")
+            self.acoes[chave] = existente
+        return self.acoes[chave]
+
+    def _linha_comodo(self, r: dict) -> dict:
+        return {"nome": r["nome"], "nome_normalizado": normalizar(r["nome"])}
+
+    def _linha_dispositivo(self, r: dict) -> dict:
+        return {
+            "nome": r["nome"],
+            "nome_normalizado": normalizar(r["nome"]),
+            "tipo": r["tipo"],
+            "estado": bool(r.get("estado", False)),
+            "atributos": compactar(r["tipo"], validar(r["tipo"], r.get("atributos") or {})) or None,
+        }
+
+    def _linha_vinculo(self, r: dict) -> dict:
+        return {
+            "comodo_id": self._resolver(self.comodos, Comodo, r["comodo"], "cômodo"),
+            "dispositivo_id": self._resolver(self.dispositivos, Dispositivo, r["dispositivo"], "dispositivo"),
+        }
+
+    def _tipo(self, dispositivo_id: int) -> str:
+        if dispositivo_id not in self.tipos:
+            self.tipos[dispositivo_id] = self.db.scalar(select(Dispositivo.tipo).where(Dispositivo.id == dispositivo_id))
+        return self.tipos[dispositivo_id]
+
+    def _linha_acao(self, r: dict) -> dict:
+        dispositivo_id = self._resolver(self.dispositivos, Dispositivo, r["dispositivo"], "dispositivo")
+        alvo = r.get("alvo")
+        return {
+            "descricao": r["descricao"],
+            "descricao_normalizada": normalizar(r["descricao"]),
+            "dispositivo_id": dispositivo_id,
+            "estado": r.get("estado"),
+            "alvo": validar(self._tipo(dispositivo_id), alvo) if alvo else None,
+        }
+
+    def _linha_cena(self, r: dict) -> dict:
+        return {
+            "nome": r["nome"],
+            "nome_normalizado": normalizar(r["nome"]),
+            "palavra_chave": r.get("palavra_chave"),
+            "estado": r.get("estado") or "inativa",
+        }
+
+    def _linha_cena_acao(self, r: dict) -> dict:
+        dispositivo_id = self._resolver(self.dispositivos, Dispositivo, r["dispositivo"], "dispositivo")
+        return {
+            "cena_id": self._resolver(self.cenas, Cena, r["cena"], "cena"),
+            "acao_id": self._resolver_acao(r["acao"], dispositivo_id),
+            "ordem": int(r.get("ordem", 0)),
+            "intervalo": float(r.get("intervalo", 0)),
+        }
+
+    def _gravar(self, tipo: str):
+        linhas, self.pendentes[tipo] = self.pendentes[tipo], []
+        self.totais[tipo] += len(linhas)
+
+        if tipo == "vinculo":
+            self.db.execute(insert(comodo_dispositivo), linhas)
+        elif tipo == "cena_acao":
+            self.db.execute(insert(cena_acoes), linhas)
+        elif tipo == "acao":
+            ids = self.db.scalars(insert(Acao).returning(Acao.id, sort_by_parameter_order=True), linhas)
+            for linha, acao_id in zip(linhas, ids):
+                self.acoes[(linha["descricao_normalizada"], linha["dispositivo_id"])] = acao_id
+        else:
+            modelo, mapa = {
+                "comodo": (Comodo, self.comodos),
+                "dispositivo": (Dispositivo, self.dispositivos),
+                "cena": (Cena, self.cenas),
+            }[tipo]
+            # executemany com RETURNING: os ids voltam na ordem dos parâmetros
+            ids = self.db.scalars(insert(modelo).returning(modelo.id, sort_by_parameter_order=True), linhas)
+            estados = {}
+            for linha, novo_id in zip(linhas, ids):
+                mapa[linha["nome_normalizado"]] = novo_id
+                if tipo == "dispositivo":
+                    self.tipos[novo_id] = linha["tipo"]
+                    estados[novo_id] = linha["estado"]
+            eventos = eventos_de_criacao(estados)
+            if eventos:
+                self.db.execute(insert(HistoricoEstado), eventos)
+
+
+async def ler_ndjson(fluxo):
+    # Quebra o corpo em linhas conforme os pedaços chegam, sem lê-lo inteiro
+    resto = b""
+    numero = 0
+    async for pedaco in fluxo:
+        resto += pedaco
+        *linhas, resto = resto.split(b"\n")
+        for linha in linhas:
+            numero += 1
+            if linha.strip():
+                yield numero, decodificar(numero, linha)
+    if resto.strip():
+        yield numero + 1, decodificar(numero + 1, resto)
+
+
+async def ler_json(fluxo):
+    # Lista JSON de registros, decodificada elemento a elemento com raw_decode
+    decodificador = json.JSONDecoder()
+    texto = ""
+    posicao = 0
+    numero = 0
+    inicio = False
+    fim = False
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    async for pedaco in fluxo:
+        texto = texto[posicao:] + utf8.decode(pedaco)
+        posicao = 0
+        while not fim:
+            while posicao < len(texto) and texto[posicao] in " \t\r\n,":
+                posicao += 1
+            if posicao == len(texto):
+                break
+            if not inicio:
+                if texto[posicao] != "[":
+                    raise ErroDeImportacao(1, "o documento JSON deve ser uma lista de registros.")
+                inicio = True
+                posicao += 1
+                continue
+            if texto[posicao] == "]":
+                fim = True
+                break
+            try:
+                registro, final = decodificador.raw_decode(texto, posicao)
+            except ValueError:
+                # Registro incompleto: espera o próximo pedaço
+                break
+            numero += 1
+            posicao = final
+            if not isinstance(registro, dict):
+                raise ErroDeImportacao(numero, "cada registro deve ser um objeto.")
+            yield numero, registro
+    if not fim:
+        raise ErroDeImportacao(numero + 1, "JSON inválido ou incompleto.")
+
+
+def decodificar(numero: int, linha: bytes) -> dict:
+    try:
+        registro = json.loads(linha)
+    except ValueError as exc:
+        raise ErroDeImportacao(numero, "JSON inválido.") from exc
+    if not isinstance(registro, dict):
+        raise ErroDeImportacao(numero, "cada registro deve ser um objeto.")
+    return registro
+
+
+def _ndjson(registro: dict) -> str:
+    return json.dumps(registro, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def exportar_json(tamanho_lote: int = TAMANHO_LOTE):
+    separador = "["
+    for linha in exportar(tamanho_lote):
+        yield separador + linha[:-1]
+        separador = ","
+    yield "[]" if separador == "[" else "]"
+
+
+def exportar(tamanho_lote: int = TAMANHO_LOTE):
+    # Gerador: percorre cada tabela com yield_per, sem materializá-la
+    with SessionLocal() as db:
+        opcoes = {"yield_per": tamanho_lote}
+
+        for (nome,) in db.execute(select(Comodo.nome).order_by(Comodo.id).execution_options(**opcoes)):
+            yield _ndjson({"registro": "comodo", "nome": nome})
+
+        consulta = select(Dispositivo.nome, Dispositivo.tipo, Dispositivo.estado, Dispositivo.atributos).order_by(Dispositivo.id)
+        for nome, tipo, estado, atributos in db.execute(consulta.execution_options(**opcoes)):
+            registro = {"registro": "dispositivo", "nome": nome, "tipo": tipo, "estado": estado}
+            if atributos:
+                registro["atributos"] = atributos
+            yield _ndjson(registro)
+
+        consulta = (
+            select(Comodo.nome, Dispositivo.nome)
+            .select_from(comodo_dispositivo)
+            .join(Comodo, Comodo.id == comodo_dispositivo.c.comodo_id)
+            .join(Dispositivo, Dispositivo.id == comodo_dispositivo.c.dispositivo_id)
+            .order_by(comodo_dispositivo.c.comodo_id, comodo_dispositivo.c.dispositivo_id)
+        )
+        for comodo, dispositivo in db.execute(consulta.execution_options(**opcoes)):
+            yield _ndjson({"registro": "vinculo", "comodo": comodo, "dispositivo": dispositivo})
+
+        consulta = (
+            select(Acao.descricao, Dispositivo.nome, Acao.estado, Acao.alvo)
+            .join(Dispositivo, Dispositivo.id == Acao.dispositivo_id)
+            .order_by(Acao.id)
+        )
+        for descricao, dispositivo, estado, alvo in db.execute(consulta.execution_options(**opcoes)):
+            registro = {"registro": "acao", "descricao": descricao, "dispositivo": dispositivo, "estado": estado}
+            if alvo:
+                registro["alvo"] = alvo
+            yield _ndjson(registro)
+
+        consulta = select(Cena.nome, Cena.palavra_chave, Cena.estado).order_by(Cena.id)
+        for nome, palavra_chave, estado in db.execute(consulta.execution_options(**opcoes)):
+            yield _ndjson({"registro": "cena", "nome": nome, "palavra_chave": palavra_chave, "estado": estado})
+
+        consulta = (
+            select(Cena.nome, Acao.descricao, Dispositivo.nome, cena_acoes.c.ordem, cena_acoes.c.intervalo)
+            .select_from(cena_acoes)
+            .join(Cena, Cena.id == cena_acoes.c.cena_id)
+            .join(Acao, Acao.id == cena_acoes.c.acao_id)
+            .join(Dispositivo, Dispositivo.id == Acao.dispositivo_id)
+            .order_by(cena_acoes.c.cena_id, cena_acoes.c.ordem, cena_acoes.c.acao_id)
+        )
+        for cena, acao, dispositivo, ordem, intervalo in db.execute(consulta.execution_options(**opcoes)):
+            yield _ndjson({
+                "registro": "cena_acao", "cena": cena, "acao": acao, "dispositivo": dispositivo,
+                "ordem": ordem, "intervalo": intervalo,
+            })
@@ -0,0 +1,134 @@
+import asyncio
+
+from fastapi.responses import JSONResponse
+from ProjetoDomotica.database.database import (
+    CASA_PADRAO,
+    id_de_casa_valido,
+    roteador,
+    usar_casa,
+)
+from ProjetoDomotica.database.migracoes import migrar
+from ProjetoDomotica.services.agendador import agendador
+from ProjetoDomotica.services.canal import canal
+from ProjetoDomotica.services.comandos import indice
+from ProjetoDomotica.services.gateway import descartar_gateway, gateways
+from ProjetoDomotica.services.plano import planos
+from ProjetoDomotica.services.regras import motor
+from ProjetoDomotica.services.resumo import resumo
+from ProjetoDomotica.services.respostas import versoes
+from ProjetoDomotica.services.topologia import topologia
+
+
+class MiddlewareDeCasa:
+    # Escolhe a casa da requisição: prefixo /casas/<casa>/... (removido do
+    # caminho antes do roteamento) ou cabeçalho X-Casa; sem nenhum, a padrão
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+
+        casa = None
+        partes = scope["path"].split("/", 3)
+        if len(partes) == 4 and partes[1] == "casas" and partes[3]:
+            casa = partes[2]
+            caminho = "/" + partes[3]
+            scope = {**scope, "path": caminho, "raw_path": caminho.encode()}
+        else:
+            for nome, valor in scope["headers"]:
+                if nome == b"x-casa":
+                    casa = valor.decode("latin-1")
+                    break
+        casa = casa or CASA_PADRAO
+
+        if not id_de_casa_valido(casa):
+            return await _recusar(scope, receive, send, 400, "Identificador de casa inválido.")
+        if not roteador.existe(casa):
+            return await _recusar(scope, receive, send, 404, "Casa não encontrada.")
+        with usar_casa(casa):
+            await self.app(scope, receive, send)
+
+
+async def _recusar(scope, receive, send, status_code: int, detalhe: str):
+    if scope["type"] == "websocket":
+        await send({"type": "websocket.close", "code": 1008, "reason": detalhe})
+        return
+    await JSONResponse({"detail": detalhe}, status_code=status_code)(scope, receive, send)
+
+
+def preparar_bancos():
+    # Esquema criado ou migrado (database/migracoes.py) em todas as casas.
+    # Com vários workers, roda uma vez antes de iniciá-los
+    # (python -m ProjetoDomotica.servidor)
+    for casa in roteador.casas():
+        migrar(roteador.engine(casa))
+
+
+def iniciar_casas():
+    # Na inicialização: agendamentos e regras carregados em cada casa
+    for casa in roteador.casas():
+        _iniciar(casa)
+
+
+def _iniciar(casa: str):
+    with usar_casa(casa):
+        if canal.lider:
+            agendador.iniciar()
+        else:
+            agendador.carregar()
+        motor.iniciar()
+
+
+def assumir_agendamentos():
+    # Este worker virou o líder (o anterior parou): passa a disparar os agendamentos
+    for casa in roteador.casas():
+        with usar_casa(casa):
+            agendador.iniciar()
+
+
+async def parar_casas():
+    for _, instancia in agendador.instancias():
+        instancia.parar()
+    for gateway in gateways():
+        await gateway.parar()
+
+
+def criar_casa(casa: str) -> bool:
+    # Chamado no threadpool; o agendador é iniciado depois, no event loop
+    return roteador.criar(casa)
+
+
+def iniciar_casa(casa: str):
+    _iniciar(casa)
+    canal.enviar("casas", ("criada", casa))
+
+
+async def remover_casa(casa: str, apagar: bool = True):
+    instancia = agendador.descartar(casa)
+    if instancia is not None:
+        instancia.parar()
+    gateway = descartar_gateway(casa)
+    if gateway is not None:
+        await gateway.parar()
+    for estado in (topologia, resumo, indice, planos, motor, versoes):
+        estado.descartar(casa)
+    if apagar:
+        roteador.remover(casa)
+        canal.enviar("casas", ("removida", casa))
+    else:
+        roteador.fechar_casa(casa)
+
+
+def _casa_alterada(dados):
+    # Casa criada ou removida em outro worker
+    acao, casa = dados
+    if acao == "criada":
+        canal.no_loop(_iniciar, casa)
+    else:
+        canal.no_loop(lambda: asyncio.ensure_future(remover_casa(casa, apagar=False)))
+
+
+canal.registrar("casas", _casa_alterada)
+canal.ao_assumir(assumir_agendamentos)
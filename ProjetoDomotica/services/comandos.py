@@ -0,0 +1,173 @@
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from itertools import chain
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ProjetoDomotica.model.models import Cena
+from ProjetoDomotica.services.canal import PorCasaReplicado
+
+
+# Palavras que não ajudam a distinguir cenas ("ativar a cena do jantar")
+PALAVRAS_VAZIAS = frozenset("""
+a o as os um uma uns umas de da do das dos em na no nas nos num numa
+e ou por pra para pro com sem que ao aos se me meu minha por favor
+ativar ative ativa executar execute rodar rode iniciar inicie liga ligar ligue acionar acione
+cena cenas modo
+""".split())
+
+PESO_PALAVRA_CHAVE = 2.0
+PESO_NOME = 1.0
+# Termos mais raros considerados por frase (limita a busca combinatória)
+MAX_TERMOS_CONSULTA = 6
+
+_SEPARADORES = re.compile(r"[^0-9a-z]+")
+
+
+def tokenizar(texto: str) -> list:
+    # Sem acentos e sem maiúsculas: "Iluminação" e "iluminacao" viram o mesmo termo
+    sem_acentos = unicodedata.normalize("NFKD", texto.casefold())
+    sem_acentos = "".join(c for c in sem_acentos if not unicodedata.combining(c))
+    return [t for t in _SEPARADORES.split(sem_acentos) if t and t not in PALAVRAS_VAZIAS]
+
+
+class IndiceDeCenas:
+    # Índice invertido termo -> conjunto de cenas, separado por campo (palavra-chave
+    # ou nome), atualizado a cada escrita em cenas. Como a pontuação depende só de
+    # quais (termo, campo) a cena tem, a busca combina os conjuntos por interseção
+    # (em C) e poda pelo limite superior, sem pontuar cena por cena
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._carregado = False
+        self._limpar()
+
+    def buscar(self, db: Session, texto: str):
+        with self._lock:
+            if not self._carregado:
+                self._carregar(db)
+        return self.consultar(texto)
+
+    def consultar(self, texto: str):
+        termos = tokenizar(texto)
+        with self._lock:
+            return self._buscar(termos)
+
+    def definir(self, cena_id: int, nome: str, palavra_chave=None):
+        with self._lock:
+            if self._carregado:
+                self._remover(cena_id)
+                self._adicionar(cena_id, nome, palavra_chave)
+
+    def remover(self, cena_id: int):
+        with self._lock:
+            if self._carregado:
+                self._remover(cena_id)
+
+    def limpar(self):
+        with self._lock:
+            self._carregado = False
+            self._limpar()
+
+    def carregar_de(self, cenas):
+        # (id, nome, palavra_chave) de todas as cenas; usado também pelo benchmark
+        with self._lock:
+            self._limpar()
+            for cena_id, nome, palavra_chave in cenas:
+                self._adicionar(cena_id, nome, palavra_chave)
+            self._carregado = True
+
+    def _limpar(self):
+        self._campos = {PESO_PALAVRA_CHAVE: defaultdict(set), PESO_NOME: defaultdict(set)}
+        self._cenas = {}    # cena_id -> (nome, {termo: peso})
+        self._ordem = {}    # cena_id -> chave de desempate
+        # Vencedora já calculada de cada conjunto do índice (frases de um só termo)
+        self._vencedoras = {}
+
+    def _carregar(self, db: Session):
+        self._limpar()
+        for cena_id, nome, palavra_chave in db.execute(select(Cena.id, Cena.nome, Cena.palavra_chave)):
+            self._adicionar(cena_id, nome, palavra_chave)
+        self._carregado = True
+
+    def _adicionar(self, cena_id: int, nome: str, palavra_chave):
+        pesos = dict.fromkeys(tokenizar(nome), PESO_NOME)
+        pesos.update(dict.fromkeys(tokenizar(palavra_chave or ""), PESO_PALAVRA_CHAVE))
+        self._cenas[cena_id] = (nome, pesos)
+        # Empate: a cena com menos termos (a frase cobre mais dela), depois o menor id
+        self._ordem[cena_id] = (len(pesos) << 32) | cena_id
+        for termo, peso in pesos.items():
+            cenas = self._campos[peso][termo]
+            cenas.add(cena_id)
+            self._vencedoras.pop(id(cenas), None)
+
+    def _remover(self, cena_id: int):
+        anterior = self._cenas.pop(cena_id, None)
+        if anterior is None:
+            return
+        del self._ordem[cena_id]
+        for termo, peso in anterior[1].items():
+            cenas = self._campos[peso][termo]
+            cenas.discard(cena_id)
+            self._vencedoras.pop(id(cenas), None)
+            if not cenas:
+                del self._campos[peso][termo]
+
+    def _buscar(self, termos: list):
+        # Pontuação: soma de peso x raridade (idf) dos termos em comum
+        total = len(self._cenas)
+        opcoes = []
+        for termo in set(termos):
+            conjuntos = [(peso, campo[termo]) for peso, campo in self._campos.items() if termo in campo]
+            if conjuntos:
+                idf = math.log(1 + total / sum(len(c) for _, c in conjuntos))
+                opcoes.append([(peso * idf, cenas) for peso, cenas in conjuntos])
+        if not opcoes:
+            return None
+        # Termos raros primeiro: interseções pequenas e boas soluções cedo
+        opcoes.sort(key=lambda o: -o[0][0])
+        opcoes = opcoes[:MAX_TERMOS_CONSULTA]
+        restante = [0.0] * (len(opcoes) + 1)
+        for i in range(len(opcoes) - 1, -1, -1):
+            restante[i] = restante[i + 1] + opcoes[i][0][0]
+
+        melhor = [0.0, []]   # pontuação, conjuntos empatados
+        brutos = set()       # ids dos conjuntos empatados que são do próprio índice
+
+        def explorar(i, cenas, pontos, bruto=False):
+            if pontos + restante[i] < melhor[0]:
+                return
+            if i == len(opcoes):
+                if cenas is None:
+                    return
+                if pontos > melhor[0]:
+                    melhor[:] = [pontos, [cenas]]
+                    brutos.clear()
+                elif pontos == melhor[0]:
+                    melhor[1].append(cenas)
+                if bruto:
+                    brutos.add(id(cenas))
+                return
+            for valor, conjunto in opcoes[i]:
+                novas = conjunto if cenas is None else cenas & conjunto
+                if novas:
+                    explorar(i + 1, novas, pontos + valor, cenas is None)
+            # Sem exigir o termo: cobre as cenas que não o contêm
+            explorar(i + 1, cenas, pontos, bruto)
+
+        explorar(0, None, 0.0)
+        empatados = melhor[1]
+        if len(empatados) == 1 and id(empatados[0]) in brutos:
+            chave = id(empatados[0])
+            if chave not in self._vencedoras:
+                self._vencedoras[chave] = min(empatados[0], key=self._ordem.__getitem__)
+            vencedora = self._vencedoras[chave]
+        else:
+            vencedora = min(chain.from_iterable(empatados), key=self._ordem.__getitem__)
+        return {"cena_id": vencedora, "nome": self._cenas[vencedora][0], "pontuacao": round(melhor[0], 4)}
+
+
+indice = PorCasaReplicado(IndiceDeCenas, "indice", replicar=("definir", "remover", "limpar"))
@@ -0,0 +1,65 @@
+import gzip
+import os
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import brotli
+except ImportError:
+    # Opcional: sem o pacote brotli, só gzip
+    brotli = None
+
+
+# Corpos menores que isso vão sem compressão (o ganho não paga o cabeçalho)
+MINIMO_COMPRESSAO = int(os.getenv("DOMOTICA_GZIP_MINIMO", "500"))
+# Nível do gzip nas respostas dinâmicas, comprimidas a cada requisição; os
+# arquivos estáticos e a página inicial usam o máximo, uma vez só
+NIVEL_GZIP = int(os.getenv("DOMOTICA_GZIP_NIVEL", "5"))
+
+# Em ordem de preferência
+CODIFICACOES = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def aceitas(cabecalho: str) -> set:
+    # Codificações do Accept-Encoding, sem as recusadas com q=0
+    resultado, recusadas = set(), set()
+    for parte in cabecalho.lower().split(","):
+        nome, _, parametros = parte.partition(";")
+        nome = nome.strip()
+        qualidade = parametros.strip()
+        if qualidade.startswith("q=") and qualidade[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            recusadas.add(nome)
+        elif nome:
+            resultado.add(nome)
+    if "*" in resultado:
+        resultado.update(CODIFICACOES)
+    return resultado - recusadas
+
+
+def escolher(cabecalho: str, disponiveis) -> str:
+    # A melhor codificação aceita entre as disponíveis; None para o original
+    if not cabecalho:
+        return None
+    aceitas_ = aceitas(cabecalho)
+    for codificacao in CODIFICACOES:
+        if codificacao in aceitas_ and codificacao in disponiveis:
+            return codificacao
+    return None
+
+
+def comprimir(corpo: bytes, codificacao: str, maximo: bool = False) -> bytes:
+    if codificacao == "br":
+        return brotli.compress(corpo, quality=11 if maximo else 5)
+    # mtime=0: a mesma entrada gera sempre os mesmos bytes
+    return gzip.compress(corpo, compresslevel=9 if maximo else NIVEL_GZIP, mtime=0)
+
+
+class MiddlewareDeGzip(GZipMiddleware):
+    # O GZipMiddleware só procura "gzip" no Accept-Encoding; aqui "gzip;q=0"
+    # é respeitado como recusa
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and "gzip" not in aceitas(Headers(scope=scope).get("accept-encoding", "")):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import mimetypes
+import os
+
+from fastapi import Request, Response
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from ProjetoDomotica.services.compressao import CODIFICACOES, MINIMO_COMPRESSAO, comprimir, escolher
+
+# Arquivos de static/ com o hash do conteúdo no nome e as versões comprimidas,
+# gerados por construir() (no startup, ou uma vez antes dos workers)
+DESTINO_ESTATICOS = os.getenv("DOMOTICA_ESTATICOS_DIR", "./dist")
+MANIFESTO = "manifesto.json"
+_SUFIXOS = {"gzip": "gz", "br": "br"}
+
+# Nomes com hash nunca mudam de conteúdo: o navegador guarda por um ano
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+
+_COMPRIMIVEIS = {"application/javascript", "application/json", "image/svg+xml", "application/xml"}
+
+
+def _comprimivel(nome: str) -> bool:
+    tipo = mimetypes.guess_type(nome)[0] or ""
+    return tipo.startswith("text/") or tipo in _COMPRIMIVEIS
+
+
+def construir(origem: str = "static", destino: str = DESTINO_ESTATICOS) -> dict:
+    # nome.css -> nome.<hash>.css (+ .gz e .br), e o manifesto com o mapa dos
+    # nomes. Arquivos de builds anteriores fora do manifesto atual e do
+    # anterior são apagados: páginas antigas ainda abertas continuam válidas
+    anterior = _ler_manifesto(destino)
+    arquivos = {}
+    for pasta, _, nomes in os.walk(origem):
+        for nome in sorted(nomes):
+            caminho = os.path.join(pasta, nome)
+            relativo = os.path.relpath(caminho, origem).replace(os.sep, "/")
+            with open(caminho, "rb") as arquivo:
+                conteudo = arquivo.read()
+            raiz, extensao = os.path.splitext(relativo)
+            final = f"{raiz}.{hashlib.blake2b(conteudo, digest_size=5).hexdigest()}{extensao}"
+            arquivos[relativo] = final
+            _gravar(destino, final, conteudo)
+            if _comprimivel(nome) and len(conteudo) >= MINIMO_COMPRESSAO:
+                for codificacao in CODIFICACOES:
+                    comprimido = comprimir(conteudo, codificacao, maximo=True)
+                    if len(comprimido) < len(conteudo):
+                        _gravar(destino, f"{final}.{_SUFIXOS[codificacao]}", comprimido)
+
+    manifesto = {"arquivos": arquivos}
+    os.makedirs(destino, exist_ok=True)
+    temporario = os.path.join(destino, MANIFESTO + ".tmp")
+    with open(temporario, "w") as arquivo:
+        json.dump(manifesto, arquivo, indent=2, sort_keys=True)
+    os.replace(temporario, os.path.join(destino, MANIFESTO))
+
+    manter = set(arquivos.values()) | set(anterior.get("arquivos", {}).values())
+    for pasta, _, nomes in os.walk(destino):
+        for nome in nomes:
+            relativo = os.path.relpath(os.path.join(pasta, nome), destino).replace(os.sep, "/")
+            base = relativo.removesuffix(".gz").removesuffix(".br")
+            if relativo != MANIFESTO and base not in manter:
+                os.remove(os.path.join(pasta, nome))
+    return manifesto
+
+
+def _gravar(destino: str, relativo: str, conteudo: bytes):
+    caminho = os.path.join(destino, relativo)
+    if os.path.exists(caminho):
+        # Mesmo nome, mesmo conteúdo (o hash está no nome)
+        return
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho + ".tmp", "wb") as arquivo:
+        arquivo.write(conteudo)
+    os.replace(caminho + ".tmp", caminho)
+
+
+def _ler_manifesto(destino: str) -> dict:
+    try:
+        with open(os.path.join(destino, MANIFESTO)) as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {}
+
+
+class Variantes:
+    # Um arquivo estático e as versões comprimidas: codificação -> (caminho, stat)
+    __slots__ = ("tipo", "imutavel", "arquivos")
+
+    def __init__(self, tipo: str, imutavel: bool, arquivos: dict):
+        self.tipo = tipo
+        self.imutavel = imutavel
+        self.arquivos = arquivos
+
+
+class ArquivosEstaticos(StaticFiles):
+    # StaticFiles que, depois de carregar() o build, serve cada arquivo pelo
+    # nome com hash (cache imutável) ou pelo nome original (revalidado), na
+    # versão comprimida que o Accept-Encoding aceitar. Sem build, ou para
+    # arquivos fora dele, funciona como o StaticFiles comum
+
+    def __init__(self, *args, destino: str = DESTINO_ESTATICOS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.destino = destino
+        self.prefixo = "/static"
+        self._nomes = {}       # nome original -> nome com hash
+        self._variantes = {}   # nome (original ou com hash) -> Variantes
+
+    def carregar(self):
+        manifesto = _ler_manifesto(self.destino)
+        nomes, variantes = {}, {}
+        for original, final in manifesto.get("arquivos", {}).items():
+            caminho = os.path.join(self.destino, final)
+            if not os.path.exists(caminho):
+                continue
+            arquivos = {None: (caminho, os.stat(caminho))}
+            for codificacao, sufixo in _SUFIXOS.items():
+                if os.path.exists(f"{caminho}.{sufixo}"):
+                    arquivos[codificacao] = (f"{caminho}.{sufixo}", os.stat(f"{caminho}.{sufixo}"))
+            tipo = mimetypes.guess_type(original)[0] or "application/octet-stream"
+            nomes[original] = final
+            variantes[os.path.normpath(final)] = Variantes(tipo, True, arquivos)
+            variantes[os.path.normpath(original)] = Variantes(tipo, False, arquivos)
+        self._nomes, self._variantes = nomes, variantes
+
+    def url(self, nome: str) -> str:
+        # Para os templates: o nome com hash quando há build
+        return f"{self.prefixo}/{self._nomes.get(nome, nome)}"
+
+    async def get_response(self, path: str, scope) -> Response:
+        variantes = self._variantes.get(path)
+        if variantes is None or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        cabecalhos = Headers(scope=scope)
+        codificacao = escolher(cabecalhos.get("accept-encoding", ""), variantes.arquivos)
+        caminho, stat_result = variantes.arquivos[codificacao]
+        extras = {"cache-control": CACHE_IMUTAVEL if variantes.imutavel else "no-cache"}
+        if len(variantes.arquivos) > 1:
+            extras["vary"] = "Accept-Encoding"
+        if codificacao is not None:
+            extras["content-encoding"] = codificacao
+        resposta = FileResponse(caminho, stat_result=stat_result, headers=extras, media_type=variantes.tipo)
+        if self.is_not_modified(resposta.headers, cabecalhos):
+            return NotModifiedResponse(resposta.headers)
+        return resposta
+
+
+class PaginaEmCache:
+    # Template sem dados por requisição, renderizado uma vez (no startup) com
+    # as versões comprimidas e a ETag prontas
+
+    def __init__(self, templates, nome: str):
+        self.templates = templates
+        self.nome = nome
+        self._variantes = {}
+        self.etag = None
+
+    def renderizar(self, **contexto):
+        html = self.templates.get_template(self.nome).render(**contexto).encode()
+        variantes = {None: html}
+        for codificacao in CODIFICACOES:
+            variantes[codificacao] = comprimir(html, codificacao, maximo=True)
+        self.etag = f'"{hashlib.blake2b(html, digest_size=8).hexdigest()}"'
+        self._variantes = variantes
+
+    def responder(self, request: Request) -> Response:
+        cabecalhos = {"etag": self.etag, "cache-control": "no-cache", "vary": "Accept-Encoding"}
+        condicional = request.headers.get("if-none-match")
+        if condicional and self.etag in [t.strip().removeprefix("W/") for t in condicional.split(",")]:
+            return Response(status_code=304, headers=cabecalhos)
+        codificacao = escolher(request.headers.get("accept-encoding", ""), self._variantes)
+        if codificacao is not None:
+            cabecalhos["content-encoding"] = codificacao
+        return Response(self._variantes[codificacao], media_type="text/html", headers=cabecalhos)
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from contextvars import ContextVar
+
+from ProjetoDomotica.database.database import casa_atual
+
+
+# Deltas pendentes por assinante; acima disso os mais antigos são descartados
+CAPACIDADE_PADRAO = 256
+
+# Regras que levaram à mudança sendo publicada, da primeira à última; vazia
+# quando a mudança não veio de uma regra. Herdada pelas tarefas da execução
+cadeia_atual = ContextVar("cadeia_de_regras", default=())
+
+
+def delta_estado(dispositivo_id: int, estado, comodo_ids, atributos=None) -> dict:
+    # Só o que mudou: sem "estado" quando apenas atributos mudaram
+    delta = {"id": dispositivo_id}
+    if estado is not None:
+        delta["estado"] = estado
+    delta["comodos"] = list(comodo_ids)
+    if atributos:
+        delta["atributos"] = atributos
+    return delta
+
+
+class Assinatura:
+    def __init__(self, comodo_id=None, capacidade: int = CAPACIDADE_PADRAO):
+        self.casa = casa_atual.get()
+        self.comodo_id = comodo_id
+        self.fila = asyncio.Queue(maxsize=capacidade)
+        self.descartados = 0
+
+    def aceita(self, delta: dict) -> bool:
+        return self.comodo_id is None or self.comodo_id in delta["comodos"]
+
+    def entregar(self, deltas: list):
+        # Consumidor lento não trava o publicador: descarta o lote mais antigo
+        if self.fila.full():
+            self.fila.get_nowait()
+            self.descartados += 1
+        self.fila.put_nowait(deltas)
+
+    async def proximo(self) -> list:
+        return await self.fila.get()
+
+
+class BarramentoDeEstado:
+    def __init__(self):
+        self._assinaturas = set()
+        self._ouvintes = []   # (ouvinte, recebe deltas de outros workers)
+        self._loop = None
+        self._lock = threading.Lock()
+
+    @property
+    def tem_assinantes(self) -> bool:
+        return bool(self._assinaturas)
+
+    @property
+    def quantidade_assinantes(self) -> int:
+        return len(self._assinaturas)
+
+    @property
+    def ativo(self) -> bool:
+        # Há alguém interessado nos deltas (vale a pena montá-los)
+        return bool(self._assinaturas or self._ouvintes)
+
+    def ouvir(self, ouvinte, remotos: bool = False):
+        # Ouvintes síncronos recebem todo lote publicado, na thread do publicador;
+        # devem ser rápidos e não bloquear. Com vários workers, só os com
+        # remotos=True recebem também os lotes publicados nos outros processos
+        # (histórico e regras tratam cada mudança uma vez, onde ela aconteceu)
+        self._ouvintes.append((ouvinte, remotos))
+
+    def assinar(self, comodo_id=None, capacidade: int = CAPACIDADE_PADRAO) -> Assinatura:
+        self._loop = asyncio.get_running_loop()
+        assinatura = Assinatura(comodo_id, capacidade)
+        with self._lock:
+            self._assinaturas.add(assinatura)
+        return assinatura
+
+    def cancelar(self, assinatura: Assinatura):
+        with self._lock:
+            self._assinaturas.discard(assinatura)
+
+    def publicar(self, deltas: list, remoto: bool = False):
+        # Pode ser chamado das rotas síncronas (threadpool), do próprio loop ou
+        # do canal (remoto=True); os deltas são da casa atual de quem publica
+        if not deltas:
+            return
+        for ouvinte, remotos in self._ouvintes:
+            if remotos or not remoto:
+                ouvinte(deltas)
+        if not self._assinaturas or self._loop is None:
+            return
+        try:
+            no_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            no_loop = False
+
+        casa = casa_atual.get()
+        if no_loop:
+            self._distribuir(casa, deltas)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._distribuir, casa, deltas)
+
+    def _distribuir(self, casa: str, deltas: list):
+        with self._lock:
+            assinaturas = [a for a in self._assinaturas if a.casa == casa]
+        for assinatura in assinaturas:
+            filtrados = [d for d in deltas if assinatura.aceita(d)]
+            if filtrados:
+                assinatura.entregar(filtrados)
+
+
+barramento = BarramentoDeEstado()
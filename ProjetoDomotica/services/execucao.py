@@ -0,0 +1,157 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from itertools import groupby
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, lazyload
+from ProjetoDomotica.database.database import SessionLocal, casa_atual
+from ProjetoDomotica.model.models import Acao, Dispositivo, cena_acoes
+from ProjetoDomotica.services.atributos import alterados, efetivos, mesclar, validar
+from ProjetoDomotica.services.eventos import barramento, delta_estado
+from ProjetoDomotica.services.gateway import obter_gateway
+from ProjetoDomotica.services.topologia import topologia
+
+
+# Quantidade de execuções finalizadas mantidas para consulta
+MAX_EXECUCOES = 1000
+
+
+class Execucao:
+    def __init__(self, cena_id: int, total: int):
+        self.id = uuid.uuid4().hex
+        self.casa = casa_atual.get()
+        self.cena_id = cena_id
+        self.status = "pendente"
+        self.total = total
+        self.concluidas = 0
+        self.falhas = 0
+        self.iniciada_em = datetime.now()
+        self.finalizada_em = None
+        self.tarefa = None
+
+    @property
+    def finalizada(self) -> bool:
+        return self.finalizada_em is not None
+
+
+def carregar_passos(db: Session, cena_id: int):
+    # Agrupa as ações da cena em passos pela coluna "ordem"
+    linhas = db.execute(
+        select(
+            cena_acoes.c.ordem,
+            cena_acoes.c.intervalo,
+            Acao.id.label("acao_id"),
+            Acao.dispositivo_id,
+            Acao.estado,
+            Acao.alvo,
+        )
+        .join(Acao, Acao.id == cena_acoes.c.acao_id)
+        .where(cena_acoes.c.cena_id == cena_id)
+        .order_by(cena_acoes.c.ordem, cena_acoes.c.acao_id)
+    ).all()
+    return [list(passo) for _, passo in groupby(linhas, key=lambda linha: linha.ordem)]
+
+
+def aplicar_acao(dispositivo_id: int, estado, alvo=None):
+    with SessionLocal() as db:
+        d = db.get(Dispositivo, dispositivo_id, options=[lazyload(Dispositivo.comodos)])
+        if not d:
+            raise LookupError(f"Dispositivo {dispositivo_id} não encontrado.")
+        if estado is None and not alvo:
+            estado = not d.estado
+        # Ação que repete o estado atual não grava nem publica nada
+        if estado == d.estado:
+            estado = None
+        if estado is not None:
+            d.estado = estado
+        mudou = {}
+        if alvo:
+            # O tipo pode ter mudado desde que a ação foi criada: valida de novo
+            mudou = alterados(d.tipo, d.atributos, validar(d.tipo, alvo))
+            d.atributos = mesclar(d.tipo, d.atributos, mudou)
+        if estado is None and not mudou:
+            return
+        comodo_ids = topologia.comodos_dos_dispositivos(db, [dispositivo_id])[dispositivo_id]
+        delta = delta_estado(d.id, estado, comodo_ids, mudou)
+        db.commit()
+    barramento.publicar([delta])
+
+
+def preparar_comando(dispositivo_id: int, estado, alvo=None):
+    # Alterações (resolvendo a inversão) e cômodos do comando enviado pelo gateway
+    with SessionLocal() as db:
+        linha = db.execute(
+            select(Dispositivo.estado, Dispositivo.tipo).where(Dispositivo.id == dispositivo_id)
+        ).first()
+        if linha is None:
+            raise LookupError(f"Dispositivo {dispositivo_id} não encontrado.")
+        comodo_ids = topologia.comodos_dos_dispositivos(db, [dispositivo_id])[dispositivo_id]
+    if estado is None and not alvo:
+        estado = not linha.estado
+    alteracoes = {} if estado is None else {"estado": estado}
+    if alvo:
+        alteracoes.update(efetivos(linha.tipo, validar(linha.tipo, alvo)))
+    return alteracoes, comodo_ids
+
+
+class ExecutorDeCenas:
+    def __init__(self, max_execucoes: int = MAX_EXECUCOES):
+        self.max_execucoes = max_execucoes
+        self._execucoes = OrderedDict()
+        self._tarefas = set()
+
+    def iniciar(self, cena_id: int, passos) -> Execucao:
+        execucao = Execucao(cena_id, sum(len(passo) for passo in passos))
+        self._registrar(execucao)
+
+        tarefa = execucao.tarefa = asyncio.get_running_loop().create_task(self._executar(execucao, passos))
+        # Mantém uma referência forte até a tarefa terminar
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+        return execucao
+
+    def obter(self, execucao_id: str):
+        execucao = self._execucoes.get(execucao_id)
+        if execucao is not None and execucao.casa == casa_atual.get():
+            return execucao
+        return None
+
+    def _registrar(self, execucao: Execucao):
+        self._execucoes[execucao.id] = execucao
+        excedente = len(self._execucoes) - self.max_execucoes
+        if excedente <= 0:
+            return
+        antigas = [e.id for e in self._execucoes.values() if e.finalizada][:excedente]
+        for execucao_id in antigas:
+            del self._execucoes[execucao_id]
+
+    async def _executar(self, execucao: Execucao, passos):
+        execucao.status = "executando"
+        for passo in passos:
+            # Ações independentes do mesmo passo são disparadas em paralelo
+            await asyncio.gather(*(self._disparar(execucao, acao) for acao in passo))
+
+        execucao.status = "concluida" if not execucao.falhas else "concluida_com_falhas"
+        execucao.finalizada_em = datetime.now()
+
+    async def _disparar(self, execucao: Execucao, acao):
+        if acao.intervalo > 0:
+            await asyncio.sleep(acao.intervalo)
+        try:
+            gateway = obter_gateway()
+            if gateway is None:
+                await asyncio.to_thread(aplicar_acao, acao.dispositivo_id, acao.estado, acao.alvo)
+            else:
+                alteracoes, comodo_ids = await asyncio.to_thread(
+                    preparar_comando, acao.dispositivo_id, acao.estado, acao.alvo
+                )
+                await gateway.enviar(acao.dispositivo_id, alteracoes, comodo_ids)
+        except Exception:
+            execucao.falhas += 1
+        else:
+            execucao.concluidas += 1
+
+
+executor = ExecutorDeCenas()
@@ -0,0 +1,377 @@
+import asyncio
+import importlib
+import os
+import random
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from sqlalchemy import select
+from ProjetoDomotica.database.database import PorCasa, SessionLocal
+from ProjetoDomotica.model.models import Dispositivo
+from ProjetoDomotica.services.atributos import SQL_PATCH, alterados, patch
+from ProjetoDomotica.services.eventos import barramento, cadeia_atual, delta_estado
+
+
+# "simulado" ou "pacote.modulo:Classe"; vazio desliga o gateway
+DRIVER = os.getenv("DOMOTICA_DRIVER", "")
+
+JANELA_LOTE = 0.005          # segundos acumulando comandos antes de enviar
+TAMANHO_LOTE = 500           # comandos por chamada ao driver
+MAX_EM_VOO = 256             # cômodos com lote em voo ao mesmo tempo
+MAX_TENTATIVAS = 4
+ESPERA_BASE = 0.05           # segundos; dobra a cada nova tentativa
+JANELA_GRAVACAO = 0.05       # segundos acumulando confirmações antes do UPDATE
+TAMANHO_BLOCO = 5000         # ids por consulta IN (o SQLite limita a quantidade de parâmetros)
+
+
+class DeviceDriver(ABC):
+    # Fala o protocolo dos dispositivos. Recebe um lote de um mesmo cômodo, com
+    # (dispositivo_id, alterações) onde alterações é um delta como
+    # {"estado": True, "brilho": 40}, e devolve {dispositivo_id: alterações}
+    # dos que confirmaram; os ausentes são tratados como falha e reenviados.
+    # Exceção = falha do lote inteiro.
+
+    @abstractmethod
+    async def enviar(self, comodo_id, comandos: list) -> dict:
+        ...
+
+    async def fechar(self):
+        pass
+
+
+class DriverSimulado(DeviceDriver):
+    # Frota em memória, com latência e taxa de falha configuráveis
+
+    def __init__(self, latencia: float = None, taxa_falha: float = None, taxa_falha_lote: float = None, semente=None):
+        self.latencia = float(os.getenv("DOMOTICA_SIM_LATENCIA", "0.02")) if latencia is None else latencia
+        self.taxa_falha = float(os.getenv("DOMOTICA_SIM_FALHAS", "0")) if taxa_falha is None else taxa_falha
+        self.taxa_falha_lote = self.taxa_falha / 10 if taxa_falha_lote is None else taxa_falha_lote
+        self.estados = {}
+        self._aleatorio = random.Random(semente)
+
+    async def enviar(self, comodo_id, comandos: list) -> dict:
+        # Latência por lote, com variação de ±50%
+        await asyncio.sleep(self.latencia * self._aleatorio.uniform(0.5, 1.5))
+        if self._aleatorio.random() < self.taxa_falha_lote:
+            raise ConnectionError(f"Cômodo {comodo_id} não respondeu.")
+        confirmados = {}
+        for dispositivo_id, alteracoes in comandos:
+            if self._aleatorio.random() >= self.taxa_falha:
+                self.estados.setdefault(dispositivo_id, {}).update(alteracoes)
+                confirmados[dispositivo_id] = alteracoes
+        return confirmados
+
+
+DRIVERS = {"simulado": DriverSimulado}
+
+
+def criar_driver(nome: str) -> DeviceDriver:
+    if nome in DRIVERS:
+        return DRIVERS[nome]()
+    modulo, _, classe = nome.partition(":")
+    if not classe:
+        raise ValueError(f"Driver desconhecido: {nome!r}.")
+    return getattr(importlib.import_module(modulo), classe)()
+
+
+class Comando:
+    __slots__ = ("dispositivo_id", "alteracoes", "versoes", "comodo_ids", "comodo_id", "tentativas", "futuros", "cadeia")
+
+    def __init__(self, dispositivo_id: int, alteracoes: dict, versoes: dict, comodo_ids=(), cadeia=()):
+        self.dispositivo_id = dispositivo_id
+        self.alteracoes = alteracoes
+        self.versoes = versoes   # campo -> número do comando que o definiu
+        # Cômodos do dispositivo no momento do comando (vão no delta publicado);
+        # o primeiro define o lote
+        self.comodo_ids = tuple(comodo_ids)
+        self.comodo_id = self.comodo_ids[0] if self.comodo_ids else None
+        self.tentativas = 0
+        self.futuros = []
+        # Regras que originaram o comando: vão junto com o delta publicado
+        self.cadeia = cadeia
+
+
+class ComandoNaoConfirmado(Exception):
+    pass
+
+
+class Gateway:
+    # Fica entre as rotas e o driver. Comandos pendentes para o mesmo
+    # dispositivo são fundidos (campo a campo, vale o último) e agrupados por cômodo; cada
+    # cômodo tem no máximo um lote em voo, e o que chega nesse meio tempo vai no
+    # próximo lote. Falhas são reenviadas com espera exponencial; confirmações
+    # são gravadas em lote (estado e atributos) e publicadas no barramento
+
+    def __init__(self, driver: DeviceDriver, janela: float = JANELA_LOTE, tamanho_lote: int = TAMANHO_LOTE,
+                 max_em_voo: int = MAX_EM_VOO, max_tentativas: int = MAX_TENTATIVAS,
+                 espera_base: float = ESPERA_BASE, janela_gravacao: float = JANELA_GRAVACAO):
+        self.driver = driver
+        self.janela = janela
+        self.tamanho_lote = tamanho_lote
+        self.max_em_voo = max_em_voo
+        self.max_tentativas = max_tentativas
+        self.espera_base = espera_base
+        self.janela_gravacao = janela_gravacao
+        self._pendentes = defaultdict(dict)   # comodo_id -> {dispositivo_id: Comando ainda não enviado}
+        self._ocupados = set()                # cômodos com lote em voo
+        self._versoes = {}                    # dispositivo_id -> {campo: número do comando mais novo sem resposta}
+        self._sequencia = 0
+        self._confirmados = []                # (Comando, alterações) aguardando o UPDATE
+        self._loop = None
+        self._tarefas = []
+        self._acordar_envio = None
+        self._acordar_gravacao = None
+        self._reenvios_agendados = 0
+        self._gravando = False
+        self.estatisticas = defaultdict(int)
+
+    def enviar(self, dispositivo_id: int, alteracoes: dict, comodo_ids=()) -> asyncio.Future:
+        # Chamado no event loop; o futuro resolve com as alterações confirmadas
+        self._iniciar()
+        futuro = self._loop.create_future()
+        self.estatisticas["recebidos"] += 1
+        self._sequencia += 1
+        versoes = dict.fromkeys(alteracoes, self._sequencia)
+        self._versoes.setdefault(dispositivo_id, {}).update(versoes)
+        comando = Comando(dispositivo_id, dict(alteracoes), versoes, comodo_ids, cadeia_atual.get())
+        comando.futuros.append(futuro)
+        self._enfileirar(comando)
+        return futuro
+
+    async def descarregar(self):
+        # Espera pendentes, envios em voo e gravações terminarem (usado no benchmark)
+        while self._pendentes or self._ocupados or self._confirmados or self._reenvios_agendados or self._gravando:
+            await asyncio.sleep(self.janela)
+
+    async def parar(self):
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        self._tarefas = []
+        self._loop = None
+        await self.driver.fechar()
+
+    def _iniciar(self):
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._acordar_envio = asyncio.Event()
+        self._acordar_gravacao = asyncio.Event()
+        self._tarefas = [
+            self._loop.create_task(self._laco_envio()),
+            self._loop.create_task(self._laco_gravacao()),
+        ]
+
+    def _enfileirar(self, novo: Comando):
+        fila = self._pendentes[novo.comodo_id]
+        comando = fila.get(novo.dispositivo_id)
+        if comando is None:
+            fila[novo.dispositivo_id] = novo
+            if novo.comodo_id not in self._ocupados:
+                self._acordar_envio.set()
+            return
+        # Comando ainda não enviado para o mesmo dispositivo: um só envio, e
+        # em cada campo vale o valor mais novo
+        self.estatisticas["fundidos"] += 1
+        for campo, valor in novo.alteracoes.items():
+            if novo.versoes[campo] > comando.versoes.get(campo, 0):
+                comando.alteracoes[campo] = valor
+                comando.versoes[campo] = novo.versoes[campo]
+        comando.futuros.extend(novo.futuros)
+        comando.cadeia = novo.cadeia
+
+    async def _laco_envio(self):
+        while True:
+            await self._acordar_envio.wait()
+            # Janela curta para juntar mais comandos no mesmo lote
+            await asyncio.sleep(self.janela)
+            self._acordar_envio.clear()
+            for comodo_id in [c for c in self._pendentes if c not in self._ocupados]:
+                if len(self._ocupados) >= self.max_em_voo:
+                    break
+                self._despachar(comodo_id)
+
+    def _despachar(self, comodo_id):
+        fila = self._pendentes.pop(comodo_id)
+        comandos = list(fila.values())
+        if len(comandos) > self.tamanho_lote:
+            # O excedente fica para o próximo lote do cômodo
+            comandos, resto = comandos[:self.tamanho_lote], comandos[self.tamanho_lote:]
+            self._pendentes[comodo_id] = {c.dispositivo_id: c for c in resto}
+        self._ocupados.add(comodo_id)
+        self._loop.create_task(self._enviar_lote(comodo_id, comandos))
+
+    async def _enviar_lote(self, comodo_id, comandos: list):
+        self.estatisticas["lotes"] += 1
+        try:
+            confirmados = await self.driver.enviar(comodo_id, [(c.dispositivo_id, c.alteracoes) for c in comandos])
+        except Exception:
+            self.estatisticas["lotes_com_falha"] += 1
+            confirmados = {}
+        finally:
+            self._ocupados.discard(comodo_id)
+            if self._pendentes:
+                self._acordar_envio.set()
+
+        for comando in comandos:
+            if comando.dispositivo_id in confirmados:
+                self._concluir(comando)
+                self._confirmados.append((comando, confirmados[comando.dispositivo_id]))
+            else:
+                self._falhou(comando)
+        if self._confirmados:
+            self._acordar_gravacao.set()
+
+    def _falhou(self, comando: Comando):
+        comando.tentativas += 1
+        if comando.tentativas >= self.max_tentativas:
+            self.estatisticas["falhas"] += 1
+            self._concluir(comando)
+            self._rejeitar(comando, f"Dispositivo {comando.dispositivo_id} não confirmou o comando.")
+            return
+        self.estatisticas["reenvios"] += 1
+        espera = self.espera_base * 2 ** (comando.tentativas - 1) * random.uniform(0.8, 1.2)
+        self._reenvios_agendados += 1
+        self._loop.call_later(espera, self._reenfileirar, comando)
+
+    def _reenfileirar(self, comando: Comando):
+        self._reenvios_agendados -= 1
+        # Campos redefinidos por um comando mais novo saem do reenvio: ele não
+        # pode sobrescrever um valor mais recente
+        atuais = self._versoes.get(comando.dispositivo_id, {})
+        vigentes = [c for c, versao in comando.versoes.items() if atuais.get(c) == versao]
+        if not vigentes:
+            self.estatisticas["substituidos"] += 1
+            self._rejeitar(comando, f"Comando para o dispositivo {comando.dispositivo_id} foi substituído.")
+            return
+        comando.alteracoes = {c: comando.alteracoes[c] for c in vigentes}
+        comando.versoes = {c: comando.versoes[c] for c in vigentes}
+        self._enfileirar(comando)
+
+    def _concluir(self, comando: Comando):
+        # Libera os campos que este comando ainda era o mais novo a definir
+        atuais = self._versoes.get(comando.dispositivo_id)
+        if atuais is None:
+            return
+        for campo, versao in comando.versoes.items():
+            if atuais.get(campo) == versao:
+                del atuais[campo]
+        if not atuais:
+            del self._versoes[comando.dispositivo_id]
+
+    def _rejeitar(self, comando: Comando, mensagem: str):
+        erro = ComandoNaoConfirmado(mensagem)
+        for futuro in comando.futuros:
+            if not futuro.done():
+                futuro.set_exception(erro)
+
+    async def _laco_gravacao(self):
+        fim_anterior = 0.0
+        while True:
+            await self._acordar_gravacao.wait()
+            # No máximo uma gravação por janela; com fila acumulada (a gravação
+            # anterior já demorou a janela inteira), grava em seguida
+            espera = fim_anterior + self.janela_gravacao - self._loop.time()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            self._acordar_gravacao.clear()
+            confirmados, self._confirmados = self._confirmados, []
+            # Um UPDATE por dispositivo com tudo o que foi confirmado no ciclo
+            por_dispositivo = {}
+            for comando, alteracoes in confirmados:
+                anterior = por_dispositivo.get(comando.dispositivo_id)
+                por_dispositivo[comando.dispositivo_id] = (
+                    comando, alteracoes if anterior is None else {**anterior[1], **alteracoes}
+                )
+            self._gravando = True
+            try:
+                await asyncio.to_thread(gravar_confirmados, list(por_dispositivo.values()))
+            except Exception as exc:
+                for comando, _ in confirmados:
+                    for futuro in comando.futuros:
+                        if not futuro.done():
+                            futuro.set_exception(exc)
+                continue
+            finally:
+                self._gravando = False
+                fim_anterior = self._loop.time()
+            self.estatisticas["confirmados"] += len(confirmados)
+            for comando, alteracoes in confirmados:
+                for futuro in comando.futuros:
+                    if not futuro.done():
+                        futuro.set_result(alteracoes)
+
+
+_SQL_GRAVAR = f"UPDATE {Dispositivo.__tablename__} SET estado = ? WHERE id = ?"
+
+
+def gravar_confirmados(confirmados: list):
+    # (Comando, alterações confirmadas), um por dispositivo. Só o que difere
+    # do banco é gravado e publicado: confirmar o estado que o dispositivo já
+    # tinha não gera delta
+    if not confirmados:
+        return
+    confirmados = sorted(confirmados, key=lambda c: c[0].dispositivo_id)
+    with SessionLocal() as db:
+        atuais = {}
+        for i in range(0, len(confirmados), TAMANHO_BLOCO):
+            ids = [comando.dispositivo_id for comando, _ in confirmados[i:i + TAMANHO_BLOCO]]
+            for linha in db.execute(
+                select(Dispositivo.id, Dispositivo.tipo, Dispositivo.estado, Dispositivo.atributos)
+                .where(Dispositivo.id.in_(ids))
+            ):
+                atuais[linha.id] = linha
+
+    estados, patches, deltas = [], [], defaultdict(list)
+    for comando, alteracoes in confirmados:
+        atual = atuais.get(comando.dispositivo_id)
+        if atual is None:
+            # Removido enquanto o comando estava em voo
+            continue
+        estado = alteracoes.get("estado")
+        if estado is not None and estado == atual.estado:
+            estado = None
+        mudou = alterados(atual.tipo, atual.atributos, {c: v for c, v in alteracoes.items() if c != "estado"})
+        if estado is not None:
+            estados.append((estado, comando.dispositivo_id))
+        if mudou:
+            patches.append((patch(atual.tipo, mudou), comando.dispositivo_id))
+        if estado is not None or mudou:
+            deltas[comando.cadeia].append(delta_estado(comando.dispositivo_id, estado, comando.comodo_ids, mudou))
+    if not deltas:
+        return
+    with SessionLocal() as db:
+        # Direto no driver do banco: sem o processamento de parâmetros por linha do
+        # SQLAlchemy, que custava tanto quanto o próprio UPDATE; ids em ordem
+        # percorrem o índice sequencialmente
+        conexao = db.connection()
+        if estados:
+            conexao.exec_driver_sql(_SQL_GRAVAR, estados)
+        if patches:
+            conexao.exec_driver_sql(SQL_PATCH, patches)
+        db.commit()
+    # Um lote por origem, para os ouvintes saberem quais mudanças vieram de regras
+    for cadeia, lote in deltas.items():
+        token = cadeia_atual.set(cadeia)
+        try:
+            barramento.publicar(lote)
+        finally:
+            cadeia_atual.reset(token)
+
+
+# Um gateway (e um driver) por casa. Sem limite de instâncias: descartar um
+# gateway perderia os comandos pendentes. As tarefas de cada gateway nascem
+# no contexto da primeira requisição da casa e gravam no banco dela
+_gateways = PorCasa(lambda: Gateway(criar_driver(DRIVER)), max_itens=None)
+
+
+def obter_gateway():
+    # None quando nenhum driver está configurado (DOMOTICA_DRIVER vazio)
+    return _gateways.atual() if DRIVER else None
+
+
+def gateways() -> list:
+    return [gateway for _, gateway in _gateways.instancias()]
+
+
+def descartar_gateway(casa: str):
+    return _gateways.descartar(casa)
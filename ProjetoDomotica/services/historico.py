@@ -0,0 +1,186 @@
+import math
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.orm import Session
+from ProjetoDomotica.database.database import CasaNaoEncontrada, casa_atual, roteador
+from ProjetoDomotica.model.models import HistoricoEstado
+from ProjetoDomotica.services.eventos import barramento
+
+
+TAMANHO_LOTE = 500
+INTERVALO_GRAVACAO = 0.5   # segundos
+
+
+class GravadorDeHistorico:
+    # Acumula as transições em memória e grava em lote (executemany),
+    # numa thread própria, para não pagar um commit por mudança de estado.
+    # Cada casa tem seu lote, gravado no seu banco
+
+    def __init__(self, tamanho_lote: int = TAMANHO_LOTE, intervalo: float = INTERVALO_GRAVACAO):
+        self.tamanho_lote = tamanho_lote
+        self.intervalo = intervalo
+        self._pendentes = defaultdict(list)   # casa -> transições
+        self._quantidade = 0
+        self._lock = threading.Lock()
+        self._gravacao = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+
+    def registrar(self, deltas: list):
+        momento = time.time()
+        transicoes = [
+            {"dispositivo_id": d["id"], "estado": d["estado"], "momento": momento}
+            for d in deltas if "estado" in d
+        ]
+        if not transicoes:
+            return
+        with self._lock:
+            self._pendentes[casa_atual.get()].extend(transicoes)
+            self._quantidade += len(transicoes)
+            cheio = self._quantidade >= self.tamanho_lote
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._laco, name="gravador-historico", daemon=True)
+                self._thread.start()
+        if cheio:
+            self._acordar.set()
+
+    def descarregar(self):
+        # Serializa as gravações para manter a ordem dos lotes
+        with self._gravacao:
+            with self._lock:
+                por_casa, self._pendentes = self._pendentes, defaultdict(list)
+                self._quantidade = 0
+            erro = None
+            for casa, pendentes in por_casa.items():
+                try:
+                    with roteador.engine(casa).begin() as conn:
+                        conn.execute(insert(HistoricoEstado), pendentes)
+                except CasaNaoEncontrada:
+                    # A casa foi removida
+                    continue
+                except Exception as exc:
+                    # Devolve o lote para a frente da fila da casa; as demais seguem
+                    with self._lock:
+                        self._pendentes[casa][:0] = pendentes
+                        self._quantidade += len(pendentes)
+                    erro = exc
+            if erro is not None:
+                raise erro
+
+    def _laco(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            try:
+                self.descarregar()
+            except Exception:
+                continue
+
+
+def eventos_de_criacao(estados: dict) -> list:
+    # Linhas do histórico para dispositivos criados (ou importados) ligados,
+    # gravadas na mesma transação da criação. Sem nenhum evento, o dispositivo
+    # é tratado como desligado, então os criados desligados não precisam de linha
+    momento = time.time()
+    return [
+        {"dispositivo_id": dispositivo_id, "estado": True, "momento": momento}
+        for dispositivo_id, estado in estados.items() if estado
+    ]
+
+
+def _estado_inicial(db: Session, dispositivo_id: int, de: float) -> bool:
+    estado = db.scalar(
+        select(HistoricoEstado.estado)
+        .where(HistoricoEstado.dispositivo_id == dispositivo_id, HistoricoEstado.momento < de)
+        .order_by(HistoricoEstado.momento.desc())
+        .limit(1)
+    )
+    return bool(estado)
+
+
+def agregar(db: Session, dispositivo_id: int, de: float, ate: float, resolucao: int) -> dict:
+    # Varredura linear: O(eventos + intervalos), sem carregar objetos ORM
+    quantidade = max(1, math.ceil((ate - de) / resolucao))
+    ligado = [0.0] * quantidade
+    transicoes = [0] * quantidade
+
+    def acumular(inicio: float, fim: float):
+        i = int((inicio - de) // resolucao)
+        while inicio < fim and i < quantidade:
+            limite = min(fim, de + (i + 1) * resolucao)
+            ligado[i] += limite - inicio
+            inicio = limite
+            i += 1
+
+    estado = _estado_inicial(db, dispositivo_id, de)
+    desde = de
+    eventos = db.execute(
+        select(HistoricoEstado.momento, HistoricoEstado.estado)
+        .where(
+            HistoricoEstado.dispositivo_id == dispositivo_id,
+            HistoricoEstado.momento >= de,
+            HistoricoEstado.momento < ate,
+        )
+        .order_by(HistoricoEstado.momento)
+    )
+    for momento, novo in eventos:
+        if novo == estado:
+            continue
+        if estado:
+            acumular(desde, momento)
+        transicoes[int((momento - de) // resolucao)] += 1
+        estado, desde = novo, momento
+    if estado:
+        acumular(desde, ate)
+
+    return {
+        "tempo_ligado": round(sum(ligado), 3),
+        "transicoes": sum(transicoes),
+        "intervalos": [
+            {"inicio": de + i * resolucao, "tempo_ligado": round(ligado[i], 3), "transicoes": transicoes[i]}
+            for i in range(quantidade)
+        ],
+    }
+
+
+# Tempo ligado e transições de todos os dispositivos, calculados pelo SQLite
+# com LEAD() sobre o índice (dispositivo_id, momento). O último evento antes
+# de :de entra apenas para definir o estado no início do período.
+_SQL_RESUMO = text("""
+WITH eventos AS (
+    SELECT dispositivo_id, estado, momento, 1 AS conta
+    FROM historico_estados
+    WHERE momento >= :de AND momento < :ate
+    UNION ALL
+    SELECT dispositivo_id, estado, MAX(momento) AS momento, 0 AS conta
+    FROM historico_estados
+    WHERE momento < :de
+    GROUP BY dispositivo_id
+),
+intervalos AS (
+    SELECT dispositivo_id, estado, conta, MAX(momento, :de) AS inicio,
+           LEAD(momento, 1, :ate) OVER (PARTITION BY dispositivo_id ORDER BY momento) AS fim,
+           COALESCE(LAG(estado) OVER (PARTITION BY dispositivo_id ORDER BY momento), 0) AS anterior
+    FROM eventos
+)
+SELECT dispositivo_id,
+       SUM(CASE WHEN estado THEN fim - inicio ELSE 0 END) AS tempo_ligado,
+       SUM(conta AND estado != anterior) AS transicoes
+FROM intervalos
+GROUP BY dispositivo_id
+ORDER BY dispositivo_id
+""")
+
+
+def resumir(db: Session, de: float, ate: float) -> list:
+    return [
+        {"dispositivo_id": linha.dispositivo_id, "tempo_ligado": round(linha.tempo_ligado, 3), "transicoes": linha.transicoes}
+        for linha in db.execute(_SQL_RESUMO, {"de": de, "ate": ate})
+    ]
+
+
+gravador = GravadorDeHistorico()
+barramento.ouvir(gravador.registrar)
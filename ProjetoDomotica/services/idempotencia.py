@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.exception_handlers import http_exception_handler, request_validation_exception_handler
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from ProjetoDomotica.database.database import casa_atual
+from ProjetoDomotica.services.canal import canal
+
+
+# Respostas guardadas por Idempotency-Key (somadas sobre todas as casas)
+MAX_CHAVES_IDEMPOTENCIA = int(os.getenv("DOMOTICA_IDEMPOTENCIA_MAX", "10000"))
+# Depois disso a chave pode ser reutilizada para outra requisição
+VALIDADE_IDEMPOTENCIA = float(os.getenv("DOMOTICA_IDEMPOTENCIA_VALIDADE", "86400"))
+# Janela das rotas com @idempotente(janela=True): comandos para o mesmo
+# dispositivo dentro dela viram uma escrita só, com o corpo do último. 0
+# desliga (só requisições idênticas em andamento são agrupadas)
+JANELA_COMANDOS = float(os.getenv("DOMOTICA_JANELA_COMANDOS_MS", "0")) / 1000
+TAMANHO_MAX_CHAVE = 255
+
+
+class ChavesDeIdempotencia:
+    # Respostas já dadas, por (casa, método, caminho, Idempotency-Key), com a
+    # impressão da requisição que as gerou; as mais antigas saem pelo limite
+    # de itens ou pela validade
+
+    def __init__(self, max_itens: int = MAX_CHAVES_IDEMPOTENCIA, validade: float = VALIDADE_IDEMPOTENCIA):
+        self.max_itens = max_itens
+        self.validade = validade
+        self._itens = OrderedDict()   # chave -> (momento, impressão, status, corpo, cabeçalhos)
+        self._lock = threading.Lock()
+        self.eventos = defaultdict(int)
+
+    def obter(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            if item[0] < time.time() - self.validade:
+                del self._itens[chave]
+                return None
+            return item
+
+    def guardar(self, chave, item: tuple):
+        with self._lock:
+            self._itens.pop(chave, None)
+            self._itens[chave] = item
+            limite = time.time() - self.validade
+            while self._itens and (len(self._itens) > self.max_itens or next(iter(self._itens.values()))[0] < limite):
+                self._itens.popitem(last=False)
+                self.eventos["descartes"] += 1
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {"itens": len(self._itens), "max_itens": self.max_itens, **self.eventos}
+
+
+chaves = ChavesDeIdempotencia()
+# Só tocados no event loop
+_em_andamento = {}   # (casa, impressão) -> Future com (status, corpo, cabeçalhos)
+_janelas = {}        # (casa, caminho, campos) -> Janela
+_reservadas = {}     # chave de idempotência em andamento -> impressão
+
+
+class Janela:
+    __slots__ = ("request", "futuro")
+
+    def __init__(self, request: Request):
+        self.request = request
+        self.futuro = asyncio.get_running_loop().create_future()
+
+
+def idempotente(janela: bool = False):
+    # Marca uma rota de comando para Idempotency-Key e agrupamento de
+    # requisições iguais em andamento. Com `janela`, comandos com os mesmos
+    # campos para o mesmo caminho dentro de JANELA_COMANDOS viram uma escrita,
+    # com o corpo do último. Aplicado pela RotaIdempotente
+    def marcar(endpoint):
+        endpoint.comando_idempotente = janela
+        return endpoint
+    return marcar
+
+
+def _resposta(resultado: tuple, *extras) -> Response:
+    status_code, corpo, cabecalhos = resultado
+    resposta = Response(content=corpo, status_code=status_code)
+    resposta.raw_headers = list(cabecalhos) + list(extras)
+    return resposta
+
+
+async def _executar(handler, request: Request):
+    # O resultado vira (status, corpo, cabeçalhos) para ser entregue a várias
+    # requisições; erros HTTP também, com os handlers padrão do FastAPI
+    try:
+        resposta = await handler(request)
+    except StarletteHTTPException as exc:
+        resposta = await http_exception_handler(request, exc)
+    except RequestValidationError as exc:
+        resposta = await request_validation_exception_handler(request, exc)
+    if not isinstance(getattr(resposta, "body", None), bytes):
+        return resposta, None
+    return resposta, (resposta.status_code, resposta.body, list(resposta.raw_headers))
+
+
+async def _agrupar(handler, request: Request, impressao: str):
+    # Uma requisição igual já em andamento: espera o resultado dela
+    chave = (casa_atual.get(), impressao)
+    futuro = _em_andamento.get(chave)
+    if futuro is not None:
+        chaves.eventos["agrupadas"] += 1
+        resultado = await asyncio.shield(futuro)
+        if resultado is not None:
+            return _resposta(resultado), resultado
+        return await _executar(handler, request)
+
+    futuro = asyncio.get_running_loop().create_future()
+    _em_andamento[chave] = futuro
+    resultado = None
+    try:
+        resposta, resultado = await _executar(handler, request)
+    finally:
+        del _em_andamento[chave]
+        # None (falha ou cancelamento): quem esperava executa por conta própria
+        futuro.set_result(resultado)
+    return resposta, resultado
+
+
+async def _na_janela(handler, request: Request, corpo: bytes):
+    # O primeiro comando abre a janela; os seguintes trocam o corpo a aplicar
+    # (último vence) e recebem todos a resposta da escrita única
+    try:
+        campos = tuple(sorted(json.loads(corpo)))
+    except (ValueError, TypeError):
+        campos = None
+    chave = (casa_atual.get(), request.url.path, campos)
+    janela = _janelas.get(chave)
+    if janela is not None:
+        janela.request = request
+        chaves.eventos["substituidas"] += 1
+        resultado = await asyncio.shield(janela.futuro)
+        if resultado is not None:
+            return _resposta(resultado), resultado
+        return await _executar(handler, request)
+
+    janela = Janela(request)
+    _janelas[chave] = janela
+    resultado = None
+    try:
+        try:
+            await asyncio.sleep(JANELA_COMANDOS)
+        finally:
+            # Quem chegar durante a escrita abre outra janela
+            del _janelas[chave]
+        chaves.eventos["janelas"] += 1
+        resposta, resultado = await _executar(handler, janela.request)
+    finally:
+        janela.futuro.set_result(resultado)
+    return resposta, resultado
+
+
+def envolver_comando(handler, janela: bool):
+    async def handler_idempotente(request: Request) -> Response:
+        corpo = await request.body()
+        impressao = hashlib.blake2b(
+            b"%s %s?%s\n%s" % (request.method.encode(), request.url.path.encode(), request.scope.get("query_string", b""), corpo),
+            digest_size=16,
+        ).hexdigest()
+
+        valor = request.headers.get("idempotency-key")
+        chave = None
+        if valor is not None:
+            if not valor or len(valor) > TAMANHO_MAX_CHAVE:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Idempotency-Key inválida.",
+                )
+            chave = (casa_atual.get(), request.method, request.url.path, valor)
+            item = chaves.obter(chave)
+            if item is not None:
+                if item[1] != impressao:
+                    chaves.eventos["conflitos"] += 1
+                    raise HTTPException(
+                        status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                        detail="Idempotency-Key já usada com outra requisição.",
+                    )
+                chaves.eventos["repeticoes"] += 1
+                return _resposta(item[2:], (b"idempotent-replayed", b"true"))
+            reservada = _reservadas.get(chave)
+            if reservada is not None and reservada != impressao:
+                chaves.eventos["conflitos"] += 1
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Requisição com esta Idempotency-Key em andamento.",
+                )
+            _reservadas.setdefault(chave, impressao)
+
+        try:
+            if janela and JANELA_COMANDOS > 0:
+                resposta, resultado = await _na_janela(handler, request, corpo)
+            else:
+                resposta, resultado = await _agrupar(handler, request, impressao)
+        finally:
+            if chave is not None and _reservadas.get(chave) == impressao:
+                del _reservadas[chave]
+
+        # Erros do servidor não são guardados: a nova tentativa executa de novo
+        if chave is not None and resultado is not None and resultado[0] < 500:
+            chaves.guardar(chave, (time.time(), impressao, *resultado))
+            canal.enviar("idempotencia", [
+                chave[1], chave[2], chave[3], impressao, resultado[0], resultado[1].decode("latin-1"),
+                [[nome.decode("latin-1"), valor_.decode("latin-1")] for nome, valor_ in resultado[2]],
+            ])
+        return resposta
+
+    return handler_idempotente
+
+
+class RotaIdempotente(APIRoute):
+    # Rotas marcadas com @idempotente passam pela Idempotency-Key e o agrupamento
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        janela = getattr(self.endpoint, "comando_idempotente", None)
+        return handler if janela is None else envolver_comando(handler, janela)
+
+
+def _replicada(dados):
+    # Uma nova tentativa pode cair em outro worker
+    metodo, caminho, valor, impressao, status_code, corpo, cabecalhos = dados
+    chaves.guardar(
+        (casa_atual.get(), metodo, caminho, valor),
+        (time.time(), impressao, status_code, corpo.encode("latin-1"),
+         [(nome.encode("latin-1"), valor_.encode("latin-1")) for nome, valor_ in cabecalhos]),
+    )
+
+
+canal.registrar("idempotencia", _replicada)
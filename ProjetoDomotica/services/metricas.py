@@ -0,0 +1,229 @@
+import cProfile
+import functools
+import inspect
+import io
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+
+
+# ?profile=1 só é atendido com DOMOTICA_PROFILING=1
+PROFILING_HABILITADO = os.getenv("DOMOTICA_PROFILING", "0") == "1"
+LIMITES_HISTOGRAMA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Medições da requisição atual; o dicionário é compartilhado com a thread
+# do threadpool que executa rotas síncronas (o contexto é copiado)
+_requisicao = ContextVar("metricas_requisicao", default=None)
+
+
+class RegistroDeMetricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requisicoes = defaultdict(int)        # (metodo, rota, status) -> total
+        self.histograma = defaultdict(lambda: [0] * (len(LIMITES_HISTOGRAMA) + 1))
+        self.duracao = defaultdict(float)          # (metodo, rota) -> soma
+        self.espera = defaultdict(float)
+        self.endpoint = defaultdict(float)
+        self.serializacao = defaultdict(float)
+        self.consultas = defaultdict(int)
+        self.tempo_db = defaultdict(float)
+
+    def registrar(self, metodo: str, rota: str, status: int, medicao: dict):
+        chave = (metodo, rota)
+        duracao = medicao["fim"] - medicao["inicio"]
+        with self._lock:
+            self.requisicoes[(metodo, rota, status)] += 1
+            self.duracao[chave] += duracao
+            baldes = self.histograma[chave]
+            for i, limite in enumerate(LIMITES_HISTOGRAMA):
+                if duracao <= limite:
+                    baldes[i] += 1
+                    break
+            else:
+                baldes[-1] += 1
+            self.consultas[chave] += medicao["consultas"]
+            self.tempo_db[chave] += medicao["tempo_db"]
+            if medicao["endpoint_inicio"] is not None:
+                self.espera[chave] += medicao["endpoint_inicio"] - medicao["inicio"]
+                self.endpoint[chave] += medicao["endpoint_fim"] - medicao["endpoint_inicio"]
+                if medicao["resposta"] is not None:
+                    self.serializacao[chave] += medicao["resposta"] - medicao["endpoint_fim"]
+
+    def exportar(self, extras=()) -> str:
+        # Formato texto do Prometheus (version 0.0.4)
+        linhas = []
+
+        def serie(nome, tipo, ajuda, valores):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            for rotulos, valor in valores:
+                texto = ",".join(f'{k}="{v}"' for k, v in rotulos)
+                linhas.append(f"{nome}{{{texto}}} {valor}" if texto else f"{nome} {valor}")
+
+        with self._lock:
+            serie("domotica_requisicoes_total", "counter", "Requisições atendidas.", [
+                ((("metodo", m), ("rota", r), ("status", s)), v) for (m, r, s), v in sorted(self.requisicoes.items())
+            ])
+
+            linhas.append("# HELP domotica_requisicao_segundos Duração total da requisição.")
+            linhas.append("# TYPE domotica_requisicao_segundos histogram")
+            for (m, r), baldes in sorted(self.histograma.items()):
+                acumulado = 0
+                for limite, quantidade in zip(LIMITES_HISTOGRAMA + ("+Inf",), baldes):
+                    acumulado += quantidade
+                    linhas.append(f'domotica_requisicao_segundos_bucket{{metodo="{m}",rota="{r}",le="{limite}"}} {acumulado}')
+                linhas.append(f'domotica_requisicao_segundos_sum{{metodo="{m}",rota="{r}"}} {self.duracao[(m, r)]:.6f}')
+                linhas.append(f'domotica_requisicao_segundos_count{{metodo="{m}",rota="{r}"}} {acumulado}')
+
+            for nome, ajuda, dados in (
+                ("domotica_espera_segundos_total", "Tempo até o endpoint começar (fila do threadpool, validação, dependências).", self.espera),
+                ("domotica_endpoint_segundos_total", "Tempo dentro da função da rota.", self.endpoint),
+                ("domotica_serializacao_segundos_total", "Tempo entre o retorno da rota e o envio da resposta.", self.serializacao),
+                ("domotica_db_segundos_total", "Tempo gasto em comandos SQL.", self.tempo_db),
+                ("domotica_db_consultas_total", "Comandos SQL executados.", self.consultas),
+            ):
+                serie(nome, "counter", ajuda, [
+                    ((("metodo", m), ("rota", r)), f"{v:.6f}" if isinstance(v, float) else v)
+                    for (m, r), v in sorted(dados.items())
+                ])
+
+        for nome, tipo, ajuda, valores in extras:
+            serie(nome, tipo, ajuda, valores)
+        return "\n".join(linhas) + "\n"
+
+
+registro = RegistroDeMetricas()
+
+
+def _nova_medicao() -> dict:
+    return {
+        "inicio": time.perf_counter(),
+        "fim": None,
+        "endpoint_inicio": None,
+        "endpoint_fim": None,
+        "resposta": None,
+        "consultas": 0,
+        "tempo_db": 0.0,
+        "perfil": None,
+    }
+
+
+def _antes_do_comando(conn, cursor, statement, parameters, context, executemany):
+    if _requisicao.get() is not None:
+        conn.info.setdefault("metricas_inicio", []).append(time.perf_counter())
+
+
+def _depois_do_comando(conn, cursor, statement, parameters, context, executemany):
+    medicao = _requisicao.get()
+    if medicao is None:
+        return
+    inicios = conn.info.get("metricas_inicio")
+    if inicios:
+        medicao["tempo_db"] += time.perf_counter() - inicios.pop()
+    medicao["consultas"] += 1
+
+
+def instrumentar_engine(engine):
+    event.listen(engine, "before_cursor_execute", _antes_do_comando)
+    event.listen(engine, "after_cursor_execute", _depois_do_comando)
+
+
+def _medir(endpoint):
+    # Marca início e fim da função da rota (e a perfila, se pedido)
+    def entrar():
+        medicao = _requisicao.get()
+        if medicao is not None:
+            medicao["endpoint_inicio"] = time.perf_counter()
+            if medicao["perfil"] is not None:
+                medicao["perfil"].enable()
+        return medicao
+
+    def sair(medicao):
+        if medicao is not None:
+            if medicao["perfil"] is not None:
+                medicao["perfil"].disable()
+            medicao["endpoint_fim"] = time.perf_counter()
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def medido(*args, **kwargs):
+            medicao = entrar()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                sair(medicao)
+    else:
+        @functools.wraps(endpoint)
+        def medido(*args, **kwargs):
+            medicao = entrar()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                sair(medicao)
+    return medido
+
+
+class RotaInstrumentada(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _medir(endpoint), **kwargs)
+
+
+class MiddlewareDeMetricas:
+    # Middleware ASGI puro: BaseHTTPMiddleware não propaga o contexto da requisição
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        medicao = _nova_medicao()
+        perfilar = PROFILING_HABILITADO and parse_qs(scope.get("query_string", b"").decode()).get("profile") == ["1"]
+        if perfilar:
+            medicao["perfil"] = cProfile.Profile()
+        token = _requisicao.set(medicao)
+        status = 500
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                medicao["resposta"] = time.perf_counter()
+            if not perfilar:
+                await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            medicao["fim"] = time.perf_counter()
+            _requisicao.reset(token)
+            rota = scope.get("route")
+            rota = getattr(rota, "path", None) or "desconhecida"
+            registro.registrar(scope["method"], rota, status, medicao)
+
+        if perfilar:
+            await _enviar_perfil(send, medicao)
+
+
+async def _enviar_perfil(send, medicao: dict):
+    saida = io.StringIO()
+    saida.write(
+        f"duracao={medicao['fim'] - medicao['inicio']:.6f}s "
+        f"consultas={medicao['consultas']} tempo_db={medicao['tempo_db']:.6f}s\n\n"
+    )
+    pstats.Stats(medicao["perfil"], stream=saida).sort_stats("cumulative").print_stats(40)
+    corpo = saida.getvalue().encode()
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(corpo)).encode())],
+    })
+    await send({"type": "http.response.body", "body": corpo})
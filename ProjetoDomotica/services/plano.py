@@ -0,0 +1,225 @@
+import threading
+from collections import OrderedDict, defaultdict
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ProjetoDomotica.model.models import Dispositivo
+from ProjetoDomotica.services.atributos import efetivos, expandir, validar
+from ProjetoDomotica.services.canal import PorCasaReplicado
+from ProjetoDomotica.services.execucao import carregar_passos
+from ProjetoDomotica.services.topologia import topologia
+
+
+MAX_PLANOS = 1000
+
+# Ação sem estado nem alvo: inverte o estado atual
+INVERTER = "inverter"
+
+
+def alteracoes_da_acao(tipo: str, estado, alvo) -> dict:
+    if estado is None and not alvo:
+        return {"estado": INVERTER}
+    alteracoes = {} if estado is None else {"estado": estado}
+    if alvo:
+        alteracoes.update(efetivos(tipo, validar(tipo, alvo)))
+    return alteracoes
+
+
+def compilar(passos, tipos: dict) -> dict:
+    # Resultado líquido da cena por dispositivo, sem olhar o estado atual. Passos
+    # rodam em sequência (o posterior sobrescreve o anterior); ações do mesmo passo
+    # rodam em paralelo, então valores diferentes para o mesmo campo são conflito
+    alvos = {}   # dispositivo_id -> {campo: (valor, acao_ids que o determinam)}
+    conflitos, invalidas, todas = [], [], []
+    for passo in passos:
+        no_passo = defaultdict(lambda: defaultdict(list))
+        for acao in passo:
+            todas.append(acao.acao_id)
+            try:
+                campos = alteracoes_da_acao(tipos.get(acao.dispositivo_id), acao.estado, acao.alvo)
+            except ValueError as exc:
+                # O tipo do dispositivo mudou depois que a ação foi criada
+                invalidas.append({"acao_id": acao.acao_id, "motivo": str(exc)})
+                continue
+            for campo, valor in campos.items():
+                no_passo[acao.dispositivo_id][campo].append((valor, acao.acao_id))
+
+        for dispositivo_id, campos in no_passo.items():
+            atual = alvos.setdefault(dispositivo_id, {})
+            for campo, definicoes in campos.items():
+                valores = [valor for valor, _ in definicoes]
+                acao_ids = [acao_id for _, acao_id in definicoes]
+                inverte = campo == "estado" and INVERTER in valores
+                if len(set(valores)) > 1 or (inverte and len(valores) > 1):
+                    conflitos.append({
+                        "dispositivo_id": dispositivo_id, "campo": campo,
+                        "ordem": passo[0].ordem, "acao_ids": acao_ids,
+                    })
+                    # Fica a última, na ordem em que o executor dispara
+                    acao_ids = acao_ids[-1:]
+                valor = valores[-1]
+                if campo == "estado" and valor == INVERTER and campo in atual:
+                    anterior, anteriores = atual[campo]
+                    if anterior == INVERTER:
+                        # Duas inversões se anulam
+                        del atual[campo]
+                    else:
+                        atual[campo] = (not anterior, anteriores + acao_ids)
+                else:
+                    atual[campo] = (valor, acao_ids)
+
+    dispositivos = {}
+    for dispositivo_id, campos in alvos.items():
+        if campos:
+            acao_ids = sorted({a for _, ids in campos.values() for a in ids})
+            dispositivos[dispositivo_id] = {
+                "campos": {campo: valor for campo, (valor, _) in campos.items()},
+                "acao_ids": acao_ids,
+            }
+    efetivas = {a for d in dispositivos.values() for a in d["acao_ids"]}
+    descartadas = {i["acao_id"] for i in invalidas}
+    return {
+        "dispositivos": dispositivos,
+        "conflitos": conflitos,
+        "invalidas": invalidas,
+        "redundantes": sorted(set(todas) - efetivas - descartadas),
+        "total_acoes": len(todas),
+    }
+
+
+def avaliar(db: Session, cena_id: int, compilado: dict) -> dict:
+    # Compara o plano com o estado atual: só vai o que muda, agrupado por cômodo
+    ids = list(compilado["dispositivos"])
+    atuais = {}
+    if ids:
+        consulta = select(Dispositivo.id, Dispositivo.estado, Dispositivo.tipo, Dispositivo.atributos)
+        atuais = {linha.id: linha for linha in db.execute(consulta.where(Dispositivo.id.in_(ids)))}
+    comodos = topologia.comodos_dos_dispositivos(db, list(atuais))
+
+    grupos, ignorados = {}, []
+    for dispositivo_id, alvo in compilado["dispositivos"].items():
+        linha = atuais.get(dispositivo_id)
+        if linha is None:
+            continue
+        atributos = expandir(linha.tipo, linha.atributos)
+        alteracoes = {}
+        for campo, valor in alvo["campos"].items():
+            if campo == "estado":
+                valor = (not linha.estado) if valor == INVERTER else valor
+                if valor != linha.estado:
+                    alteracoes[campo] = valor
+            elif atributos.get(campo) != valor:
+                alteracoes[campo] = valor
+        if not alteracoes:
+            ignorados.append(dispositivo_id)
+            continue
+        # Mesmo agrupamento do gateway: o primeiro cômodo do dispositivo
+        comodo_id = comodos[dispositivo_id][0] if comodos[dispositivo_id] else None
+        grupos.setdefault(comodo_id, []).append(
+            {"dispositivo_id": dispositivo_id, "alteracoes": alteracoes, "acao_ids": alvo["acao_ids"]}
+        )
+
+    return {
+        "cena_id": cena_id,
+        "comodos": [
+            {"comodo_id": comodo_id, "comandos": comandos}
+            for comodo_id, comandos in sorted(grupos.items(), key=lambda g: (g[0] is None, g[0] or 0))
+        ],
+        "ignorados": sorted(ignorados),
+        "redundantes": compilado["redundantes"],
+        "conflitos": compilado["conflitos"],
+        "invalidas": compilado["invalidas"],
+        "total_acoes": compilado["total_acoes"],
+        "total_comandos": sum(len(comandos) for comandos in grupos.values()),
+    }
+
+
+class CacheDePlanos:
+    # Planos compilados por cena (a parte que não depende do estado atual),
+    # com índices reversos para invalidar pelas ações e dispositivos envolvidos
+
+    def __init__(self, max_itens: int = MAX_PLANOS):
+        self.max_itens = max_itens
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()             # cena_id -> (compilado, acao_ids, dispositivo_ids)
+        self._por_acao = defaultdict(set)       # acao_id -> cena_ids
+        self._por_dispositivo = defaultdict(set)
+        # Muda a cada invalidação: um plano compilado durante uma escrita não é guardado
+        self._geracao = 0
+        self._lock = threading.Lock()
+
+    def plano(self, db: Session, cena_id: int) -> dict:
+        return avaliar(db, cena_id, self.compilado(db, cena_id))
+
+    def compilado(self, db: Session, cena_id: int) -> dict:
+        with self._lock:
+            item = self._itens.get(cena_id)
+            if item is not None:
+                self._itens.move_to_end(cena_id)
+                self.acertos += 1
+                return item[0]
+            self.falhas += 1
+            geracao = self._geracao
+
+        passos = carregar_passos(db, cena_id)
+        dispositivo_ids = {acao.dispositivo_id for passo in passos for acao in passo}
+        tipos = dict(db.execute(
+            select(Dispositivo.id, Dispositivo.tipo).where(Dispositivo.id.in_(dispositivo_ids))
+        ).all()) if dispositivo_ids else {}
+        compilado = compilar(passos, tipos)
+
+        with self._lock:
+            if self._geracao == geracao:
+                acao_ids = {acao.acao_id for passo in passos for acao in passo}
+                self._remover(cena_id)
+                self._itens[cena_id] = (compilado, acao_ids, dispositivo_ids)
+                for acao_id in acao_ids:
+                    self._por_acao[acao_id].add(cena_id)
+                for dispositivo_id in dispositivo_ids:
+                    self._por_dispositivo[dispositivo_id].add(cena_id)
+                while len(self._itens) > self.max_itens:
+                    self._remover(next(iter(self._itens)))
+        return compilado
+
+    def invalidar_cena(self, cena_id: int):
+        with self._lock:
+            self._geracao += 1
+            self._remover(cena_id)
+
+    def invalidar_acao(self, acao_id: int):
+        with self._lock:
+            self._geracao += 1
+            for cena_id in list(self._por_acao.get(acao_id, ())):
+                self._remover(cena_id)
+
+    def invalidar_dispositivo(self, dispositivo_id: int):
+        with self._lock:
+            self._geracao += 1
+            for cena_id in list(self._por_dispositivo.get(dispositivo_id, ())):
+                self._remover(cena_id)
+
+    def limpar(self):
+        with self._lock:
+            self._geracao += 1
+            self._itens.clear()
+            self._por_acao.clear()
+            self._por_dispositivo.clear()
+
+    def estatisticas(self) -> dict:
+        return {"itens": len(self._itens), "acertos": self.acertos, "falhas": self.falhas}
+
+    def _remover(self, cena_id: int):
+        item = self._itens.pop(cena_id, None)
+        if item is None:
+            return
+        for indice, chaves in ((self._por_acao, item[1]), (self._por_dispositivo, item[2])):
+            for chave in chaves:
+                cenas = indice.get(chave)
+                if cenas is not None:
+                    cenas.discard(cena_id)
+                    if not cenas:
+                        del indice[chave]
+
+
+planos = PorCasaReplicado(CacheDePlanos, "planos", replicar=("invalidar_cena", "invalidar_acao", "invalidar_dispositivo", "limpar"))
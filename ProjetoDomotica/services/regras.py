@@ -0,0 +1,228 @@
+import asyncio
+import os
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import select
+from ProjetoDomotica.database.database import SessionLocal, casa_atual, usar_casa
+from ProjetoDomotica.model.models import Cena, Regra
+from ProjetoDomotica.services.canal import PorCasaReplicado
+from ProjetoDomotica.services.eventos import barramento, cadeia_atual
+from ProjetoDomotica.services.execucao import carregar_passos, executor
+from ProjetoDomotica.services.resumo import resumo
+
+
+# Regras encadeadas (regra -> cena -> mudança -> outra regra) além disso não disparam
+MAX_CASCATA = int(os.getenv("DOMOTICA_REGRAS_MAX_CASCATA", "3"))
+
+# Só as colunas do gatilho: sem montar objetos do ORM para cada regra
+_COLUNAS = (Regra.id, Regra.cena_id, Regra.dispositivo_id, Regra.comodo_id, Regra.estado, Regra.espera, Regra.ativa)
+
+
+class Gatilho:
+    # Cópia em memória de uma regra ativa
+    __slots__ = ("id", "cena_id", "dispositivo_id", "comodo_id", "estado", "espera", "ultimo_disparo")
+
+    def __init__(self, regra):
+        # Regra do ORM ou linha com as mesmas colunas
+        self.id = regra.id
+        self.cena_id = regra.cena_id
+        self.dispositivo_id = regra.dispositivo_id
+        self.comodo_id = regra.comodo_id
+        self.estado = regra.estado
+        self.espera = regra.espera
+        self.ultimo_disparo = None
+
+
+def condicao_do_comodo(gatilho: Gatilho, contagem) -> bool:
+    # Todos os dispositivos do cômodo no estado do gatilho (cômodo vazio não conta)
+    total, ligados = contagem
+    return total > 0 and ligados == (total if gatilho.estado else 0)
+
+
+class MotorDeRegras:
+    # Avalia as regras a cada lote de mudanças de estado publicado. Os gatilhos
+    # ficam indexados por dispositivo e por cômodo: uma mudança só olha as
+    # regras do dispositivo e dos cômodos dele. Cascatas são limitadas pela
+    # cadeia de regras que causou a mudança (sem repetir regra e até
+    # MAX_CASCATA níveis), e cada regra respeita sua espera entre disparos e
+    # não dispara de novo enquanto a cena anterior ainda executa
+
+    def __init__(self, max_cascata: int = MAX_CASCATA):
+        self.max_cascata = max_cascata
+        self._gatilhos = {}                         # regra_id -> Gatilho
+        self._por_dispositivo = defaultdict(dict)   # dispositivo_id -> {regra_id: Gatilho}
+        self._por_comodo = defaultdict(dict)        # comodo_id -> {regra_id: Gatilho}
+        self._em_execucao = set()
+        self._tarefas = set()
+        self._lock = threading.Lock()
+        self._loop = None
+        self.eventos = defaultdict(int)
+
+    def iniciar(self):
+        # Chamado na inicialização da app, dentro do event loop
+        self._loop = asyncio.get_running_loop()
+        with SessionLocal() as db:
+            for linha in db.execute(select(*_COLUNAS).where(Regra.ativa.is_(True))):
+                self.definir(linha)
+
+    def definir(self, regra: Regra):
+        # Chamado pelas rotas após gravar a regra
+        self.remover(regra.id)
+        if not regra.ativa:
+            return
+        gatilho = Gatilho(regra)
+        with self._lock:
+            self._gatilhos[gatilho.id] = gatilho
+            self._indice(gatilho)[self._chave(gatilho)][gatilho.id] = gatilho
+
+    def recarregar(self, regra_id: int):
+        # Regra gravada por outro worker
+        with SessionLocal() as db:
+            linha = db.execute(select(*_COLUNAS).where(Regra.id == regra_id)).first()
+        if linha is None:
+            self.remover(regra_id)
+        else:
+            self.definir(linha)
+
+    def remover(self, regra_id: int):
+        with self._lock:
+            gatilho = self._gatilhos.pop(regra_id, None)
+            if gatilho is None:
+                return
+            indice, chave = self._indice(gatilho), self._chave(gatilho)
+            indice[chave].pop(regra_id, None)
+            if not indice[chave]:
+                del indice[chave]
+
+    def remover_varias(self, regra_ids):
+        for regra_id in regra_ids:
+            self.remover(regra_id)
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "regras": len(self._gatilhos),
+                "dispositivos": len(self._por_dispositivo),
+                "comodos": len(self._por_comodo),
+                "em_execucao": len(self._em_execucao),
+                **self.eventos,
+            }
+
+    def avaliar(self, deltas: list) -> list:
+        # Ouvinte do barramento (na thread de quem publica): só casa os gatilhos;
+        # a cena é carregada e executada no event loop. Quem publica só inclui
+        # "estado" quando o dispositivo mudou (rotas, cenas e gateway comparam
+        # com o banco), então cada delta com estado é uma transição
+        if not self._gatilhos:
+            return []
+        cadeia = cadeia_atual.get()
+        disparar = {}
+        with self._lock:
+            for d in deltas:
+                if "estado" not in d:
+                    continue
+                estado = d["estado"]
+                self.eventos["mudancas"] += 1
+                for gatilho in self._por_dispositivo.get(d["id"], {}).values():
+                    if gatilho.estado is None or gatilho.estado == estado:
+                        disparar[gatilho.id] = (gatilho, False)
+                for comodo_id in d["comodos"]:
+                    for gatilho in self._por_comodo.get(comodo_id, {}).values():
+                        # A mudança que completa o cômodo é para o estado do gatilho
+                        if gatilho.estado == estado and gatilho.id not in disparar:
+                            disparar[gatilho.id] = (gatilho, True)
+            if not disparar:
+                return []
+
+            aprovados, agora, contagens = [], time.monotonic(), {}
+            for gatilho, do_comodo in disparar.values():
+                self.eventos["avaliadas"] += 1
+                conferir = False
+                if do_comodo:
+                    if gatilho.comodo_id not in contagens:
+                        contagens[gatilho.comodo_id] = resumo.contagem(gatilho.comodo_id)
+                    contagem = contagens[gatilho.comodo_id]
+                    if contagem is None:
+                        # Contadores ainda não carregados: confere no disparo
+                        conferir = True
+                    elif not condicao_do_comodo(gatilho, contagem):
+                        continue
+                if gatilho.id in cadeia:
+                    self.eventos["bloqueadas_ciclo"] += 1
+                elif len(cadeia) >= self.max_cascata:
+                    self.eventos["bloqueadas_cascata"] += 1
+                elif gatilho.id in self._em_execucao or (
+                    gatilho.ultimo_disparo is not None and agora - gatilho.ultimo_disparo < gatilho.espera
+                ):
+                    self.eventos["em_espera"] += 1
+                else:
+                    aprovados.append((gatilho, conferir, gatilho.ultimo_disparo))
+                    gatilho.ultimo_disparo = agora
+                    self._em_execucao.add(gatilho.id)
+
+        if aprovados and self._loop is not None and not self._loop.is_closed():
+            casa = casa_atual.get()
+            for gatilho, conferir, anterior in aprovados:
+                self._loop.call_soon_threadsafe(
+                    self._agendar, casa, gatilho, cadeia + (gatilho.id,), conferir, anterior
+                )
+        return aprovados
+
+    def _agendar(self, casa: str, gatilho: Gatilho, cadeia: tuple, conferir: bool, anterior):
+        # A tarefa herda a casa e a cadeia: as mudanças feitas pela cena
+        # chegam de volta em avaliar() com esta regra na cadeia
+        token = cadeia_atual.set(cadeia)
+        try:
+            with usar_casa(casa):
+                tarefa = self._loop.create_task(self._disparar(gatilho, conferir, anterior))
+        finally:
+            cadeia_atual.reset(token)
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+
+    async def _disparar(self, gatilho: Gatilho, conferir: bool, anterior):
+        try:
+            passos = await asyncio.to_thread(_carregar_disparo, gatilho, conferir)
+            if passos is None:
+                # A cena foi removida
+                self.remover(gatilho.id)
+                return
+            if not passos:
+                if conferir:
+                    # A condição do cômodo não se confirmou: não conta como disparo
+                    gatilho.ultimo_disparo = anterior
+                return
+            self.eventos["disparos"] += 1
+            await executor.iniciar(gatilho.cena_id, passos).tarefa
+        except Exception:
+            self.eventos["falhas"] += 1
+        finally:
+            with self._lock:
+                self._em_execucao.discard(gatilho.id)
+
+    def _indice(self, gatilho: Gatilho) -> dict:
+        return self._por_dispositivo if gatilho.dispositivo_id is not None else self._por_comodo
+
+    def _chave(self, gatilho: Gatilho) -> int:
+        return gatilho.dispositivo_id if gatilho.dispositivo_id is not None else gatilho.comodo_id
+
+
+def _carregar_disparo(gatilho: Gatilho, conferir: bool):
+    with SessionLocal() as db:
+        if conferir and not condicao_do_comodo(gatilho, resumo.contagem(gatilho.comodo_id, db)):
+            return []
+        if db.get(Cena, gatilho.cena_id) is None:
+            return None
+        return carregar_passos(db, gatilho.cena_id)
+
+
+# Um motor por casa, carregado com a app (ou com a criação da casa). Nunca
+# descartado: as regras só são lidas do banco na inicialização. Com vários
+# workers, todos têm todas as regras e cada um avalia as mudanças que fez
+motor = PorCasaReplicado(MotorDeRegras, "regras", max_itens=None, replicar=(
+    "remover", "remover_varias", ("definir", lambda regra: ("recarregar", [regra.id])),
+))
+# Depois do resumo: a condição do cômodo já vê os contadores atualizados
+barramento.ouvir(lambda deltas: motor.avaliar(deltas))
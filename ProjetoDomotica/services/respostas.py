@@ -0,0 +1,294 @@
+import hashlib
+import itertools
+import mmap
+import os
+import struct
+import threading
+import uuid
+import zlib
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from ProjetoDomotica.database.database import PorCasa, casa_atual
+from ProjetoDomotica.services.canal import canal, fcntl
+from ProjetoDomotica.services.compressao import CODIFICACOES, MINIMO_COMPRESSAO, comprimir, escolher
+from ProjetoDomotica.services.eventos import barramento
+
+
+# Bytes de corpo mantidos no cache de respostas (somados sobre todas as casas)
+MAX_BYTES_RESPOSTAS = int(os.getenv("DOMOTICA_CACHE_RESPOSTAS_BYTES", str(32 * 1024 * 1024)))
+# Posições da tabela de versões compartilhada entre workers (8 bytes cada)
+POSICOES_VERSOES = int(os.getenv("DOMOTICA_VERSOES_POSICOES", str(1 << 16)))
+
+# Um relógio só para todas as casas: uma versão nunca se repete no processo,
+# nem quando as versões de uma casa são descartadas e recriadas. O prefixo
+# muda a cada inicialização, então ETags de outro processo não coincidem
+_relogio = itertools.count(1)
+_PROCESSO = uuid.uuid4().hex[:8]
+
+
+class Versoes:
+    # Contadores por coleção (dispositivos, comodos, cenas, acoes) e por
+    # entidade, avançados pelas rotas depois de cada escrita. Não incluem o
+    # conteúdo: uma versão igual quer dizer que nada mudou desde então
+    prefixo = _PROCESSO
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inicio = next(_relogio)
+        self._colecoes = {}
+        self._entidades = {}   # (colecao, id) -> versao
+
+    def alterar(self, colecao: str, *ids):
+        versao = next(_relogio)
+        with self._lock:
+            self._colecoes[colecao] = versao
+            for id_ in ids:
+                self._entidades[(colecao, int(id_))] = versao
+
+    def limpar(self):
+        # Tudo mudou (ex.: importação da casa)
+        with self._lock:
+            self._inicio = next(_relogio)
+            self._colecoes.clear()
+            self._entidades.clear()
+
+    def assinatura(self, colecoes, entidade=None) -> tuple:
+        with self._lock:
+            valores = tuple(self._colecoes.get(c, self._inicio) for c in colecoes)
+            if entidade is not None:
+                valores += (self._entidades.get(entidade, self._inicio),)
+            return valores
+
+
+_U64 = struct.Struct("<Q")
+
+
+class VersoesCompartilhadas:
+    # As mesmas versões, para vários workers: uma tabela num arquivo mapeado
+    # em memória, então uma escrita num processo muda na hora a ETag vista
+    # pelos outros (e uma ETag vale em qualquer worker). Cada chave (casa,
+    # coleção, id) cai numa posição por hash; duas chaves na mesma posição só
+    # mudam juntas, o que invalida ETags a mais, nunca de menos. Cabeçalho:
+    # relógio compartilhado e o prefixo das ETags, sorteado a cada preparação
+
+    def __init__(self, caminho: str, posicoes: int = POSICOES_VERSOES):
+        self.posicoes = posicoes
+        self._fd = os.open(caminho, os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock = threading.Lock()
+        tamanho = 16 + 8 * posicoes
+        with self._exclusivo():
+            if os.fstat(self._fd).st_size < tamanho:
+                os.ftruncate(self._fd, tamanho)
+            self._mapa = mmap.mmap(self._fd, tamanho)
+            if _U64.unpack_from(self._mapa, 8)[0] == 0:
+                _U64.pack_into(self._mapa, 8, int.from_bytes(os.urandom(4), "big") | 1)
+        self.prefixo = format(_U64.unpack_from(self._mapa, 8)[0], "08x")
+
+    def alterar(self, colecao: str, *ids):
+        casa = casa_atual.get()
+        self._avancar([self._posicao(casa, colecao)] + [self._posicao(casa, colecao, int(id_)) for id_ in ids])
+
+    def limpar(self):
+        self._avancar([self._posicao(casa_atual.get())])
+
+    def descartar(self, casa: str):
+        # Casa removida: uma casa recriada com o mesmo id não herda as ETags
+        self._avancar([self._posicao(casa)])
+
+    def assinatura(self, colecoes, entidade=None) -> tuple:
+        casa = casa_atual.get()
+        posicoes = [self._posicao(casa)] + [self._posicao(casa, c) for c in colecoes]
+        if entidade is not None:
+            posicoes.append(self._posicao(casa, *entidade))
+        # Leituras de 8 bytes alinhados, sem lock
+        return tuple(_U64.unpack_from(self._mapa, p)[0] for p in posicoes)
+
+    def _posicao(self, *chave) -> int:
+        return 16 + 8 * (zlib.crc32("|".join(map(str, chave)).encode()) % self.posicoes)
+
+    def _avancar(self, posicoes: list):
+        with self._exclusivo():
+            versao = _U64.unpack_from(self._mapa, 0)[0] + 1
+            _U64.pack_into(self._mapa, 0, versao)
+            for posicao in posicoes:
+                _U64.pack_into(self._mapa, posicao, versao)
+
+    @contextmanager
+    def _exclusivo(self):
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+
+class CacheDeRespostas:
+    # Corpos das respostas GET já prontos, por casa e URL, com a ETag da
+    # versão em que foram gerados e as versões comprimidas já pedidas; os
+    # menos usados saem quando o total de bytes passa do limite
+
+    def __init__(self, max_bytes: int = MAX_BYTES_RESPOSTAS):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._itens = OrderedDict()   # (casa, caminho, query) -> [etag, corpo, cabeçalhos, {codificação: corpo}]
+        self._lock = threading.Lock()
+        self.eventos = defaultdict(int)
+
+    def obter(self, chave, etag: str):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None or item[0] != etag:
+                return None
+            self._itens.move_to_end(chave)
+            return item
+
+    def guardar(self, chave, etag: str, corpo: bytes, cabecalhos: list):
+        if len(corpo) > self.max_bytes // 4:
+            return
+        with self._lock:
+            anterior = self._itens.pop(chave, None)
+            if anterior is not None:
+                self.bytes -= _tamanho(anterior)
+            self._itens[chave] = [etag, corpo, cabecalhos, {}]
+            self.bytes += len(corpo)
+            while self.bytes > self.max_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self.bytes -= _tamanho(removido)
+                self.eventos["descartes"] += 1
+
+    def comprimido(self, chave, item: list, codificacao: str) -> bytes:
+        # Feita no primeiro acerto que a pede; os seguintes só copiam
+        corpo = item[3].get(codificacao)
+        if corpo is None:
+            corpo = comprimir(item[1], codificacao)
+            with self._lock:
+                if self._itens.get(chave) is item and codificacao not in item[3]:
+                    item[3][codificacao] = corpo
+                    self.bytes += len(corpo)
+        return corpo
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self.bytes = 0
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {"itens": len(self._itens), "bytes": self.bytes, "max_bytes": self.max_bytes, **self.eventos}
+
+
+if canal.ativo:
+    versoes = VersoesCompartilhadas(canal.caminho + ".versoes")
+else:
+    versoes = PorCasa(Versoes)
+respostas = CacheDeRespostas()
+
+
+def _tamanho(item: list) -> int:
+    return len(item[1]) + sum(len(corpo) for corpo in item[3].values())
+
+
+def em_cache(*colecoes: str, entidade: tuple = None):
+    # Marca uma rota GET para ETag e cache de resposta. `colecoes` são as
+    # coleções de que o corpo depende; `entidade` é (coleção, parâmetro do
+    # caminho com o id) para rotas de um item só. Aplicado pela RotaComCache
+    def marcar(endpoint):
+        endpoint.cache_de_resposta = (colecoes, entidade)
+        return endpoint
+    return marcar
+
+
+def _etag(casa: str, caminho: str, query: bytes, assinatura: tuple) -> str:
+    resumo = hashlib.blake2b(f"{casa}|{caminho}|{assinatura}".encode() + b"?" + query, digest_size=8).hexdigest()
+    return f'"{versoes.prefixo}-{resumo}"'
+
+
+def _coincide(cabecalho: str, etag: str) -> bool:
+    # If-None-Match usa comparação fraca: W/"x" vale como "x"
+    return any(candidata.strip().removeprefix("W/") == etag for candidata in cabecalho.split(","))
+
+
+def _curinga(cabecalho: str) -> bool:
+    # "*" só vale se a representação atual existe: conferido antes do 304
+    return any(candidata.strip() == "*" for candidata in cabecalho.split(","))
+
+
+def envolver(handler, configuracao):
+    # Antes de resolver dependências (sessão, paginação) e chamar a rota:
+    # com a versão atual, responde 304 ou o corpo guardado sem tocar no banco
+    colecoes, entidade = configuracao
+
+    async def handler_com_cache(request: Request) -> Response:
+        casa = casa_atual.get()
+        chave_entidade = None
+        if entidade is not None:
+            try:
+                chave_entidade = (entidade[0], int(request.path_params[entidade[1]]))
+            except (KeyError, ValueError):
+                return await handler(request)
+        # Lida antes da consulta: uma escrita no meio do caminho só pode deixar
+        # o corpo mais novo que a versão, nunca o contrário
+        assinatura = versoes.assinatura(colecoes, chave_entidade)
+        query = request.scope.get("query_string", b"")
+        etag = _etag(casa, request.url.path, query, assinatura)
+
+        condicional = request.headers.get("if-none-match", "")
+        if _coincide(condicional, etag):
+            return _nao_modificada(etag)
+        curinga = _curinga(condicional)
+
+        chave = (casa, request.url.path, query)
+        item = respostas.obter(chave, etag)
+        if item is not None:
+            if curinga:
+                return _nao_modificada(etag)
+            respostas.eventos["acertos"] += 1
+            codificacao = None
+            if len(item[1]) >= MINIMO_COMPRESSAO:
+                codificacao = escolher(request.headers.get("accept-encoding", ""), CODIFICACOES)
+            if codificacao is None:
+                resposta = Response(content=item[1])
+                resposta.raw_headers = list(item[2])
+                return resposta
+            # Já comprimida: o GZipMiddleware deixa passar
+            resposta = Response(
+                content=respostas.comprimido(chave, item, codificacao),
+                headers={"content-encoding": codificacao, "vary": "Accept-Encoding"},
+            )
+            resposta.raw_headers = [h for h in item[2] if h[0] != b"content-length"] + resposta.raw_headers
+            return resposta
+
+        respostas.eventos["falhas"] += 1
+        resposta = await handler(request)
+        if resposta.status_code == 200 and isinstance(getattr(resposta, "body", None), bytes):
+            resposta.headers["etag"] = etag
+            resposta.headers["cache-control"] = "no-cache"
+            respostas.guardar(chave, etag, resposta.body, list(resposta.raw_headers))
+            if curinga:
+                return _nao_modificada(etag)
+        return resposta
+
+    return handler_com_cache
+
+
+def _nao_modificada(etag: str) -> Response:
+    respostas.eventos["nao_modificadas"] += 1
+    return Response(status_code=304, headers={"etag": etag, "cache-control": "no-cache"})
+
+
+class RotaComCache(APIRoute):
+    # Rotas marcadas com @em_cache passam antes pela ETag e pelo cache de respostas
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        configuracao = getattr(self.endpoint, "cache_de_resposta", None)
+        return handler if configuracao is None else envolver(handler, configuracao)
+
+
+# Mudanças de estado e atributos chegam de vários caminhos (rotas, gateway,
+# cenas, regras); todas passam pelo barramento. Só as deste processo: com
+# vários workers as versões já são compartilhadas
+barramento.ouvir(lambda deltas: versoes.alterar("dispositivos", *(d["id"] for d in deltas)))
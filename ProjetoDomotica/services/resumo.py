@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+from ProjetoDomotica.database.database import SessionLocal, usar_casa
+from ProjetoDomotica.model.models import Comodo, Dispositivo, comodo_dispositivo
+from ProjetoDomotica.services.canal import PorCasaReplicado
+from ProjetoDomotica.services.eventos import barramento
+
+
+# Intervalo (segundos) entre as conferências dos contadores com as tabelas
+INTERVALO_RECONCILIACAO = float(os.getenv("DOMOTICA_RECONCILIACAO", "300"))
+
+
+def _novo_contador(nome: str) -> dict:
+    return {"nome": nome, "total": 0, "ligados": 0, "por_tipo": Counter()}
+
+
+class ResumoDeComodos:
+    # Contadores por cômodo (total, ligados e por tipo) mantidos a cada escrita.
+    # Guarda o último (tipo, estado, cômodos) de cada dispositivo, então toda
+    # atualização é uma diferença contra o valor anterior e pode ser repetida
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._carregado = False
+        self._dispositivos = {}   # id -> (tipo, estado, frozenset de comodo_ids)
+        self._comodos = {}        # id -> contador
+        self.reconciliacoes = 0
+        self.divergencias = 0
+
+    def resumo(self, db: Session) -> list:
+        with self._lock:
+            if not self._carregado:
+                self._carregar(db)
+            return [
+                {
+                    "id": comodo_id,
+                    "nome": c["nome"],
+                    "total": c["total"],
+                    "ligados": c["ligados"],
+                    "por_tipo": dict(c["por_tipo"]),
+                }
+                for comodo_id, c in sorted(self._comodos.items())
+            ]
+
+    def contagem(self, comodo_id: int, db: Session = None):
+        # (total, ligados) do cômodo; None se os contadores não estão carregados
+        # e não foi passado um banco para carregá-los
+        with self._lock:
+            if not self._carregado:
+                if db is None:
+                    return None
+                self._carregar(db)
+            c = self._comodos.get(comodo_id)
+            return (c["total"], c["ligados"]) if c is not None else (0, 0)
+
+    def definir_dispositivo(self, dispositivo_id: int, tipo: str, estado: bool, comodo_ids=()):
+        with self._lock:
+            if not self._carregado:
+                return
+            self._aplicar(dispositivo_id, -1)
+            self._dispositivos[dispositivo_id] = (tipo, bool(estado), frozenset(comodo_ids))
+            self._aplicar(dispositivo_id, 1)
+
+    def remover_dispositivo(self, dispositivo_id: int):
+        with self._lock:
+            if self._carregado:
+                self._aplicar(dispositivo_id, -1)
+                self._dispositivos.pop(dispositivo_id, None)
+
+    def vincular(self, dispositivo_id: int, comodo_id: int):
+        self._alterar_comodos(dispositivo_id, lambda ids: ids | {comodo_id})
+
+    def desvincular(self, dispositivo_id: int, comodo_id: int):
+        self._alterar_comodos(dispositivo_id, lambda ids: ids - {comodo_id})
+
+    def definir_comodo(self, comodo_id: int, nome: str):
+        with self._lock:
+            if self._carregado:
+                self._comodos.setdefault(comodo_id, _novo_contador(nome))["nome"] = nome
+
+    def remover_comodo(self, comodo_id: int):
+        with self._lock:
+            if self._carregado:
+                self._comodos.pop(comodo_id, None)
+
+    def registrar(self, deltas: list):
+        # Ouvinte do barramento: só as transições reais mexem em "ligados"
+        with self._lock:
+            if not self._carregado:
+                return
+            for d in deltas:
+                if "estado" not in d:
+                    continue
+                anterior = self._dispositivos.get(d["id"])
+                if anterior is not None and anterior[1] != bool(d["estado"]):
+                    self.definir_dispositivo(d["id"], anterior[0], d["estado"], anterior[2])
+
+    def limpar(self):
+        with self._lock:
+            self._carregado = False
+            self._dispositivos = {}
+            self._comodos = {}
+
+    def reconciliar(self, db: Session) -> bool:
+        # Confere os contadores com um GROUP BY nas tabelas; se divergirem, recarrega
+        esperado = {}
+        for comodo_id, nome in db.execute(select(Comodo.id, Comodo.nome)):
+            esperado[comodo_id] = _novo_contador(nome)
+        consulta = (
+            select(
+                comodo_dispositivo.c.comodo_id,
+                Dispositivo.tipo,
+                func.count(),
+                func.sum(case((Dispositivo.estado, 1), else_=0)),
+            )
+            .join(Dispositivo, Dispositivo.id == comodo_dispositivo.c.dispositivo_id)
+            .group_by(comodo_dispositivo.c.comodo_id, Dispositivo.tipo)
+        )
+        for comodo_id, tipo, total, ligados in db.execute(consulta):
+            c = esperado[comodo_id]
+            c["total"] += total
+            c["ligados"] += ligados
+            c["por_tipo"][tipo] += total
+
+        with self._lock:
+            self.reconciliacoes += 1
+            if not self._carregado or self._comodos == esperado:
+                return True
+            self.divergencias += 1
+            self._carregar(db)
+            return False
+
+    def _alterar_comodos(self, dispositivo_id: int, alterar):
+        with self._lock:
+            anterior = self._dispositivos.get(dispositivo_id)
+            if self._carregado and anterior is not None:
+                self.definir_dispositivo(dispositivo_id, anterior[0], anterior[1], alterar(anterior[2]))
+
+    def _aplicar(self, dispositivo_id: int, sinal: int):
+        atual = self._dispositivos.get(dispositivo_id)
+        if atual is None:
+            return
+        tipo, estado, comodo_ids = atual
+        for comodo_id in comodo_ids:
+            c = self._comodos.get(comodo_id)
+            if c is None:
+                continue
+            c["total"] += sinal
+            c["ligados"] += sinal * estado
+            c["por_tipo"][tipo] += sinal
+            if not c["por_tipo"][tipo]:
+                del c["por_tipo"][tipo]
+
+    def _carregar(self, db: Session):
+        vinculos = {}
+        for comodo_id, dispositivo_id in db.execute(select(comodo_dispositivo.c.comodo_id, comodo_dispositivo.c.dispositivo_id)):
+            vinculos.setdefault(dispositivo_id, set()).add(comodo_id)
+
+        self._comodos = {comodo_id: _novo_contador(nome) for comodo_id, nome in db.execute(select(Comodo.id, Comodo.nome))}
+        self._dispositivos = {}
+        for dispositivo_id, tipo, estado in db.execute(select(Dispositivo.id, Dispositivo.tipo, Dispositivo.estado)):
+            self._dispositivos[dispositivo_id] = (tipo, bool(estado), frozenset(vinculos.get(dispositivo_id, ())))
+            self._aplicar(dispositivo_id, 1)
+        self._carregado = True
+
+
+class Reconciliacao:
+    # Uma thread para todas as casas: confere os contadores das casas que
+    # estão em memória, cada uma no seu banco
+
+    def __init__(self, intervalo: float = INTERVALO_RECONCILIACAO):
+        self.intervalo = intervalo
+        self._thread = None
+
+    def iniciar(self):
+        if self._thread is None and self.intervalo > 0:
+            self._thread = threading.Thread(target=self._laco, name="reconciliacao-resumo", daemon=True)
+            self._thread.start()
+
+    def _laco(self):
+        while True:
+            time.sleep(self.intervalo)
+            for casa, contadores in resumo.instancias():
+                try:
+                    with usar_casa(casa), SessionLocal() as db:
+                        contadores.reconciliar(db)
+                except Exception:
+                    continue
+
+
+resumo = PorCasaReplicado(ResumoDeComodos, "resumo", replicar=(
+    "definir_dispositivo", "remover_dispositivo", "vincular", "desvincular", "definir_comodo", "remover_comodo", "limpar",
+))
+reconciliacao = Reconciliacao()
+# Resolvido a cada lote: os deltas vão para os contadores da casa de quem publica
+# (também os de outros workers, que mudam os mesmos dispositivos)
+barramento.ouvir(lambda deltas: resumo.registrar(deltas), remotos=True)
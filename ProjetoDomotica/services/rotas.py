@@ -0,0 +1,36 @@
+from fastapi.routing import APIRoute
+from ProjetoDomotica.services.idempotencia import RotaIdempotente
+from ProjetoDomotica.services.metricas import RotaInstrumentada
+from ProjetoDomotica.services.respostas import RotaComCache
+
+
+class Rota(RotaIdempotente, RotaComCache, RotaInstrumentada):
+    # Classe de rota dos routers: idempotência, cache de respostas e métricas,
+    # cada um na sua classe, combinados por herança (cada get_route_handler
+    # envolve o da seguinte)
+    pass
+
+
+# Marcação da rota -> classe de rota que a aplica
+_MARCACOES = {
+    "cache_de_resposta": (RotaComCache, "@em_cache"),
+    "comando_idempotente": (RotaIdempotente, "@idempotente"),
+}
+
+
+def conferir_rotas(rotas):
+    # Na montagem da app: uma rota marcada num router com outra route_class
+    # perderia o cache (ou a idempotência) sem aviso
+    for rota in rotas:
+        incluido = getattr(rota, "original_router", None)
+        if incluido is not None:
+            # O FastAPI recente guarda o router incluído sem copiar as rotas
+            conferir_rotas(incluido.routes)
+            continue
+        if not isinstance(rota, APIRoute):
+            continue
+        for atributo, (classe, marcador) in _MARCACOES.items():
+            if getattr(rota.endpoint, atributo, None) is not None and not isinstance(rota, classe):
+                raise RuntimeError(
+                    f"A rota {rota.path} usa {marcador}, mas o router não usa route_class=Rota."
+                )
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ProjetoDomotica.model.models import Comodo, comodo_dispositivo
+from ProjetoDomotica.services.canal import PorCasaReplicado
+
+
+MAX_ITENS = 10_000
+TTL_SEGUNDOS = 300
+
+
+class CacheLRU:
+    def __init__(self, max_itens: int = MAX_ITENS, ttl: float = TTL_SEGUNDOS):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._itens)
+
+    def obter_varios(self, chaves):
+        # Retorna os valores em cache e a lista de chaves ausentes ou expiradas
+        agora = time.monotonic()
+        encontrados, ausentes = {}, []
+        with self._lock:
+            for chave in chaves:
+                item = self._itens.get(chave)
+                if item is None or item[1] < agora:
+                    ausentes.append(chave)
+                    continue
+                self._itens.move_to_end(chave)
+                encontrados[chave] = item[0]
+            self.acertos += len(encontrados)
+            self.falhas += len(ausentes)
+        return encontrados, ausentes
+
+    def definir(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + self.ttl)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def invalidar(self, *chaves):
+        with self._lock:
+            for chave in chaves:
+                self._itens.pop(chave, None)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def estatisticas(self) -> dict:
+        return {"itens": len(self._itens), "acertos": self.acertos, "falhas": self.falhas}
+
+
+class CacheDeTopologia:
+    # Grafo cômodo–dispositivo (tabela comodo_dispositivo) e nomes dos cômodos.
+    # Não guarda o estado dos dispositivos, que muda com frequência.
+
+    def __init__(self, max_itens: int = MAX_ITENS, ttl: float = TTL_SEGUNDOS):
+        self.por_dispositivo = CacheLRU(max_itens, ttl)
+        self.por_comodo = CacheLRU(max_itens, ttl)
+        self.comodos = CacheLRU(max_itens, ttl)
+
+    def comodos_dos_dispositivos(self, db: Session, dispositivo_ids) -> dict:
+        encontrados, ausentes = self.por_dispositivo.obter_varios(dispositivo_ids)
+        if ausentes:
+            carregados = {i: [] for i in ausentes}
+            linhas = db.execute(
+                select(comodo_dispositivo.c.dispositivo_id, comodo_dispositivo.c.comodo_id)
+                .where(comodo_dispositivo.c.dispositivo_id.in_(ausentes))
+                .order_by(comodo_dispositivo.c.comodo_id)
+            )
+            for dispositivo_id, comodo_id in linhas:
+                carregados[dispositivo_id].append(comodo_id)
+            for dispositivo_id, comodo_ids in carregados.items():
+                encontrados[dispositivo_id] = tuple(comodo_ids)
+                self.por_dispositivo.definir(dispositivo_id, encontrados[dispositivo_id])
+        return encontrados
+
+    def dispositivos_do_comodo(self, db: Session, comodo_id: int) -> tuple:
+        encontrados, ausentes = self.por_comodo.obter_varios([comodo_id])
+        if ausentes:
+            encontrados[comodo_id] = tuple(db.scalars(
+                select(comodo_dispositivo.c.dispositivo_id)
+                .where(comodo_dispositivo.c.comodo_id == comodo_id)
+                .order_by(comodo_dispositivo.c.dispositivo_id)
+            ))
+            self.por_comodo.definir(comodo_id, encontrados[comodo_id])
+        return encontrados[comodo_id]
+
+    def nomes_dos_comodos(self, db: Session, comodo_ids) -> dict:
+        encontrados, ausentes = self.comodos.obter_varios(comodo_ids)
+        if ausentes:
+            for comodo_id, nome in db.execute(select(Comodo.id, Comodo.nome).where(Comodo.id.in_(ausentes))):
+                encontrados[comodo_id] = nome
+                self.comodos.definir(comodo_id, nome)
+        return encontrados
+
+    def comodos_out(self, db: Session, dispositivo_ids) -> dict:
+        # Lista de cômodos (id, nome) de cada dispositivo, como em DispositivoOut
+        vinculos = self.comodos_dos_dispositivos(db, dispositivo_ids)
+        nomes = self.nomes_dos_comodos(db, {c for ids in vinculos.values() for c in ids})
+        return {
+            dispositivo_id: [{"id": c, "nome": nomes[c]} for c in comodo_ids if c in nomes]
+            for dispositivo_id, comodo_ids in vinculos.items()
+        }
+
+    def invalidar_dispositivo(self, dispositivo_id: int, comodo_ids=()):
+        self.por_dispositivo.invalidar(dispositivo_id)
+        self.por_comodo.invalidar(*comodo_ids)
+
+    def invalidar_comodo(self, comodo_id: int):
+        self.comodos.invalidar(comodo_id)
+        self.por_comodo.invalidar(comodo_id)
+
+    def limpar(self):
+        self.por_dispositivo.limpar()
+        self.por_comodo.limpar()
+        self.comodos.limpar()
+
+    def estatisticas(self) -> dict:
+        return {
+            "por_dispositivo": self.por_dispositivo.estatisticas(),
+            "por_comodo": self.por_comodo.estatisticas(),
+            "comodos": self.comodos.estatisticas(),
+        }
+
+
+topologia = PorCasaReplicado(CacheDeTopologia, "topologia", replicar=("invalidar_dispositivo", "invalidar_comodo", "limpar"))
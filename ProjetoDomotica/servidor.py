@@ -0,0 +1,48 @@
+# Sobe a API com vários workers (processos) do uvicorn. O esquema dos bancos,
+# os arquivos estáticos (com hash e comprimidos) e o canal entre os workers
+# são preparados aqui, uma vez, antes de os workers iniciarem. Uso (no
+# diretório com static/ e templates/):
+#   python -m ProjetoDomotica.servidor --workers 4 --port 8000
+# Com outro gerenciador de processos (gunicorn, systemd), prepare antes e
+# inicie cada worker com DOMOTICA_WORKERS=<n> e DOMOTICA_ESQUEMA_PREPARADO=1:
+#   python -m ProjetoDomotica.servidor --workers 4 --so-preparar
+import argparse
+import os
+
+
+def preparar(workers: int):
+    # Antes de importar o pacote: a configuração é lida na importação
+    os.environ["DOMOTICA_WORKERS"] = str(workers)
+    from ProjetoDomotica.services.canal import canal
+    from ProjetoDomotica.services.casas import preparar_bancos
+    from ProjetoDomotica.services.estaticos import construir
+
+    preparar_bancos()
+    construir()
+    if canal.ativo:
+        canal.preparar()
+    # Herdado pelos workers: o startup da app não cria o esquema de novo
+    os.environ["DOMOTICA_ESQUEMA_PREPARADO"] = "1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API de domótica com vários workers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--so-preparar", action="store_true", help="Só prepara os bancos e o canal")
+    args = parser.parse_args()
+
+    preparar(args.workers)
+    if args.so_preparar:
+        return
+
+    import uvicorn
+    uvicorn.run(
+        "ProjetoDomotica.main:app", host=args.host, port=args.port, workers=args.workers, log_level=args.log_level
+    )
+
+
+if __name__ == "__main__":
+    main()
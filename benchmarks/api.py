@@ -0,0 +1,215 @@
+# Carga da API REST em processo (httpx + ASGITransport) sobre um SQLite temporário.
+# Uso:
+#   python -m benchmarks.api --saida resultado.json
+#   python -m benchmarks.api --cenario listagem --baseline baseline.json
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+from benchmarks.comum import criar_app, preparar_ambiente, resumo_latencias, semear
+
+
+def cenario_criacao(aleatorio, contador, tamanho):
+    n = next(contador)
+    escolha = aleatorio.random()
+    if escolha < 0.2:
+        return "POST /comodos/", "POST", "/comodos/", {"nome": f"Novo cômodo {n}"}
+    if escolha < 0.7:
+        return "POST /dispositivos/", "POST", "/dispositivos/", {
+            "nome": f"Novo dispositivo {n}",
+            "tipo": "lampada",
+            "comodo_ids": [aleatorio.randint(1, tamanho["comodos"])],
+        }
+    return "POST /acoes/", "POST", "/acoes/", {
+        "descricao": f"Nova ação {n}",
+        "dispositivo_id": aleatorio.randint(1, tamanho["dispositivos"]),
+        "estado": True,
+    }
+
+
+def cenario_listagem(aleatorio, contador, tamanho):
+    escolha = aleatorio.random()
+    if escolha < 0.4:
+        after = aleatorio.randint(0, tamanho["dispositivos"])
+        return "GET /dispositivos/", "GET", f"/dispositivos/?limit=100&after={after}", None
+    if escolha < 0.6:
+        return "GET /cenas/", "GET", "/cenas/?limit=50", None
+    if escolha < 0.75:
+        return "GET /acoes/", "GET", "/acoes/?limit=100", None
+    if escolha < 0.85:
+        return "GET /comodos/", "GET", "/comodos/", None
+    comodo_id = aleatorio.randint(1, tamanho["comodos"])
+    return "GET /comodos/{id}/vinculos", "GET", f"/comodos/{comodo_id}/vinculos", None
+
+
+def cenario_alternancia(aleatorio, contador, tamanho):
+    if aleatorio.random() < 0.9:
+        dispositivo_id = aleatorio.randint(1, tamanho["dispositivos"])
+        return "PATCH /dispositivos/{id}", "PATCH", f"/dispositivos/{dispositivo_id}", {
+            "estado": aleatorio.random() < 0.5
+        }
+    return "POST /dispositivos/estado:lote", "POST", "/dispositivos/estado:lote", {
+        "seletor": {"comodo_id": aleatorio.randint(1, tamanho["comodos"])},
+        "estado": aleatorio.random() < 0.5,
+    }
+
+
+def cenario_cenas(aleatorio, contador, tamanho):
+    cena_id = aleatorio.randint(1, tamanho["cenas"])
+    acao_id = aleatorio.randint(1, tamanho["acoes"])
+    if aleatorio.random() < 0.6:
+        return "POST /cenas/{id}/acoes/{acao_id}", "POST", f"/cenas/{cena_id}/acoes/{acao_id}", None
+    return "DELETE /cenas/{id}/acoes/{acao_id}", "DELETE", f"/cenas/{cena_id}/acoes/{acao_id}", None
+
+
+def cenario_painel(aleatorio, contador, tamanho):
+    # Painéis consultando sempre as mesmas páginas, com poucas escritas no meio;
+    # as leituras mandam If-None-Match com a última ETag recebida
+    escolha = aleatorio.random()
+    if escolha < 0.05:
+        dispositivo_id = aleatorio.randint(1, tamanho["dispositivos"])
+        return "PATCH /dispositivos/{id}", "PATCH", f"/dispositivos/{dispositivo_id}", {
+            "estado": aleatorio.random() < 0.5
+        }
+    if escolha < 0.45:
+        return "GET /dispositivos/", "GET", "/dispositivos/?limit=100", None
+    if escolha < 0.65:
+        return "GET /comodos/", "GET", "/comodos/", None
+    if escolha < 0.85:
+        return "GET /cenas/", "GET", "/cenas/?limit=50", None
+    cena_id = aleatorio.randint(1, 10)
+    return "GET /cenas/{id}", "GET", f"/cenas/{cena_id}", None
+
+
+cenario_painel.condicional = True
+
+
+CENARIOS = {
+    "criacao": cenario_criacao,
+    "listagem": cenario_listagem,
+    "alternancia": cenario_alternancia,
+    "cenas": cenario_cenas,
+    "painel": cenario_painel,
+}
+
+
+async def executar_cenario(app, gerador, requisicoes: int, concorrencia: int, tamanho: dict, semente: int):
+    import httpx
+
+    latencias = defaultdict(list)
+    erros = defaultdict(int)
+    contador = itertools.count()
+    restantes = itertools.count()
+    condicional = getattr(gerador, "condicional", False)
+
+    async def trabalhador(cliente, aleatorio):
+        etags = {}
+        while next(restantes) < requisicoes:
+            rotulo, metodo, url, corpo = gerador(aleatorio, contador, tamanho)
+            cabecalhos = {"If-None-Match": etags[url]} if condicional and url in etags else None
+            inicio = time.perf_counter()
+            r = await cliente.request(metodo, url, json=corpo, headers=cabecalhos)
+            duracao = time.perf_counter() - inicio
+            if condicional and "etag" in r.headers:
+                etags[url] = r.headers["etag"]
+            latencias[f"{rotulo} (304)" if r.status_code == 304 else rotulo].append(duracao)
+            if r.status_code >= 400:
+                erros[rotulo] += 1
+
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(
+            trabalhador(cliente, random.Random(semente + i)) for i in range(concorrencia)
+        ))
+        duracao = time.perf_counter() - inicio
+
+    return {
+        "requisicoes": sum(len(v) for v in latencias.values()),
+        "req_por_s": round(sum(len(v) for v in latencias.values()) / duracao, 1),
+        "endpoints": {
+            rotulo: {
+                "requisicoes": len(valores),
+                "erros": erros[rotulo],
+                "req_por_s": round(len(valores) / duracao, 1),
+                "latencia_ms": resumo_latencias(valores),
+            }
+            for rotulo, valores in sorted(latencias.items())
+        },
+    }
+
+
+def comparar(atual: dict, baseline: dict) -> dict:
+    # Variação percentual em relação à baseline (positivo = mais lento / menos vazão)
+    def variacao(novo, antigo):
+        return round((novo - antigo) / antigo * 100, 1) if antigo else None
+
+    comparacao = {}
+    for cenario, resultado in atual["cenarios"].items():
+        anterior = baseline.get("cenarios", {}).get(cenario)
+        if not anterior:
+            continue
+        comparacao[cenario] = {"req_por_s_%": variacao(resultado["req_por_s"], anterior["req_por_s"])}
+        for rotulo, dados in resultado["endpoints"].items():
+            antigo = anterior["endpoints"].get(rotulo)
+            if antigo:
+                comparacao[cenario][rotulo] = {
+                    "p50_%": variacao(dados["latencia_ms"]["p50"], antigo["latencia_ms"]["p50"]),
+                    "p95_%": variacao(dados["latencia_ms"]["p95"], antigo["latencia_ms"]["p95"]),
+                    "p99_%": variacao(dados["latencia_ms"]["p99"], antigo["latencia_ms"]["p99"]),
+                }
+    return comparacao
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da API REST")
+    parser.add_argument("--cenario", choices=sorted(CENARIOS), action="append",
+                        help="Pode ser repetido; por padrão roda todos")
+    parser.add_argument("--comodos", type=int, default=50)
+    parser.add_argument("--dispositivos", type=int, default=2000)
+    parser.add_argument("--acoes", type=int, default=2000)
+    parser.add_argument("--cenas", type=int, default=200)
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--concorrencia", type=int, default=16)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--async", dest="modo_async", action="store_true", help="Usa DOMOTICA_ASYNC=1")
+    parser.add_argument("--saida", help="Arquivo JSON para gravar o resultado")
+    parser.add_argument("--baseline", help="Resultado JSON anterior para comparação")
+    args = parser.parse_args()
+    # preparar_ambiente() muda o diretório atual
+    saida = os.path.abspath(args.saida) if args.saida else None
+    baseline = os.path.abspath(args.baseline) if args.baseline else None
+
+    tamanho = {"comodos": args.comodos, "dispositivos": args.dispositivos, "acoes": args.acoes, "cenas": args.cenas}
+    resultado = {"parametros": {**tamanho, "requisicoes": args.requisicoes, "concorrencia": args.concorrencia,
+                                "async": args.modo_async}, "cenarios": {}}
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        preparar_ambiente(diretorio, modo_async=args.modo_async)
+        app = criar_app()
+        semear(**tamanho)
+        # Cada cenário roda sobre o banco deixado pelo anterior, na ordem pedida
+        for nome in args.cenario or sorted(CENARIOS):
+            resultado["cenarios"][nome] = asyncio.run(executar_cenario(
+                app, CENARIOS[nome], args.requisicoes, args.concorrencia, tamanho, args.semente
+            ))
+
+    if baseline:
+        with open(baseline, encoding="utf-8") as arquivo:
+            resultado["comparacao"] = comparar(resultado, json.load(arquivo))
+
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if saida:
+        with open(saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+    print(texto)
+
+
+if __name__ == "__main__":
+    main()
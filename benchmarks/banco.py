@@ -0,0 +1,87 @@
+# Vazão do modo síncrono (threadpool) contra o assíncrono (AsyncSession)
+# sob carga concorrente mista de leitura e escrita.
+# Uso: python -m benchmarks.banco --modo ambos --concorrencia 32 --duracao 10
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.comum import criar_app, preparar_ambiente, resumo_latencias, semear
+
+
+async def carga(app, concorrencia: int, duracao: float, dispositivos: int, escritas: float):
+    import httpx
+
+    latencias, erros = [], 0
+    fim = time.perf_counter() + duracao
+
+    async def trabalhador(cliente, semente):
+        nonlocal erros
+        aleatorio = random.Random(semente)
+        while time.perf_counter() < fim:
+            dispositivo_id = aleatorio.randint(1, dispositivos)
+            inicio = time.perf_counter()
+            if aleatorio.random() < escritas:
+                r = await cliente.patch(f"/dispositivos/{dispositivo_id}", json={"estado": aleatorio.random() < 0.5})
+            elif aleatorio.random() < 0.5:
+                r = await cliente.get(f"/dispositivos/{dispositivo_id}")
+            else:
+                r = await cliente.get("/dispositivos/", params={"limit": 50, "after": dispositivo_id})
+            latencias.append(time.perf_counter() - inicio)
+            if r.status_code >= 400:
+                erros += 1
+
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador(cliente, i) for i in range(concorrencia)))
+        total = time.perf_counter() - inicio
+
+    return {
+        "requisicoes": len(latencias),
+        "erros": erros,
+        "req_por_s": round(len(latencias) / total, 1),
+        "latencia_ms": resumo_latencias(latencias),
+    }
+
+
+def executar_modo(args) -> dict:
+    with tempfile.TemporaryDirectory() as diretorio:
+        preparar_ambiente(diretorio, modo_async=args.modo == "async")
+        app = criar_app()
+        semear(comodos=max(1, args.dispositivos // 20), dispositivos=args.dispositivos)
+        resultado = asyncio.run(carga(app, args.concorrencia, args.duracao, args.dispositivos, args.escritas))
+        return {"modo": args.modo, **resultado}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vazão síncrona x assíncrona do banco")
+    parser.add_argument("--modo", choices=["sync", "async", "ambos"], default="ambos")
+    parser.add_argument("--concorrencia", type=int, default=32)
+    parser.add_argument("--duracao", type=float, default=10)
+    parser.add_argument("--dispositivos", type=int, default=1000)
+    parser.add_argument("--escritas", type=float, default=0.3, help="Fração de requisições de escrita")
+    args = parser.parse_args()
+
+    if args.modo != "ambos":
+        print(json.dumps(executar_modo(args)))
+        return
+
+    # Cada modo roda em um processo novo: a configuração é lida na importação
+    resultados = []
+    for modo in ("sync", "async"):
+        comando = [sys.executable, "-m", "benchmarks.banco", "--modo", modo]
+        for opcao in ("concorrencia", "duracao", "dispositivos", "escritas"):
+            comando += [f"--{opcao}", str(getattr(args, opcao))]
+        saida = subprocess.run(comando, check=True, capture_output=True, text=True, cwd=os.getcwd())
+        resultados.append(json.loads(saida.stdout.strip().splitlines()[-1]))
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# Muitas casas num só processo: um SQLite por casa e LRU de engines abertos.
+# Mede a vazão com acesso espalhado pelas casas e se uma casa com o lock de
+# escrita preso atrasa as escritas das outras.
+# Uso:
+#   python -m benchmarks.casas --casas 2000 --abertas 128 --requisicoes 20000
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from benchmarks.comum import criar_app, preparar_ambiente, resumo_latencias
+
+
+def criar_casas(quantidade: int, dispositivos: int):
+    from ProjetoDomotica.database.database import roteador
+    from ProjetoDomotica.model.models import Comodo, Dispositivo, comodo_dispositivo
+
+    for n in range(quantidade):
+        casa = f"casa-{n}"
+        roteador.criar(casa)
+        with roteador.engine(casa).begin() as conn:
+            conn.execute(Comodo.__table__.insert(), [{"id": 1, "nome": "Sala", "nome_normalizado": "sala"}])
+            conn.execute(Dispositivo.__table__.insert(), [
+                {"id": i, "nome": f"Dispositivo {i}", "nome_normalizado": f"dispositivo {i}",
+                 "tipo": "lampada", "estado": False}
+                for i in range(1, dispositivos + 1)
+            ])
+            conn.execute(comodo_dispositivo.insert(), [
+                {"comodo_id": 1, "dispositivo_id": i} for i in range(1, dispositivos + 1)
+            ])
+
+
+def escolher_casa(aleatorio, args) -> int:
+    # Acesso concentrado (Zipf aproximado): poucas casas quentes, cauda longa
+    if args.zipf:
+        return min(int(aleatorio.paretovariate(args.zipf)) - 1, args.casas - 1)
+    return aleatorio.randrange(args.casas)
+
+
+async def carga(app, args, casas, requisicoes: int, semente: int) -> dict:
+    import httpx
+
+    latencias, erros = defaultdict(list), defaultdict(int)
+    restantes = itertools.count()
+
+    async def trabalhador(cliente, aleatorio):
+        while next(restantes) < requisicoes:
+            casa = casas(aleatorio)
+            dispositivo_id = aleatorio.randint(1, args.dispositivos)
+            if aleatorio.random() < args.escritas:
+                rotulo, metodo, url, corpo = "PATCH", "PATCH", f"/casas/{casa}/dispositivos/{dispositivo_id}", {
+                    "estado": aleatorio.random() < 0.5
+                }
+            else:
+                rotulo, metodo, url, corpo = "GET", "GET", f"/casas/{casa}/dispositivos/?limit=20", None
+            inicio = time.perf_counter()
+            r = await cliente.request(metodo, url, json=corpo)
+            latencias[rotulo].append(time.perf_counter() - inicio)
+            if r.status_code >= 400:
+                erros[rotulo] += 1
+
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(
+            trabalhador(cliente, random.Random(semente + i)) for i in range(args.concorrencia)
+        ))
+        duracao = time.perf_counter() - inicio
+
+    total = sum(len(v) for v in latencias.values())
+    return {
+        "req_por_s": round(total / duracao, 1),
+        "latencia_ms": {rotulo: resumo_latencias(v) for rotulo, v in sorted(latencias.items())},
+        "erros": dict(erros),
+    }
+
+
+async def executar(app, args, diretorio_casas: Path) -> dict:
+    from ProjetoDomotica.database.database import roteador
+
+    resultado = {}
+    aberturas = roteador.aberturas
+    resultado["espalhada"] = await carga(
+        app, args, lambda a: f"casa-{escolher_casa(a, args)}", args.requisicoes, args.semente
+    )
+    resultado["espalhada"]["engines_abertos"] = roteador.aberturas - aberturas
+
+    # Isolamento: só escritas, nas casas 1..N, primeiro livres e depois com a
+    # casa 0 travada por uma transação de escrita aberta por fora da app
+    so_escritas = argparse.Namespace(**{**vars(args), "escritas": 1.0})
+    outras = lambda a: f"casa-{a.randrange(1, args.casas)}"
+    resultado["escritas_livre"] = await carga(app, so_escritas, outras, args.requisicoes // 4, args.semente + 1)
+    trava = sqlite3.connect(diretorio_casas / "casa-0.db", isolation_level=None)
+    trava.execute("BEGIN IMMEDIATE")
+    try:
+        resultado["escritas_com_casa_0_travada"] = await carga(
+            app, so_escritas, outras, args.requisicoes // 4, args.semente + 2
+        )
+    finally:
+        trava.execute("ROLLBACK")
+        trava.close()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de muitas casas (um banco por casa)")
+    parser.add_argument("--casas", type=int, default=2000)
+    parser.add_argument("--dispositivos", type=int, default=20, help="Dispositivos por casa")
+    parser.add_argument("--abertas", type=int, default=128, help="Engines mantidos abertos (LRU)")
+    parser.add_argument("--requisicoes", type=int, default=20_000)
+    parser.add_argument("--concorrencia", type=int, default=32)
+    parser.add_argument("--escritas", type=float, default=0.2, help="Fração de PATCH na carga espalhada")
+    parser.add_argument("--zipf", type=float, default=1.2, help="Expoente do acesso às casas (0 = uniforme)")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        preparar_ambiente(diretorio)
+        diretorio_casas = Path(diretorio) / "casas"
+        os.environ["DOMOTICA_CASAS_DIR"] = str(diretorio_casas)
+        os.environ["DOMOTICA_MAX_CASAS_ABERTAS"] = str(args.abertas)
+        app = criar_app()
+
+        inicio = time.perf_counter()
+        criar_casas(args.casas, args.dispositivos)
+        criacao = time.perf_counter() - inicio
+
+        resultado = asyncio.run(executar(app, args, diretorio_casas))
+
+    print(json.dumps({
+        "parametros": vars(args),
+        "criacao_s": round(criacao, 2),
+        **resultado,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Latência de busca no índice de palavras-chave das cenas (sem banco).
+# Uso:
+#   python -m benchmarks.comando --cenas 100000
+import argparse
+import json
+import random
+import time
+
+from benchmarks.comum import resumo_latencias
+
+VOCABULARIO = (
+    "sala cozinha quarto varanda jardim garagem escritório banheiro piscina churrasqueira "
+    "jantar almoço café manhã noite madrugada festa cinema leitura estudo trabalho relaxar "
+    "música filme série jogo treino banho dormir acordar sair chegar viagem férias visita "
+    "iluminação ventilação aquecimento irrigação segurança alarme portão cortina persiana "
+    "suave intensa colorida quente fria azul verde vermelha romântico aconchegante"
+).split()
+
+
+def main():
+    from ProjetoDomotica.services.comandos import IndiceDeCenas
+
+    parser = argparse.ArgumentParser(description="Benchmark do índice de comandos de cenas")
+    parser.add_argument("--cenas", type=int, default=100_000)
+    parser.add_argument("--buscas", type=int, default=10_000)
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(args.semente)
+    cenas = [
+        (i, f"{' '.join(aleatorio.sample(VOCABULARIO, 3))} {i}", " ".join(aleatorio.sample(VOCABULARIO, 2)))
+        for i in range(1, args.cenas + 1)
+    ]
+
+    indice = IndiceDeCenas()
+    inicio = time.perf_counter()
+    indice.carregar_de(cenas)
+    construcao = time.perf_counter() - inicio
+
+    frases = [
+        f"ativar a cena {' '.join(aleatorio.sample(VOCABULARIO, aleatorio.randint(1, 3)))}"
+        + (f" {aleatorio.randint(1, args.cenas)}" if aleatorio.random() < 0.5 else "")
+        for _ in range(args.buscas)
+    ]
+    latencias = []
+    for frase in frases:
+        inicio = time.perf_counter()
+        indice.consultar(frase)
+        latencias.append(time.perf_counter() - inicio)
+
+    print(json.dumps({
+        "parametros": vars(args),
+        "construcao_s": round(construcao, 3),
+        "busca_ms": resumo_latencias(latencias),
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Utilidades compartilhadas pelos benchmarks.
+import os
+import statistics
+from pathlib import Path
+
+PACOTE = Path(__file__).resolve().parent.parent / "ProjetoDomotica"
+
+
+def preparar_ambiente(diretorio, modo_async: bool = False):
+    # Precisa rodar antes de importar ProjetoDomotica.main: a configuração
+    # do banco é lida das variáveis de ambiente na importação.
+    os.environ["DOMOTICA_DATABASE_URL"] = f"sqlite:///{Path(diretorio) / 'bench.db'}"
+    os.environ["DOMOTICA_ASYNC"] = "1" if modo_async else "0"
+    # main.py monta static/ e templates/ relativos ao diretório atual
+    os.chdir(PACOTE)
+
+
+def criar_app():
+    from ProjetoDomotica.database.database import Base, engine
+    from ProjetoDomotica.main import app
+
+    Base.metadata.create_all(bind=engine)
+    return app
+
+
+def semear(comodos: int, dispositivos: int, acoes: int = 0, cenas: int = 0, bind=None):
+    # `bind`: engine de outra casa (roteador.engine); por padrão, a casa padrão
+    from ProjetoDomotica.database.database import engine
+    from ProjetoDomotica.model.models import Acao, Cena, Comodo, Dispositivo, cena_acoes, comodo_dispositivo
+
+    bind = bind if bind is not None else engine
+    with bind.begin() as conn:
+        conn.execute(Comodo.__table__.insert(), [{"id": i, "nome": f"Comodo {i}", "nome_normalizado": f"comodo {i}"} for i in range(1, comodos + 1)])
+        conn.execute(
+            Dispositivo.__table__.insert(),
+            [
+                {
+                    "id": i,
+                    "nome": f"Dispositivo {i}",
+                    "nome_normalizado": f"dispositivo {i}",
+                    "tipo": ("lampada", "tomada", "tv")[i % 3],
+                    "estado": False,
+                }
+                for i in range(1, dispositivos + 1)
+            ],
+        )
+        conn.execute(
+            comodo_dispositivo.insert(),
+            [{"comodo_id": (i % comodos) + 1, "dispositivo_id": i} for i in range(1, dispositivos + 1)],
+        )
+        if acoes:
+            conn.execute(
+                Acao.__table__.insert(),
+                [
+                    {
+                        "id": i,
+                        "descricao": f"Ação {i}",
+                        "descricao_normalizada": f"ação {i}",
+                        "dispositivo_id": (i % dispositivos) + 1,
+                        "estado": bool(i % 2),
+                    }
+                    for i in range(1, acoes + 1)
+                ],
+            )
+        if cenas:
+            conn.execute(Cena.__table__.insert(), [{"id": i, "nome": f"Cena {i}", "nome_normalizado": f"cena {i}"} for i in range(1, cenas + 1)])
+        if acoes and cenas:
+            conn.execute(
+                cena_acoes.insert(),
+                [{"cena_id": (i % cenas) + 1, "acao_id": i, "ordem": 0, "intervalo": 0} for i in range(1, acoes + 1)],
+            )
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def resumo_latencias(latencias) -> dict:
+    if not latencias:
+        return {}
+    return {
+        "media": round(statistics.fmean(latencias) * 1000, 3),
+        "p50": round(percentil(latencias, 50) * 1000, 3),
+        "p95": round(percentil(latencias, 95) * 1000, 3),
+        "p99": round(percentil(latencias, 99) * 1000, 3),
+    }
@@ -0,0 +1,61 @@
+# Latência de fan-out do barramento de estado com muitos assinantes.
+# Uso: python -m benchmarks.fanout --assinantes 1000 --eventos 200
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.comum import resumo_latencias
+from ProjetoDomotica.services.eventos import BarramentoDeEstado, delta_estado
+
+
+async def consumir(assinatura, esperados, latencias):
+    for _ in range(esperados):
+        deltas = await assinatura.proximo()
+        latencias.append(time.perf_counter() - deltas[0]["enviado_em"])
+
+
+async def executar(assinantes: int, eventos: int, comodos: int):
+    barramento = BarramentoDeEstado()
+    latencias = []
+    consumidores = []
+    for i in range(assinantes):
+        # Metade dos assinantes filtra por cômodo, metade recebe tudo
+        comodo_id = (i % comodos) + 1 if i % 2 else None
+        assinatura = barramento.assinar(comodo_id, capacidade=eventos)
+        esperados = eventos if comodo_id is None else sum(
+            1 for e in range(eventos) if (e % comodos) + 1 == comodo_id
+        )
+        consumidores.append(asyncio.create_task(consumir(assinatura, esperados, latencias)))
+
+    inicio = time.perf_counter()
+    for e in range(eventos):
+        delta = delta_estado(e, bool(e % 2), [(e % comodos) + 1])
+        delta["enviado_em"] = time.perf_counter()
+        barramento.publicar([delta])
+        # Cede o loop para os consumidores, como faria um publicador real
+        await asyncio.sleep(0)
+    await asyncio.gather(*consumidores)
+    duracao = time.perf_counter() - inicio
+
+    return {
+        "assinantes": assinantes,
+        "eventos": eventos,
+        "entregas": len(latencias),
+        "entregas_por_s": round(len(latencias) / duracao),
+        "latencia_ms": resumo_latencias(latencias),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência de fan-out do barramento de estado")
+    parser.add_argument("--assinantes", type=int, default=1000)
+    parser.add_argument("--eventos", type=int, default=200)
+    parser.add_argument("--comodos", type=int, default=10)
+    args = parser.parse_args()
+    resultado = asyncio.run(executar(args.assinantes, args.eventos, args.comodos))
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == "__main__":
+    main()
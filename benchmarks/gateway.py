@@ -0,0 +1,92 @@
+# Vazão de comandos pelo gateway com uma frota simulada (driver em memória).
+# Uso:
+#   python -m benchmarks.gateway --dispositivos 50000 --comodos 500 --comandos 200000 --falhas 0.05
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+
+from benchmarks.comum import criar_app, preparar_ambiente, resumo_latencias, semear
+
+
+async def executar(args):
+    from ProjetoDomotica.services.gateway import DriverSimulado, Gateway
+
+    aleatorio = random.Random(args.semente)
+    driver = DriverSimulado(latencia=args.latencia / 1000, taxa_falha=args.falhas, semente=args.semente)
+    gateway = Gateway(driver, tamanho_lote=args.lote)
+    # Mesmo cômodo usado no semear(): (id % comodos) + 1
+    comodo = lambda i: (i % args.comodos) + 1
+
+    latencias, erros = [], []
+    terminou = asyncio.Event()
+
+    def acompanhar(futuro, enviado_em):
+        # Callback no próprio futuro: mede no instante da confirmação
+        if futuro.exception() is not None:
+            erros.append(futuro)
+        else:
+            latencias.append(time.perf_counter() - enviado_em)
+        if len(latencias) + len(erros) == args.comandos:
+            terminou.set()
+
+    inicio = time.perf_counter()
+    for n in range(args.comandos):
+        dispositivo_id = aleatorio.randint(1, args.dispositivos)
+        futuro = gateway.enviar(dispositivo_id, {"estado": bool(n % 2)}, (comodo(dispositivo_id),))
+        futuro.add_done_callback(lambda f, t=time.perf_counter(): acompanhar(f, t))
+        # Chegada em rajadas, no ritmo de --taxa comandos/s (0 = o mais rápido possível)
+        if n % args.rajada == 0:
+            atraso = inicio + n / args.taxa - time.perf_counter() if args.taxa else 0
+            await asyncio.sleep(max(atraso, 0))
+    await terminou.wait()
+    await gateway.descarregar()
+    duracao = time.perf_counter() - inicio
+    await gateway.parar()
+
+    return {
+        "duracao_s": round(duracao, 3),
+        "comandos_por_s": round(args.comandos / duracao),
+        "confirmacao_ms": resumo_latencias(latencias),
+        "sem_confirmacao": len(erros),
+        "gateway": dict(gateway.estatisticas),
+        "frota": driver.estados,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do gateway de dispositivos")
+    parser.add_argument("--dispositivos", type=int, default=50_000)
+    parser.add_argument("--comodos", type=int, default=500)
+    parser.add_argument("--comandos", type=int, default=200_000)
+    parser.add_argument("--taxa", type=float, default=10_000, help="Comandos por segundo oferecidos ao gateway")
+    parser.add_argument("--rajada", type=int, default=100, help="Comandos enviados antes de ceder o loop")
+    parser.add_argument("--lote", type=int, default=500)
+    parser.add_argument("--latencia", type=float, default=20, help="Latência média do driver em ms")
+    parser.add_argument("--falhas", type=float, default=0.05, help="Taxa de falha por comando")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        preparar_ambiente(diretorio)
+        criar_app()
+        semear(args.comodos, args.dispositivos)
+
+        resultado = asyncio.run(executar(args))
+
+        from sqlalchemy import select
+        from ProjetoDomotica.database.database import SessionLocal
+        from ProjetoDomotica.model.models import Dispositivo
+        frota = resultado.pop("frota")
+        with SessionLocal() as db:
+            banco = dict(db.execute(select(Dispositivo.id, Dispositivo.estado)).all())
+        # Estado gravado no banco deve ser o último confirmado pela frota
+        resultado["divergentes"] = sum(1 for i, estado in frota.items() if banco[i] != estado["estado"])
+
+    print(json.dumps({"parametros": vars(args), **resultado}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
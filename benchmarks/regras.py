@@ -0,0 +1,126 @@
+# Custo de avaliar as regras de automação a cada mudança de estado, com os
+# gatilhos indexados por dispositivo e cômodo, comparado a percorrer todas.
+# Uso:
+#   python -m benchmarks.regras --regras 100000 --dispositivos 50000 --comodos 500
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+
+from benchmarks.comum import criar_app, preparar_ambiente, resumo_latencias, semear
+
+
+def semear_regras(args, aleatorio):
+    from ProjetoDomotica.database.database import engine
+    from ProjetoDomotica.model.models import Regra
+
+    regras = []
+    for i in range(1, args.regras + 1):
+        regra = {
+            "id": i, "nome": f"Regra {i}", "nome_normalizado": f"regra {i}",
+            "cena_id": aleatorio.randint(1, args.cenas), "espera": 0, "ativa": True,
+            "dispositivo_id": None, "comodo_id": None, "estado": aleatorio.random() < 0.5,
+        }
+        if aleatorio.random() < args.comodo:
+            regra["comodo_id"] = aleatorio.randint(1, args.comodos)
+        else:
+            regra["dispositivo_id"] = aleatorio.randint(1, args.dispositivos)
+            if aleatorio.random() < 0.2:
+                regra["estado"] = None
+        regras.append(regra)
+    with engine.begin() as conn:
+        conn.execute(Regra.__table__.insert(), regras)
+
+
+def varredura(gatilhos, deltas, contagem) -> list:
+    # Referência sem índice: toda regra é testada contra toda mudança
+    from ProjetoDomotica.services.regras import condicao_do_comodo
+
+    casadas = []
+    for d in deltas:
+        for gatilho in gatilhos:
+            if gatilho.dispositivo_id is not None:
+                if gatilho.dispositivo_id == d["id"] and gatilho.estado in (None, d["estado"]):
+                    casadas.append(gatilho)
+            elif gatilho.comodo_id in d["comodos"] and gatilho.estado == d["estado"]:
+                if condicao_do_comodo(gatilho, contagem(gatilho.comodo_id)):
+                    casadas.append(gatilho)
+    return casadas
+
+
+async def executar(args, aleatorio) -> dict:
+    from ProjetoDomotica.database.database import SessionLocal
+    from ProjetoDomotica.services.regras import MotorDeRegras
+    from ProjetoDomotica.services.resumo import resumo
+
+    motor = MotorDeRegras()
+    inicio = time.perf_counter()
+    motor.iniciar()
+    carga = time.perf_counter() - inicio
+    with SessionLocal() as db:
+        # Contadores dos cômodos em memória, como depois da primeira avaliação
+        resumo.contagem(1, db)
+
+    comodo = lambda i: (i % args.comodos) + 1
+    lotes = [
+        [
+            {"id": i, "estado": aleatorio.random() < 0.5, "comodos": [comodo(i)]}
+            for i in (aleatorio.randint(1, args.dispositivos) for _ in range(args.lote))
+        ]
+        for _ in range(args.avaliacoes)
+    ]
+
+    latencias = []
+    for deltas in lotes:
+        inicio = time.perf_counter()
+        motor.avaliar(deltas)
+        latencias.append(time.perf_counter() - inicio)
+    # Deixa os disparos agendados rodarem (as cenas não têm ações)
+    while motor.estatisticas()["em_execucao"]:
+        await asyncio.sleep(0.01)
+
+    gatilhos = list(motor._gatilhos.values())
+    referencia = []
+    for deltas in lotes[:args.avaliacoes_varredura]:
+        inicio = time.perf_counter()
+        varredura(gatilhos, deltas, resumo.contagem)
+        referencia.append(time.perf_counter() - inicio)
+
+    estatisticas = motor.estatisticas()
+    return {
+        "carga_s": round(carga, 3),
+        "avaliacao_ms": resumo_latencias(latencias),
+        "varredura_ms": resumo_latencias(referencia),
+        "regras_por_mudanca": round(estatisticas.get("avaliadas", 0) / max(estatisticas.get("mudancas", 1), 1), 2),
+        "motor": estatisticas,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do motor de regras")
+    parser.add_argument("--regras", type=int, default=100_000)
+    parser.add_argument("--dispositivos", type=int, default=50_000)
+    parser.add_argument("--comodos", type=int, default=500)
+    parser.add_argument("--cenas", type=int, default=1000)
+    parser.add_argument("--comodo", type=float, default=0.2, help="Fração de regras com gatilho de cômodo")
+    parser.add_argument("--lote", type=int, default=1, help="Mudanças por lote publicado")
+    parser.add_argument("--avaliacoes", type=int, default=20_000)
+    parser.add_argument("--avaliacoes-varredura", type=int, default=50, help="Lotes avaliados sem o índice")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    aleatorio = random.Random(args.semente)
+    with tempfile.TemporaryDirectory() as diretorio:
+        preparar_ambiente(diretorio)
+        criar_app()
+        semear(args.comodos, args.dispositivos, cenas=args.cenas)
+        semear_regras(args, aleatorio)
+        resultado = asyncio.run(executar(args, aleatorio))
+
+    print(json.dumps({"parametros": vars(args), **resultado}, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
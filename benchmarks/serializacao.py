@@ -0,0 +1,101 @@
+# Compara as listagens atuais (linhas do SQL + orjson) com o caminho anterior
+# (objetos do ORM validados pelo response_model), servindo as duas na mesma app.
+# Uso:
+#   python -m benchmarks.serializacao --dispositivos 10000 --limite 1000
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from typing import List
+
+from benchmarks.comum import criar_app, preparar_ambiente, resumo_latencias, semear
+
+
+def rotas_legadas():
+    # Reprodução das rotas antes do caminho rápido: ORM + response_model
+    from fastapi import APIRouter, Depends
+    from sqlalchemy.orm import Session, lazyload, selectinload
+    from ProjetoDomotica.database.database import get_db
+    from ProjetoDomotica.database.schemas import AcaoOut, CenaOut, ComodoOut, DispositivoOut
+    from ProjetoDomotica.model.models import Acao, Cena, Comodo, Dispositivo
+    from ProjetoDomotica.services.topologia import topologia
+
+    router = APIRouter(prefix="/legado")
+
+    def pagina(query, coluna_id, limit):
+        return query.order_by(coluna_id).limit(limit).all()
+
+    @router.get("/dispositivos/", response_model=list[DispositivoOut])
+    def dispositivos(limit: int = 100, db: Session = Depends(get_db)):
+        itens = pagina(db.query(Dispositivo).options(lazyload(Dispositivo.comodos)), Dispositivo.id, limit)
+        comodos = topologia.comodos_out(db, [i.id for i in itens])
+        return [
+            {"id": i.id, "nome": i.nome, "tipo": i.tipo, "estado": i.estado, "comodos": comodos.get(i.id, [])}
+            for i in itens
+        ]
+
+    @router.get("/cenas/", response_model=List[CenaOut])
+    def cenas(limit: int = 100, db: Session = Depends(get_db)):
+        return pagina(db.query(Cena).options(selectinload(Cena.acoes)), Cena.id, limit)
+
+    @router.get("/acoes/", response_model=List[AcaoOut])
+    def acoes(limit: int = 100, db: Session = Depends(get_db)):
+        return pagina(db.query(Acao), Acao.id, limit)
+
+    @router.get("/comodos/", response_model=list[ComodoOut])
+    def comodos(limit: int = 100, db: Session = Depends(get_db)):
+        return pagina(db.query(Comodo), Comodo.id, limit)
+
+    return router
+
+
+async def medir(app, url: str, repeticoes: int):
+    import httpx
+
+    latencias = []
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        corpo = (await cliente.get(url)).json()   # aquecimento (cache de topologia)
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            r = await cliente.get(url)
+            latencias.append(time.perf_counter() - inicio)
+            r.raise_for_status()
+    return latencias, corpo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do caminho rápido de serialização")
+    parser.add_argument("--comodos", type=int, default=50)
+    parser.add_argument("--dispositivos", type=int, default=10000)
+    parser.add_argument("--acoes", type=int, default=10000)
+    parser.add_argument("--cenas", type=int, default=1000)
+    parser.add_argument("--limite", type=int, default=1000)
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    resultado = {"parametros": vars(args), "endpoints": {}}
+    with tempfile.TemporaryDirectory() as diretorio:
+        preparar_ambiente(diretorio)
+        app = criar_app()
+        app.include_router(rotas_legadas())
+        semear(comodos=args.comodos, dispositivos=args.dispositivos, acoes=args.acoes, cenas=args.cenas)
+
+        for recurso in ("dispositivos", "cenas", "acoes", "comodos"):
+            rapido, corpo_rapido = asyncio.run(medir(app, f"/{recurso}/?limit={args.limite}", args.repeticoes))
+            legado, corpo_legado = asyncio.run(medir(app, f"/legado/{recurso}/?limit={args.limite}", args.repeticoes))
+            media_rapido = sum(rapido) / len(rapido)
+            media_legado = sum(legado) / len(legado)
+            resultado["endpoints"][f"GET /{recurso}/"] = {
+                "mesmo_conteudo": corpo_rapido == corpo_legado,
+                "response_model_ms": resumo_latencias(legado),
+                "rapido_ms": resumo_latencias(rapido),
+                "aceleracao": round(media_legado / media_rapido, 2),
+            }
+
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
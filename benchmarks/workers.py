@@ -0,0 +1,152 @@
+# Escalonamento da API com vários workers (python -m ProjetoDomotica.servidor):
+# req/s de PATCH /dispositivos/{id} (alternância) e GET /dispositivos/ com 1..N
+# workers, em HTTP de verdade. A carga vem de processos clientes separados,
+# que também usam CPU: numa máquina com C núcleos, use workers + clientes <= C.
+# Uso:
+#   python -m benchmarks.workers --workers 1,2,4 --clientes 4 --duracao 10
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.comum import PACOTE, criar_app, preparar_ambiente, resumo_latencias, semear
+
+
+def requisicao(cenario, aleatorio, tamanho):
+    dispositivo_id = aleatorio.randint(1, tamanho)
+    if cenario == "alternancia":
+        return "PATCH", f"/dispositivos/{dispositivo_id}", {"estado": aleatorio.random() < 0.5}
+    return "GET", f"/dispositivos/?limit=100&after={dispositivo_id}", None
+
+
+async def _carga(url, cenario, tamanho, concorrencia, duracao, semente):
+    import httpx
+
+    aleatorio = random.Random(semente)
+    latencias, erros = [], 0
+    limite = time.perf_counter() + duracao
+    async with httpx.AsyncClient(base_url=url, limits=httpx.Limits(max_connections=concorrencia)) as cliente:
+        async def trabalhador():
+            nonlocal erros
+            while time.perf_counter() < limite:
+                metodo, caminho, corpo = requisicao(cenario, aleatorio, tamanho)
+                inicio = time.perf_counter()
+                try:
+                    resposta = await cliente.request(metodo, caminho, json=corpo)
+                    if resposta.status_code >= 400:
+                        erros += 1
+                        continue
+                except httpx.HTTPError:
+                    erros += 1
+                    continue
+                latencias.append(time.perf_counter() - inicio)
+
+        await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    return latencias, erros
+
+
+def cliente(parametros):
+    return asyncio.run(_carga(*parametros))
+
+
+def aguardar(url, processo, tempo_max=60):
+    import httpx
+
+    limite = time.time() + tempo_max
+    while time.time() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError("O servidor terminou antes de responder.")
+        try:
+            if httpx.get(url + "/comodos/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("O servidor não respondeu a tempo.")
+
+
+def medir(args, diretorio, workers) -> dict:
+    env = {
+        **os.environ,
+        "PYTHONPATH": str(PACOTE.parent),
+        "DOMOTICA_DATABASE_URL": f"sqlite:///{Path(diretorio) / 'bench.db'}",
+        "DOMOTICA_CASAS_DIR": str(Path(diretorio) / "casas"),
+        "DOMOTICA_CANAL": str(Path(diretorio) / "canal.db"),
+    }
+    url = f"http://127.0.0.1:{args.porta}"
+    servidor = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "ProjetoDomotica.servidor",
+         "--workers", str(workers), "--port", str(args.porta), "--log-level", "warning"],
+        cwd=PACOTE, env=env,
+    )
+    try:
+        aguardar(url, servidor)
+        resultado = {}
+        with multiprocessing.Pool(args.clientes) as pool:
+            for cenario in args.cenarios:
+                # Aquecimento: conexões abertas e caches carregados em todos os workers
+                pool.map(cliente, [(url, cenario, args.dispositivos, args.concorrencia, 1.0, i) for i in range(args.clientes)])
+                parametros = [
+                    (url, cenario, args.dispositivos, args.concorrencia, args.duracao, args.semente + i)
+                    for i in range(args.clientes)
+                ]
+                inicio = time.perf_counter()
+                partes = pool.map(cliente, parametros)
+                decorrido = time.perf_counter() - inicio
+                latencias = [l for parte, _ in partes for l in parte]
+                resultado[cenario] = {
+                    "req_por_s": round(len(latencias) / decorrido, 1),
+                    "latencia_ms": resumo_latencias(latencias),
+                    "erros": sum(e for _, e in partes),
+                }
+        return resultado
+    finally:
+        servidor.terminate()
+        servidor.wait(30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Escalonamento da API com vários workers")
+    parser.add_argument("--workers", default="1,2,4", help="Quantidades de workers, separadas por vírgula")
+    parser.add_argument("--clientes", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Processos gerando carga")
+    parser.add_argument("--concorrencia", type=int, default=16, help="Requisições simultâneas por cliente")
+    parser.add_argument("--duracao", type=float, default=10.0)
+    parser.add_argument("--cenarios", default="alternancia,listagem")
+    parser.add_argument("--dispositivos", type=int, default=10_000)
+    parser.add_argument("--comodos", type=int, default=100)
+    parser.add_argument("--porta", type=int, default=8790)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", help="Grava o resultado em JSON")
+    args = parser.parse_args()
+    args.cenarios = args.cenarios.split(",")
+    quantidades = [int(n) for n in args.workers.split(",")]
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        preparar_ambiente(diretorio)
+        criar_app()
+        semear(args.comodos, args.dispositivos)
+        medidas = {n: medir(args, diretorio, n) for n in quantidades}
+
+    base = medidas[quantidades[0]]
+    for n, medida in medidas.items():
+        for cenario, dados in medida.items():
+            # Relativo à primeira quantidade (normalmente 1 worker)
+            dados["escala"] = round(dados["req_por_s"] / max(base[cenario]["req_por_s"], 1e-9), 2)
+            dados["eficiencia"] = round(dados["escala"] * quantidades[0] / n, 2)
+
+    resultado = {"parametros": vars(args), "nucleos": os.cpu_count(), "workers": medidas}
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        Path(args.saida).write_text(texto)
+    print(texto)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# Utilidades compartilhadas pelos testes: criam os dados pela API da casa atual
+import time
+
+
+def criar_dispositivo(cliente, nome: str, estado: bool = False, **campos) -> int:
+    resposta = cliente.post("/dispositivos/", json={"nome": nome, "tipo": "lampada", "estado": estado, **campos})
+    assert resposta.status_code == 201, resposta.text
+    return resposta.json()["id"]
+
+
+def criar_acao(cliente, dispositivo_id: int, estado=None, descricao: str = None, **campos) -> int:
+    descricao = descricao or f"Ação {dispositivo_id} {estado}"
+    resposta = cliente.post("/acoes/", json={"descricao": descricao, "dispositivo_id": dispositivo_id, "estado": estado, **campos})
+    assert resposta.status_code == 201, resposta.text
+    return resposta.json()["id"]
+
+
+def criar_cena(cliente, nome: str, *acao_ids) -> int:
+    resposta = cliente.post("/cenas/", json={"nome": nome})
+    assert resposta.status_code == 201, resposta.text
+    cena_id = resposta.json()["id"]
+    for acao_id in acao_ids:
+        assert cliente.post(f"/cenas/{cena_id}/acoes/{acao_id}").status_code == 200
+    return cena_id
+
+
+def aguardar(condicao, limite: float = 5):
+    # Espera algo que acontece no event loop da app (outra thread)
+    fim = time.monotonic() + limite
+    while not condicao():
+        assert time.monotonic() < fim, "tempo esgotado"
+        time.sleep(0.01)
+
+
+def executar_cena(cliente, cena_id: int) -> dict:
+    resposta = cliente.post(f"/cenas/{cena_id}/executar")
+    assert resposta.status_code == 202, resposta.text
+    caminho = f"/cenas/execucoes/{resposta.json()['id']}"
+    aguardar(lambda: cliente.get(caminho).json()["finalizada_em"] is not None)
+    return cliente.get(caminho).json()
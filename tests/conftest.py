@@ -0,0 +1,62 @@
+import itertools
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from benchmarks.comum import criar_app, preparar_ambiente
+
+# A configuração é lida na importação de ProjetoDomotica: o ambiente é
+# preparado aqui, antes de os módulos de teste serem coletados
+_DIRETORIO = tempfile.mkdtemp(prefix="domotica-")
+_ANTERIOR = os.getcwd()
+os.environ["DOMOTICA_CASAS_DIR"] = os.path.join(_DIRETORIO, "casas")
+preparar_ambiente(_DIRETORIO)
+
+_casas = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def cliente():
+    from fastapi.testclient import TestClient
+
+    try:
+        with TestClient(criar_app()) as cliente:
+            yield cliente
+    finally:
+        os.chdir(_ANTERIOR)
+        shutil.rmtree(_DIRETORIO, ignore_errors=True)
+
+
+@pytest.fixture
+def casa(cliente):
+    # Casa nova (banco próprio) por teste; as requisições vão para ela pelo X-Casa
+    from ProjetoDomotica.database.database import usar_casa
+
+    casa = f"teste-{next(_casas)}"
+    assert cliente.post("/casas/", json={"id": casa}).status_code == 201
+    cliente.headers["X-Casa"] = casa
+    try:
+        with usar_casa(casa):
+            yield casa
+    finally:
+        del cliente.headers["X-Casa"]
+
+
+_publicados = []
+_ouvindo = False
+
+
+@pytest.fixture
+def deltas(cliente):
+    # Deltas publicados no barramento durante o teste, na ordem
+    global _ouvindo
+    from ProjetoDomotica.services.eventos import barramento
+
+    if not _ouvindo:
+        barramento.ouvir(_publicados.extend)
+        _ouvindo = True
+    _publicados.clear()
+    yield _publicados
+    _publicados.clear()
@@ -0,0 +1,59 @@
+from ProjetoDomotica.model.models import Agendamento
+from ProjetoDomotica.services.agendador import Agendador
+from tests.comum import aguardar, criar_acao, criar_cena, criar_dispositivo
+
+
+def agendamento(id: int, intervalo: int = 100, **campos) -> Agendamento:
+    campos = {"tolerancia": 60, "politica_atraso": "executar_uma_vez", **campos}
+    return Agendamento(id=id, cena_id=id, cron=None, intervalo=intervalo, **campos)
+
+
+def test_heap_entrega_os_vencidos_em_ordem():
+    agendador, base = Agendador(), 1000.0
+    for id, momento in ((1, 30), (2, 10), (3, 20)):
+        agendador._inserir(agendamento(id), base + momento)
+
+    vencidos, espera = agendador._retirar_vencidos(base + 25)
+    assert [(momento - base, entrada.id) for momento, entrada in vencidos] == [(10, 2), (20, 3)]
+    assert espera == 5
+
+
+def test_alteracao_descarta_a_posicao_antiga():
+    agendador, base = Agendador(), 1000.0
+    agendador._inserir(agendamento(1), base + 10)
+    agendador._inserir(agendamento(2), base + 20)
+    # Nova versão do 1 mais adiante; o 2 removido
+    agendador._inserir(agendamento(1), base + 50)
+    agendador.remover(2)
+
+    assert agendador._retirar_vencidos(base + 40) == ([], 10)
+    vencidos, espera = agendador._retirar_vencidos(base + 50)
+    assert [(momento - base, entrada.id) for momento, entrada in vencidos] == [(50, 1)]
+    assert espera is None and not agendador._heap
+
+
+def test_recuperar_disparos_perdidos():
+    agendador, agora = Agendador(), 10_000.0
+    assert agendador._recuperar(agendamento(1, proxima_execucao=None), agora) == agora + 100
+    assert agendador._recuperar(agendamento(1, proxima_execucao=agora + 5), agora) == agora + 5
+    assert agendador.atrasados == 0
+
+    # Dentro da tolerância, ou com "executar_uma_vez", dispara já (uma vez só)
+    assert agendador._recuperar(agendamento(1, proxima_execucao=agora - 30), agora) == agora
+    assert agendador._recuperar(agendamento(1, proxima_execucao=agora - 250), agora) == agora
+    # "ignorar": pula para o próximo disparo, mantendo a fase do intervalo
+    ignorar = agendamento(1, proxima_execucao=agora - 250, politica_atraso="ignorar")
+    assert agendador._recuperar(ignorar, agora) == agora + 50
+    assert agendador.atrasados == 3
+
+
+def test_agendamento_executa_a_cena(cliente, casa):
+    luz = criar_dispositivo(cliente, "L1")
+    cena_id = criar_cena(cliente, "Ligar", criar_acao(cliente, luz, True))
+    resposta = cliente.post(f"/cenas/{cena_id}/agendamentos", json={"intervalo": 1})
+    assert resposta.status_code == 201, resposta.text
+
+    proximos = cliente.get("/cenas/agendamentos/proximos").json()
+    assert proximos and proximos[0]["cena_id"] == cena_id
+    aguardar(lambda: cliente.get(f"/dispositivos/{luz}").json()["estado"])
+    assert cliente.get(f"/cenas/{cena_id}/agendamentos").json()[0]["ultima_execucao"] is not None
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from ProjetoDomotica.database.database import SessionLocal
+from ProjetoDomotica.services.execucao import carregar_passos
+from tests.comum import criar_acao, criar_cena, criar_dispositivo, executar_cena
+
+
+def test_acao_que_repete_o_estado_nao_publica(cliente, casa, deltas):
+    ligado, desligado = criar_dispositivo(cliente, "L1", estado=True), criar_dispositivo(cliente, "L2")
+    cena_id = criar_cena(cliente, "Tudo ligado", criar_acao(cliente, ligado, True), criar_acao(cliente, desligado, True))
+
+    execucao = executar_cena(cliente, cena_id)
+
+    assert (execucao["status"], execucao["concluidas"]) == ("concluida", 2)
+    assert deltas == [{"id": desligado, "estado": True, "comodos": []}]
+
+
+def test_acao_readicionada_vai_para_o_fim(cliente, casa):
+    dispositivo_id = criar_dispositivo(cliente, "L1")
+    acoes = [criar_acao(cliente, dispositivo_id, estado, descricao=f"Passo {n}") for n, estado in enumerate((True, False, True))]
+    cena_id = criar_cena(cliente, "Pisca", *acoes)
+
+    assert cliente.delete(f"/cenas/{cena_id}/acoes/{acoes[1]}").status_code == 200
+    assert cliente.post(f"/cenas/{cena_id}/acoes/{acoes[1]}").status_code == 200
+
+    with SessionLocal() as db:
+        passos = carregar_passos(db, cena_id)
+    assert [[acao.acao_id for acao in passo] for passo in passos] == [[acoes[0]], [acoes[2]], [acoes[1]]]
+    assert [a["id"] for a in cliente.get(f"/cenas/{cena_id}").json()["acoes"]] == [acoes[0], acoes[2], acoes[1]]
+
+
+def test_passos_em_ordem_e_acoes_do_passo_em_paralelo(cliente, casa, deltas):
+    l1, l2, l3 = (criar_dispositivo(cliente, f"L{n}") for n in (1, 2, 3))
+    cena_id = criar_cena(cliente, "Em dois passos")
+    # O passo 1 é adicionado primeiro: vale a ordem, não a inserção
+    assert cliente.post(f"/cenas/{cena_id}/acoes/{criar_acao(cliente, l3, True)}", params={"ordem": 1}).status_code == 200
+    for dispositivo_id in (l1, l2):
+        acao_id = criar_acao(cliente, dispositivo_id, True)
+        resposta = cliente.post(f"/cenas/{cena_id}/acoes/{acao_id}", params={"ordem": 0, "intervalo": 0.3})
+        assert resposta.status_code == 200
+
+    execucao = executar_cena(cliente, cena_id)
+
+    assert (execucao["status"], execucao["concluidas"]) == ("concluida", 3)
+    assert {d["id"] for d in deltas[:2]} == {l1, l2} and deltas[2]["id"] == l3
+    # As duas esperas de 0,3 s do passo 0 correm juntas
+    duracao = datetime.fromisoformat(execucao["finalizada_em"]) - datetime.fromisoformat(execucao["iniciada_em"])
+    assert 0.3 <= duracao.total_seconds() < 0.55
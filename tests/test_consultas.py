@@ -0,0 +1,33 @@
+import pytest
+
+from benchmarks.comum import semear
+
+# Dados de uma casa; a outra recebe 10 vezes mais. Cabem numa página só
+N = 20
+ROTAS = ["/dispositivos/", "/acoes/", "/cenas/", "/comodos/"]
+
+
+@pytest.fixture(scope="module")
+def casas(cliente):
+    from ProjetoDomotica.database.database import roteador
+
+    for casa, n in (("pequena", N), ("grande", 10 * N)):
+        assert cliente.post("/casas/", json={"id": casa}).status_code == 201
+        semear(n, n, acoes=n, cenas=n, bind=roteador.engine(casa))
+
+
+@pytest.mark.parametrize("rota", ROTAS)
+def test_consultas_nao_crescem_com_os_dados(cliente, casas, rota):
+    # Mesmo número de comandos SQL com N e com 10×N linhas: sem N+1
+    from ProjetoDomotica.database.database import contar_consultas, roteador
+
+    totais = {}
+    for casa, n in (("pequena", N), ("grande", 10 * N)):
+        with contar_consultas(roteador.engine(casa)) as contador:
+            resposta = cliente.get(f"/casas/{casa}{rota}", params={"limit": 10 * N})
+        assert resposta.status_code == 200
+        assert len(resposta.json()) == n
+        totais[casa] = contador.total
+
+    assert totais["pequena"] > 0
+    assert totais["pequena"] == totais["grande"]
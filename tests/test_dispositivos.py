@@ -0,0 +1,21 @@
+from tests.comum import criar_dispositivo
+
+
+def test_lote_publica_so_quem_mudou(cliente, casa, deltas):
+    ligado, desligado = criar_dispositivo(cliente, "L1", estado=True), criar_dispositivo(cliente, "L2")
+
+    resposta = cliente.post("/dispositivos/estado:lote", json={"itens": [
+        {"id": ligado, "estado": True}, {"id": desligado, "estado": True}, {"id": 999, "estado": True},
+    ]})
+
+    assert resposta.json() == {"atualizados": [ligado, desligado], "nao_encontrados": [999], "sem_confirmacao": []}
+    assert deltas == [{"id": desligado, "estado": True, "comodos": []}]
+
+
+def test_lote_por_seletor_sem_mudanca_nao_publica(cliente, casa, deltas):
+    ids = [criar_dispositivo(cliente, "L1", estado=True), criar_dispositivo(cliente, "L2", estado=True)]
+
+    resposta = cliente.post("/dispositivos/estado:lote", json={"seletor": {"tipo": "lampada"}, "estado": True})
+
+    assert resposta.json()["atualizados"] == ids
+    assert deltas == []
@@ -0,0 +1,85 @@
+import pytest
+
+from ProjetoDomotica.services.gateway import Comando, gravar_confirmados
+from tests.comum import criar_dispositivo
+
+
+def confirmado(dispositivo_id: int, alteracoes: dict):
+    return Comando(dispositivo_id, alteracoes, dict.fromkeys(alteracoes, 1)), alteracoes
+
+
+def test_confirmacao_grava_e_publica_so_o_que_mudou(cliente, casa, deltas):
+    ligado = criar_dispositivo(cliente, "L1", estado=True, tipo="dimmer", atributos={"brilho": 40})
+    desligado = criar_dispositivo(cliente, "L2", tipo="dimmer")
+
+    gravar_confirmados([
+        confirmado(ligado, {"estado": True, "brilho": 40}),
+        confirmado(desligado, {"estado": True, "brilho": 40}),
+    ])
+
+    assert deltas == [{"id": desligado, "estado": True, "comodos": [], "atributos": {"brilho": 40}}]
+    atual = cliente.get(f"/dispositivos/{desligado}").json()
+    assert (atual["estado"], atual["atributos"]["brilho"]) == (True, 40)
+
+
+def test_confirmacao_de_dispositivo_removido_e_ignorada(cliente, casa, deltas):
+    dispositivo_id = criar_dispositivo(cliente, "L1")
+    assert cliente.delete(f"/dispositivos/{dispositivo_id}").status_code == 204
+
+    gravar_confirmados([confirmado(dispositivo_id, {"estado": True})])
+
+    assert deltas == []
+
+
+@pytest.fixture
+def com_driver(cliente, casa, monkeypatch):
+    # As rotas de dispositivos como main.py as monta com DOMOTICA_DRIVER=simulado
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from ProjetoDomotica.routers import dispositivos, gateway
+    from ProjetoDomotica.services import gateway as servico
+    from ProjetoDomotica.services.casas import MiddlewareDeCasa
+
+    monkeypatch.setattr(servico, "DRIVER", "simulado")
+    monkeypatch.setenv("DOMOTICA_SIM_LATENCIA", "0")
+    app = FastAPI()
+    app.add_middleware(MiddlewareDeCasa)
+    for router in (gateway.router_estado, gateway.router, dispositivos.router):
+        app.include_router(router)
+    with TestClient(app, headers={"X-Casa": casa}) as com_driver:
+        yield com_driver
+        instancia = servico.descartar_gateway(casa)
+        if instancia is not None:
+            com_driver.portal.call(instancia.parar)
+
+
+def test_patch_com_driver_passa_pelo_gateway(cliente, com_driver, deltas):
+    from ProjetoDomotica.services.gateway import obter_gateway
+
+    dispositivo_id = criar_dispositivo(cliente, "D1", tipo="dimmer")
+
+    resposta = com_driver.patch(f"/dispositivos/{dispositivo_id}", json={"nome": "D2", "estado": True, "atributos": {"brilho": 30}})
+
+    assert resposta.status_code == 200
+    assert (resposta.json()["nome"], resposta.json()["estado"], resposta.json()["atributos"]["brilho"]) == ("D2", True, 30)
+    assert obter_gateway().driver.estados == {dispositivo_id: {"estado": True, "brilho": 30}}
+    assert deltas == [{"id": dispositivo_id, "estado": True, "comodos": [], "atributos": {"brilho": 30}}]
+
+
+def test_patch_sem_confirmacao_nao_muda_o_banco(cliente, com_driver, monkeypatch):
+    dispositivo_id = criar_dispositivo(cliente, "L1")
+    monkeypatch.setenv("DOMOTICA_SIM_FALHAS", "1")
+
+    resposta = com_driver.patch(f"/dispositivos/{dispositivo_id}", json={"estado": True})
+
+    assert resposta.status_code == 502
+    assert cliente.get(f"/dispositivos/{dispositivo_id}").json()["estado"] is False
+
+
+def test_lote_com_driver_passa_pelo_gateway(cliente, com_driver):
+    ids = [criar_dispositivo(cliente, "L1"), criar_dispositivo(cliente, "L2")]
+
+    resposta = com_driver.post("/dispositivos/estado:lote", json={"seletor": {"tipo": "lampada"}, "estado": True})
+
+    assert resposta.json() == {"atualizados": ids, "nao_encontrados": [], "sem_confirmacao": []}
+    assert [d["estado"] for d in cliente.get("/dispositivos/").json()] == [True, True]
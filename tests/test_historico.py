@@ -0,0 +1,35 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from tests.comum import criar_dispositivo
+
+# Período que termina daqui a uma hora: quem está ligado acumula ~3600 s
+ATE = {"ate": (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()}
+
+
+def tempo_ligado(cliente, dispositivo_id: int) -> float:
+    resposta = cliente.get(f"/dispositivos/{dispositivo_id}/historico", params=ATE)
+    assert resposta.status_code == 200
+    return resposta.json()["tempo_ligado"]
+
+
+def test_dispositivo_criado_ligado_conta_desde_a_criacao(cliente, casa):
+    ligado, desligado = criar_dispositivo(cliente, "L1", estado=True), criar_dispositivo(cliente, "L2")
+
+    assert tempo_ligado(cliente, ligado) > 3500
+    assert tempo_ligado(cliente, desligado) == 0
+    resumo = {r["dispositivo_id"]: r["tempo_ligado"] for r in cliente.get("/dispositivos/historico/resumo", params=ATE).json()}
+    assert resumo[ligado] > 3500
+    assert desligado not in resumo
+
+
+def test_dispositivo_importado_ligado_conta_desde_a_importacao(cliente, casa):
+    documento = "\n".join(json.dumps(r) for r in (
+        {"registro": "dispositivo", "nome": "L1", "tipo": "lampada", "estado": True},
+        {"registro": "dispositivo", "nome": "L2", "tipo": "lampada"},
+    ))
+    assert cliente.post("/casa/importar", content=documento).status_code == 200
+    ids = {d["nome"]: d["id"] for d in cliente.get("/dispositivos/").json()}
+
+    assert tempo_ligado(cliente, ids["L1"]) > 3500
+    assert tempo_ligado(cliente, ids["L2"]) == 0
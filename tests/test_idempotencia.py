@@ -0,0 +1,57 @@
+from tests.comum import criar_dispositivo
+
+
+def patch(cliente, dispositivo_id, chave, **campos):
+    return cliente.patch(f"/dispositivos/{dispositivo_id}", json=campos, headers={"Idempotency-Key": chave})
+
+
+def test_repeticao_devolve_a_resposta_guardada(cliente, casa):
+    dispositivo_id = criar_dispositivo(cliente, "lampada")
+    primeira = patch(cliente, dispositivo_id, "k1", estado=True)
+    assert primeira.status_code == 200
+    assert "idempotent-replayed" not in primeira.headers
+    assert cliente.patch(f"/dispositivos/{dispositivo_id}", json={"estado": False}).status_code == 200
+
+    # A repetição não executa de novo: o dispositivo continua desligado
+    repetida = patch(cliente, dispositivo_id, "k1", estado=True)
+    assert repetida.status_code == 200
+    assert repetida.headers["idempotent-replayed"] == "true"
+    assert repetida.json() == primeira.json()
+    assert cliente.get(f"/dispositivos/{dispositivo_id}").json()["estado"] is False
+
+
+def test_mesma_chave_com_outro_corpo_e_422(cliente, casa):
+    dispositivo_id = criar_dispositivo(cliente, "lampada")
+    assert patch(cliente, dispositivo_id, "k1", estado=True).status_code == 200
+    resposta = patch(cliente, dispositivo_id, "k1", estado=False)
+    assert resposta.status_code == 422
+    assert cliente.get(f"/dispositivos/{dispositivo_id}").json()["estado"] is True
+
+
+def test_mesma_chave_em_andamento_com_outro_corpo_e_409(cliente, casa):
+    from ProjetoDomotica.services.idempotencia import _reservadas
+
+    dispositivo_id = criar_dispositivo(cliente, "lampada")
+    caminho = f"/dispositivos/{dispositivo_id}"
+    # Outra requisição com a chave ainda em andamento
+    _reservadas[(casa, "PATCH", caminho, "k1")] = "outra"
+    try:
+        assert patch(cliente, dispositivo_id, "k1", estado=True).status_code == 409
+    finally:
+        del _reservadas[(casa, "PATCH", caminho, "k1")]
+    assert cliente.get(caminho).json()["estado"] is False
+    assert patch(cliente, dispositivo_id, "k1", estado=True).status_code == 200
+
+
+def test_chave_expirada_executa_de_novo(cliente, casa, monkeypatch):
+    from ProjetoDomotica.services.idempotencia import chaves
+
+    dispositivo_id = criar_dispositivo(cliente, "lampada")
+    assert patch(cliente, dispositivo_id, "k1", estado=True).status_code == 200
+    monkeypatch.setattr(chaves, "validade", -1)
+
+    # Expirada, a chave vale para outra requisição
+    resposta = patch(cliente, dispositivo_id, "k1", estado=False)
+    assert resposta.status_code == 200
+    assert "idempotent-replayed" not in resposta.headers
+    assert resposta.json()["estado"] is False
@@ -0,0 +1,59 @@
+from sqlalchemy import create_engine
+
+from ProjetoDomotica.database.migracoes import MIGRACOES, migrar
+
+# Esquema da primeira versão, antes das migrações (PRAGMA user_version = 0)
+ESQUEMA_INICIAL = """
+CREATE TABLE dispositivos (id INTEGER PRIMARY KEY, nome VARCHAR NOT NULL, tipo VARCHAR NOT NULL, estado BOOLEAN NOT NULL);
+CREATE TABLE comodos (id INTEGER PRIMARY KEY, nome VARCHAR NOT NULL UNIQUE);
+CREATE TABLE acoes (id INTEGER PRIMARY KEY, descricao VARCHAR NOT NULL, dispositivo_id INTEGER REFERENCES dispositivos (id) ON DELETE CASCADE);
+CREATE TABLE cenas (id INTEGER PRIMARY KEY, nome VARCHAR NOT NULL UNIQUE, palavra_chave VARCHAR, estado VARCHAR);
+CREATE TABLE comodo_dispositivo (
+    comodo_id INTEGER REFERENCES comodos (id) ON DELETE CASCADE,
+    dispositivo_id INTEGER REFERENCES dispositivos (id) ON DELETE CASCADE,
+    PRIMARY KEY (comodo_id, dispositivo_id)
+);
+CREATE TABLE cena_acoes (
+    cena_id INTEGER REFERENCES cenas (id) ON DELETE CASCADE,
+    acao_id INTEGER REFERENCES acoes (id) ON DELETE CASCADE,
+    PRIMARY KEY (cena_id, acao_id)
+);
+INSERT INTO dispositivos VALUES (1, 'Luz', 'lampada', 0), (2, 'luz', 'lampada', 1), (3, 'Luz (2)', 'lampada', 0);
+INSERT INTO comodos VALUES (1, 'Sala'), (2, 'SALA');
+INSERT INTO acoes VALUES (1, 'Ligar', 1), (2, 'ligar', 1), (3, 'Ligar', 2);
+INSERT INTO cenas VALUES (1, 'Noite', NULL, 'inativa'), (2, 'Dia', NULL, 'inativa');
+INSERT INTO cena_acoes VALUES (1, 3), (2, 2), (1, 1), (1, 2);
+"""
+
+
+def test_banco_da_primeira_versao_e_migrado(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'casa.db'}")
+    with engine.connect() as conexao:
+        for comando in ESQUEMA_INICIAL.split(";"):
+            if comando.strip():
+                conexao.exec_driver_sql(comando)
+        conexao.commit()
+
+    migrar(engine)
+
+    with engine.connect() as conexao:
+        assert conexao.exec_driver_sql("PRAGMA user_version").scalar() == len(MIGRACOES)
+        # As ações de cada cena viram passos na ordem em que foram adicionadas
+        passos = conexao.exec_driver_sql(
+            "SELECT cena_id, acao_id, ordem, intervalo FROM cena_acoes ORDER BY cena_id, ordem"
+        ).all()
+        assert [tuple(p) for p in passos] == [(1, 3, 0, 0), (1, 1, 1, 0), (1, 2, 2, 0), (2, 2, 0, 0)]
+        # Nomes repetidos (sem diferença de maiúsculas) ganham um sufixo livre
+        dispositivos = conexao.exec_driver_sql("SELECT nome, nome_normalizado FROM dispositivos ORDER BY id").all()
+        assert [tuple(d) for d in dispositivos] == [("Luz", "luz"), ("luz (3)", "luz (3)"), ("Luz (2)", "luz (2)")]
+        assert conexao.exec_driver_sql("SELECT nome FROM comodos ORDER BY id").scalars().all() == ["Sala", "SALA (2)"]
+        # A descrição só se repete entre ações do mesmo dispositivo
+        acoes = conexao.exec_driver_sql("SELECT descricao FROM acoes ORDER BY id").scalars().all()
+        assert acoes == ["Ligar", "ligar (2)", "Ligar"]
+    engine.dispose()
+
+    # Já na última versão, migrar de novo não muda nada
+    migrar(engine)
+    with engine.connect() as conexao:
+        assert conexao.exec_driver_sql("PRAGMA user_version").scalar() == len(MIGRACOES)
+    engine.dispose()
@@ -0,0 +1,36 @@
+import pytest
+
+from benchmarks.comum import semear
+from ProjetoDomotica.database.database import roteador
+from ProjetoDomotica.database.paginacao import CABECALHO_CURSOR, LIMITE_PADRAO
+
+TOTAL = LIMITE_PADRAO + 50
+
+
+@pytest.fixture
+def dispositivos(casa):
+    semear(1, TOTAL, bind=roteador.engine(casa))
+
+
+def test_sem_limit_nem_cursor_a_lista_vem_inteira(cliente, dispositivos):
+    resposta = cliente.get("/dispositivos/")
+
+    assert len(resposta.json()) == TOTAL
+    assert CABECALHO_CURSOR not in resposta.headers
+
+
+def test_paginas_seguem_o_cursor(cliente, dispositivos):
+    primeira = cliente.get("/dispositivos/", params={"limit": 100})
+    cursor = primeira.headers[CABECALHO_CURSOR]
+    segunda = cliente.get("/dispositivos/", params={"limit": 100, "after": cursor})
+
+    ids = [d["id"] for d in primeira.json() + segunda.json()]
+    assert ids == list(range(1, TOTAL + 1))
+    assert CABECALHO_CURSOR not in segunda.headers
+
+
+def test_cursor_sem_limit_usa_o_limite_padrao(cliente, dispositivos):
+    resposta = cliente.get("/dispositivos/", params={"after": 0})
+
+    assert len(resposta.json()) == LIMITE_PADRAO
+    assert resposta.headers[CABECALHO_CURSOR] == str(LIMITE_PADRAO)
@@ -0,0 +1,45 @@
+from ProjetoDomotica.services.regras import motor
+from tests.comum import aguardar, criar_acao, criar_cena, criar_dispositivo
+
+
+def criar_regra(cliente, cena_id: int, **gatilho) -> int:
+    resposta = cliente.post("/regras/", json={"nome": f"Regra {cena_id} {gatilho}", "cena_id": cena_id, "espera": 0, **gatilho})
+    assert resposta.status_code == 201, resposta.text
+    return resposta.json()["id"]
+
+
+def disparos() -> int:
+    instancia = motor.atual()
+    aguardar(lambda: not instancia._tarefas)
+    return instancia.eventos["disparos"]
+
+
+def test_regra_dispara_so_na_transicao(cliente, casa):
+    luz, outra = criar_dispositivo(cliente, "L1"), criar_dispositivo(cliente, "L2")
+    cena_id = criar_cena(cliente, "Ao ligar L1", criar_acao(cliente, outra, True))
+    criar_regra(cliente, cena_id, dispositivo_id=luz, estado=True)
+
+    assert cliente.patch(f"/dispositivos/{luz}", json={"estado": True}).status_code == 200
+    assert disparos() == 1
+
+    # Lotes que repetem o estado de L1 não são transições
+    cliente.post("/dispositivos/estado:lote", json={"seletor": {"tipo": "lampada"}, "estado": True})
+    cliente.post("/dispositivos/estado:lote", json={"itens": [{"id": luz, "estado": True}]})
+    cliente.patch(f"/dispositivos/{luz}", json={"estado": True})
+    assert disparos() == 1
+
+
+def test_cascata_para_no_limite(cliente, casa):
+    instancia = motor.atual()
+    limite = instancia.max_cascata
+    luzes = [criar_dispositivo(cliente, f"L{n}") for n in range(limite + 2)]
+    # Cada luz que liga acende a seguinte: uma regra a mais que o limite
+    for luz, seguinte in zip(luzes, luzes[1:]):
+        cena_id = criar_cena(cliente, f"Acender {seguinte}", criar_acao(cliente, seguinte, True))
+        criar_regra(cliente, cena_id, dispositivo_id=luz, estado=True)
+
+    assert cliente.patch(f"/dispositivos/{luzes[0]}", json={"estado": True}).status_code == 200
+    aguardar(lambda: instancia.eventos["bloqueadas_cascata"] == 1)
+    assert disparos() == limite
+    estados = [cliente.get(f"/dispositivos/{luz}").json()["estado"] for luz in luzes]
+    assert estados == [True] * (limite + 1) + [False]
@@ -0,0 +1,53 @@
+from tests.comum import criar_dispositivo
+
+
+def test_etag_atual_responde_304(cliente, casa):
+    dispositivo_id = criar_dispositivo(cliente, "lampada")
+    resposta = cliente.get(f"/dispositivos/{dispositivo_id}")
+    assert resposta.status_code == 200
+    etag = resposta.headers["etag"]
+
+    resposta = cliente.get(f"/dispositivos/{dispositivo_id}", headers={"If-None-Match": etag})
+    assert resposta.status_code == 304
+    assert resposta.headers["etag"] == etag
+    resposta = cliente.get(f"/dispositivos/{dispositivo_id}", headers={"If-None-Match": f"W/{etag}"})
+    assert resposta.status_code == 304
+
+
+def test_etag_invalidado_por_patch(cliente, casa):
+    dispositivo_id = criar_dispositivo(cliente, "lampada")
+    etag = cliente.get(f"/dispositivos/{dispositivo_id}").headers["etag"]
+    etag_lista = cliente.get("/dispositivos/").headers["etag"]
+
+    assert cliente.patch(f"/dispositivos/{dispositivo_id}", json={"nome": "abajur"}).status_code == 200
+    resposta = cliente.get(f"/dispositivos/{dispositivo_id}", headers={"If-None-Match": etag})
+    assert resposta.status_code == 200
+    assert resposta.json()["nome"] == "abajur"
+    assert resposta.headers["etag"] != etag
+
+    assert cliente.patch(f"/dispositivos/{dispositivo_id}", json={"estado": True}).status_code == 200
+    resposta = cliente.get("/dispositivos/", headers={"If-None-Match": etag_lista})
+    assert resposta.status_code == 200
+    assert resposta.json()[0]["estado"] is True
+
+
+def test_etag_invalidado_por_delete(cliente, casa):
+    dispositivo_id = criar_dispositivo(cliente, "lampada")
+    etag = cliente.get(f"/dispositivos/{dispositivo_id}").headers["etag"]
+
+    assert cliente.delete(f"/dispositivos/{dispositivo_id}").status_code == 204
+    resposta = cliente.get(f"/dispositivos/{dispositivo_id}", headers={"If-None-Match": etag})
+    assert resposta.status_code == 404
+
+
+def test_curinga_so_responde_304_se_existe(cliente, casa):
+    dispositivo_id = criar_dispositivo(cliente, "lampada")
+    curinga = {"If-None-Match": "*"}
+
+    # Sem corpo guardado e depois com ele
+    assert cliente.get(f"/dispositivos/{dispositivo_id}", headers=curinga).status_code == 304
+    assert cliente.get(f"/dispositivos/{dispositivo_id}", headers=curinga).status_code == 304
+
+    assert cliente.get(f"/dispositivos/{dispositivo_id + 1}", headers=curinga).status_code == 404
+    assert cliente.delete(f"/dispositivos/{dispositivo_id}").status_code == 204
+    assert cliente.get(f"/dispositivos/{dispositivo_id}", headers=curinga).status_code == 404